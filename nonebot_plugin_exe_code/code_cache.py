@@ -0,0 +1,181 @@
+import ast
+import contextlib
+import hashlib
+import importlib.util
+import marshal
+import types
+from collections import OrderedDict
+from importlib.metadata import version
+from pathlib import Path
+from typing import NamedTuple
+
+import nonebot
+
+from .config import config
+from .constant import CACHE_DIR
+
+CODE_CACHE_FILE = CACHE_DIR / "code_cache.bin"
+
+
+def _cache_header() -> bytes:
+    # marshal 格式与解释器版本相关, 代码转换逻辑与插件版本相关
+    try:
+        plugin_version = version("nonebot-plugin-exe-code")
+    except Exception:  # pragma: no cover
+        plugin_version = "unknown"
+    return importlib.util.MAGIC_NUMBER + plugin_version.encode() + b"\0"
+
+
+class TransformedSource:
+    """转换后的源码, 首次读取时才调用 ast.unparse"""
+
+    __slots__ = ("_text", "_tree")
+
+    _text: str | None
+    _tree: ast.Module | None
+
+    def __init__(self, source: ast.Module | str) -> None:
+        if isinstance(source, str):
+            self._text, self._tree = source, None
+        else:
+            self._text, self._tree = None, source
+
+    @property
+    def text(self) -> str:
+        if self._text is None:
+            assert self._tree is not None
+            self._text, self._tree = ast.unparse(self._tree), None
+        return self._text
+
+
+DYNAMIC_NAMES = frozenset({"__builtins__", "eval", "exec", "globals", "locals", "vars"})
+"""可动态访问任意全局名称的内置函数, 引用时需要导出全部名称"""
+
+
+def collect_names(code: types.CodeType) -> frozenset[str] | None:
+    """收集代码对象 (包括嵌套的代码对象) 引用的名称
+
+    Returns:
+        frozenset[str] | None: 引用的名称, 代码可能动态访问全局名称时返回 None
+    """
+    names = set(code.co_names)
+    for const in code.co_consts:
+        if isinstance(const, types.CodeType):
+            if (nested := collect_names(const)) is None:
+                return None
+            names |= nested
+    return None if names & DYNAMIC_NAMES else frozenset(names)
+
+
+class CacheEntry(NamedTuple):
+    code: types.CodeType
+    is_coro: bool
+    source: TransformedSource
+    names: frozenset[str] | None = None
+    """代码引用的名称, 为 None 时需要导出全部名称"""
+
+
+class CacheInfo(NamedTuple):
+    hits: int
+    misses: int
+    evictions: int
+    maxsize: int
+    currsize: int
+
+
+class CodeCache:
+    """以源码哈希为键的 LRU 缓存, 保存经过转换和编译的代码对象"""
+
+    maxsize: int
+    hits: int
+    misses: int
+    evictions: int
+    _data: OrderedDict[bytes, CacheEntry]
+
+    def __init__(self, maxsize: int) -> None:
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self.hits = self.misses = self.evictions = 0
+
+    @staticmethod
+    def make_key(source: str) -> bytes:
+        return hashlib.sha256(source.encode()).digest()
+
+    def get(self, key: bytes) -> CacheEntry | None:
+        if (entry := self._data.get(key)) is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        self._data.move_to_end(key)
+        return entry
+
+    def put(self, key: bytes, entry: CacheEntry) -> None:
+        if self.maxsize <= 0:
+            return
+
+        self._data[key] = entry
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self) -> None:
+        self._data.clear()
+        self.hits = self.misses = self.evictions = 0
+
+    def cache_info(self) -> CacheInfo:
+        return CacheInfo(
+            hits=self.hits,
+            misses=self.misses,
+            evictions=self.evictions,
+            maxsize=self.maxsize,
+            currsize=len(self._data),
+        )
+
+    def dump(self, path: Path) -> None:
+        data = [
+            (key, entry.code, entry.is_coro, entry.source.text)
+            for key, entry in self._data.items()
+        ]
+        path.write_bytes(_cache_header() + marshal.dumps(data))
+
+    def load(self, path: Path) -> int:
+        if not path.exists():
+            return 0
+
+        raw = path.read_bytes()
+        header = _cache_header()
+        if not raw.startswith(header):
+            return 0
+
+        try:
+            data = marshal.loads(raw[len(header) :])  # noqa: S302
+        except (EOFError, ValueError, TypeError):
+            return 0
+
+        count = 0
+        with contextlib.suppress(TypeError, ValueError):
+            for key, code, is_coro, source in data:
+                entry = CacheEntry(
+                    code, is_coro, TransformedSource(source), collect_names(code)
+                )
+                self.put(key, entry)
+                count += 1
+        return count
+
+
+code_cache = CodeCache(config.code_cache_size)
+
+
+@nonebot.get_driver().on_startup
+async def _load_code_cache() -> None:
+    if config.code_cache_persist:
+        count = code_cache.load(CODE_CACHE_FILE)
+        nonebot.logger.debug(f"已加载 {count} 条代码缓存")
+
+
+@nonebot.get_driver().on_shutdown
+async def _dump_code_cache() -> None:
+    if config.code_cache_persist:
+        code_cache.dump(CODE_CACHE_FILE)
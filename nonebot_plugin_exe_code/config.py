@@ -1,3 +1,5 @@
+from typing import Literal
+
 from nonebot import get_plugin_config
 from pydantic import BaseModel, Field
 
@@ -6,6 +8,43 @@ class ExeCodeConfig(BaseModel):
     user: set[str] = Field(default_factory=set)
     group: set[str] = Field(default_factory=set)
     buffer_size: int = 8192
+    buffer_stream: bool = False
+    buffer_stream_interval: float = 2
+    buffer_stream_limit: int = 1 << 20
+    buffer_progress: bool = False
+    buffer_progress_interval: float = 1
+    output_limit: int = 4096
+    output_chunk_size: int = 2048
+    output_max_chunks: int = 20
+    send_rate_bot: tuple[int, float] = (20, 1)
+    send_rate_user: tuple[int, float] = (6, 10)
+    send_rate_target: tuple[int, float] = (10, 2)
+    send_queue_size: int = 64
+    send_timeout: float = 60
+    feedback_coalesce: bool = False
+    feedback_coalesce_window: float = 0.5
+    feedback_coalesce_size: int = 2048
+    feedback_forward_threshold: int = 5
+    feedback_pipeline: bool = False
+    feedback_pipeline_size: int = 16
+    code_cache_size: int = 128
+    code_cache_persist: bool = False
+    session_cache_size: int = 1024
+    session_cache_ttl: float = 300
+    strict_container_check: Literal["full", "sampled", "first"] = "full"
+    strict_container_size: int = 16
+    const_flush_delay: float = 1
+    const_backend: Literal["json", "sqlite"] = "json"
+    http_cache: bool = False
+    http_cache_size: int = 128
+    http_cache_ttl: float = 60
+    http_cache_max_bytes: int = 1 << 20
+    http_cache_disk: bool = False
+    http_cache_disk_size: int = 1024
+    http_stream_limit: int = 64 << 20
+    http_download_quota: int = 256 << 20
+    http_download_max_files: int = 64
+    local_file_uri: bool = False
 
 
 class Config(BaseModel):
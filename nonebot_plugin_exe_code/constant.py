@@ -1,3 +1,4 @@
-from nonebot_plugin_localstore import get_plugin_data_dir
+from nonebot_plugin_localstore import get_plugin_cache_dir, get_plugin_data_dir
 
+CACHE_DIR = get_plugin_cache_dir()
 DATA_DIR = get_plugin_data_dir()
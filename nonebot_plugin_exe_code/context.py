@@ -6,26 +6,37 @@ import linecache
 import time
 import traceback
 import types
-from collections.abc import Awaitable, Callable, Generator
-from typing import Any, ClassVar, Self, assert_never, cast, override
+from collections import OrderedDict
+from collections.abc import (
+    AsyncGenerator,
+    Awaitable,
+    Callable,
+    Generator,
+    Iterator,
+    Sequence,
+)
+from typing import Any, ClassVar, Self, assert_never, cast, overload, override
 
 import anyio
 import nonebot
-from nonebot import get_driver
 from nonebot.adapters import Bot, Event, Message
 from nonebot.internal.matcher import current_bot, current_event
 from nonebot.utils import escape_tag, run_sync
-from nonebot_plugin_alconna.uniseg import Image, UniMessage
-from nonebot_plugin_uninfo import get_session
+from nonebot_plugin_alconna.uniseg import Image, Receipt, UniMessage
 from nonebot_plugin_user.models import UserSession
-from nonebot_plugin_user.params import get_user, get_user_session
 
+from .code_cache import CacheEntry, TransformedSource, code_cache, collect_names
+from .config import config
+from .debug import debug_switch
 from .exception import (
     BotEventMismatch,
     ExecutorFinishedException,
     SessionNotInitialized,
 )
-from .interface import Buffer, create_api, get_default_context
+from .interface import API, Buffer, create_api, ensure_builtins, get_default_context
+from .interface.utils import send_message
+from .session import resolve_session
+from .stats import StageTimer, execution_stats
 from .typings import T_Context
 
 logger = nonebot.logger.opt(colors=True)
@@ -34,39 +45,99 @@ type T_Executor = Callable[[], Awaitable[None]]
 type T_ExecutorCtx = Callable[[], contextlib.AbstractContextManager[None]]
 
 
-async def _cleanup(
-    delay: float,
-    callbacks: list[Callable[[], object]],
-) -> None:  # pragma: no cover
-    await anyio.sleep(delay)
+class _LazyLines(Sequence[str]):
+    """linecache 中的源码行, 仅在 traceback/inspect 读取时生成"""
+
+    __slots__ = ("_lines", "_source")
+
+    _lines: list[str] | None
+    _source: TransformedSource
+
+    def __init__(self, source: TransformedSource) -> None:
+        self._lines = None
+        self._source = source
+
+    @property
+    def lines(self) -> list[str]:
+        if self._lines is None:
+            self._lines = [line + "\n" for line in self._source.text.splitlines()]
+        return self._lines
+
+    def __len__(self) -> int:
+        return len(self.lines)
+
+    @overload
+    def __getitem__(self, index: int) -> str: ...
+    @overload
+    def __getitem__(self, index: slice) -> list[str]: ...
+
+    def __getitem__(self, index: int | slice) -> str | list[str]:
+        return self.lines[index]
+
+    @override
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.lines)
+
+
+class LineCacheRegistry:
+    """统一管理 executor 在 linecache 中的源码, 按数量上限和存活时间淘汰"""
+
+    maxsize: int
+    ttl: float
+    _entries: OrderedDict[str, tuple[float, str]]
+
+    def __init__(self, maxsize: int = 256, ttl: float = 300) -> None:
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
 
-    for callback in callbacks:
-        with contextlib.suppress(Exception):
-            callback()
+    def __len__(self) -> int:
+        return len(self._entries)
 
+    def __contains__(self, filename: str) -> bool:
+        return filename in self._entries
 
-@contextlib.contextmanager
-def fake_cache(filename: str, code: str) -> Generator[None]:
-    cbs: list[Callable[[], object]] = []
+    def register(self, filename: str, source: TransformedSource) -> None:
+        # https://docs.python.org/3/library/linecache.html
+        # linecache.cache is undocumented and may change in the future
+        # mtime 为 None 时, linecache.checkcache 不会移除该条目
+        linecache.cache[filename] = (0, None, _LazyLines(source), filename)  # pyright: ignore[reportArgumentType]
 
-    # https://docs.python.org/3/library/linecache.html
-    # linecache.cache is undocumented and may change in the future
-    with contextlib.suppress(Exception):
-        cache = (len(code), None, [line + "\n" for line in code.splitlines()], filename)
-        linecache.cache[filename] = cache
-        cbs.append(lambda: linecache.cache.pop(filename, None))
+        # set modulesbyfile[name] to this module
+        # allow inspect.getmodule to work on executor frame
+        abs_filename = inspect.getabsfile(object, filename)
+        inspect.modulesbyfile[abs_filename] = __name__
 
-    # set modulesbyfile[name] to this module temporarily
-    # allow inspect.getmodule to work on executor frame
-    fake_abs_filename = inspect.getabsfile(object, filename)
-    inspect.modulesbyfile[fake_abs_filename] = __name__
-    cbs.append(lambda: inspect.modulesbyfile.pop(fake_abs_filename, None))
+        self._entries.pop(filename, None)
+        self._entries[filename] = (time.monotonic() + self.ttl, abs_filename)
+        self.evict()
 
-    try:
-        yield
-    finally:
-        # cleanup cache later (300s)
-        get_driver().task_group.start_soon(_cleanup, 300, cbs)
+    def refresh(self, filename: str) -> None:
+        if (entry := self._entries.pop(filename, None)) is not None:
+            self._entries[filename] = (time.monotonic() + self.ttl, entry[1])
+
+    def evict(self) -> None:
+        now = time.monotonic()
+        while self._entries:
+            filename, (expire, abs_filename) = next(iter(self._entries.items()))
+            if len(self._entries) <= self.maxsize and expire > now:
+                break
+
+            del self._entries[filename]
+            linecache.cache.pop(filename, None)
+            inspect.modulesbyfile.pop(abs_filename, None)
+
+    @contextlib.contextmanager
+    def track(self, filename: str, source: TransformedSource) -> Generator[None]:
+        self.register(filename, source)
+        try:
+            yield
+        finally:
+            # 从执行结束时开始计算存活时间
+            self.refresh(filename)
+
+
+linecache_registry = LineCacheRegistry()
 
 
 class _NodeTransformer(ast.NodeTransformer):
@@ -140,11 +211,7 @@ class _NodeTransformer(ast.NodeTransformer):
         return node
 
 
-def solve_code(
-    source: str,
-    filename: str,
-    ctx: dict[str, object],
-) -> tuple[T_Executor, T_ExecutorCtx]:
+def _compile_code(source: str, filename: str) -> CacheEntry:
     # ast.parse 可能抛出 SyntaxError, 由 matcher 处理
     module = ast.parse(source, filename, "exec")
     if module.body and isinstance((last := module.body[-1]), ast.Expr):
@@ -157,16 +224,63 @@ def solve_code(
         mode="exec",
         flags=ast.PyCF_ALLOW_TOP_LEVEL_AWAIT,
     )
-
     is_coro = bool(code.co_flags & inspect.CO_COROUTINE)
-    exec(f"{('async ' if is_coro else '')}def __executor__(): ...", ctx, ctx)  # noqa: S102
-    executor = cast(Callable[..., Any], ctx.pop("__executor__"))
-    executor.__code__ = code
-    if not is_coro:
+    return CacheEntry(
+        code, is_coro, TransformedSource(transformed), collect_names(code)
+    )
+
+
+def _replace_filename(code: types.CodeType, filename: str) -> types.CodeType:
+    if code.co_filename == filename:
+        return code
+
+    consts = tuple(
+        _replace_filename(const, filename)
+        if isinstance(const, types.CodeType)
+        else const
+        for const in code.co_consts
+    )
+    return code.replace(co_filename=filename, co_consts=consts)
+
+
+def solve_code(
+    source: str,
+    filename: str,
+    ctx: dict[str, object],
+) -> tuple[T_Executor, T_ExecutorCtx, frozenset[str] | None]:
+    key = code_cache.make_key(source)
+    if (entry := code_cache.get(key)) is None:
+        entry = _compile_code(source, filename)
+        code_cache.put(key, entry)
+
+    code = _replace_filename(entry.code, filename)
+    # 函数在创建时绑定 builtins, 需在导出前确保上下文拥有独立的 builtins
+    ensure_builtins(ctx)
+    executor = cast(Callable[..., Any], types.FunctionType(code, ctx, "__executor__"))
+    if not entry.is_coro:
         executor = run_sync(executor)
 
     ctx["__name__"] = filename
-    return executor, functools.partial(fake_cache, filename, ast.unparse(transformed))
+    track = functools.partial(linecache_registry.track, filename, entry.source)
+    return executor, track, entry.names
+
+
+def _add_line_note(err: BaseException, filename: str, line_offset: int) -> None:
+    if not line_offset:
+        return
+
+    lineno: int | None = None
+    if isinstance(err, SyntaxError) and err.filename == filename:
+        lineno = err.lineno
+    else:
+        tb = err.__traceback__
+        while tb is not None:
+            if tb.tb_frame.f_code.co_filename == filename:
+                lineno = tb.tb_lineno
+            tb = tb.tb_next
+
+    if lineno is not None:
+        err.add_note(f"代码第 {lineno} 行对应消息第 {lineno + line_offset} 行")
 
 
 class Context:
@@ -177,11 +291,19 @@ class Context:
     ctx: T_Context
     lock: anyio.Lock
     cancel_scope: anyio.CancelScope | None = None
+    names: set[str] | None
+    """该上下文中执行过的代码引用的名称, 为 None 时导出全部名称
+
+    之前定义的函数可能在之后的执行中被调用, 因此需要累积记录
+    """
+    truncated: str | None = None
+    """输出过长被截断时保存到变量 `out` 的剩余内容"""
 
     def __init__(self, uin: int) -> None:
         self.uin = uin
         self.ctx = get_default_context()
         self.lock = anyio.Lock()
+        self.names = set()
 
     @classmethod
     def _session2uin(cls, session: UserSession | Event | str | int) -> int:
@@ -225,14 +347,48 @@ class Context:
     def _get_filename(self) -> str:
         return f"<executor_{self.uin}_{int(time.time())}>"
 
-    async def _check_buffer(self) -> None:
+    async def _send_output(self, api: API, text: str) -> None:
+        # 变量 out 仅保存最近一次输出的剩余内容, 不覆盖用户自己定义的同名变量
+        current = self.ctx.get("out")
+        varname = "out" if current is None or current is self.truncated else None
+        rest = await api.send_output(text, varname)
+        if rest is not None:
+            logger.debug(f"用户 {self.colored_uin} 输出过长, 剩余 {len(rest)} 个字符")
+        if varname is not None:
+            self.set_value(varname, rest)
+            self.truncated = rest
+
+    async def _check_buffer(self, api: API) -> None:
         if buf := Buffer.get(self.uin).read().rstrip("\n"):
             logger.debug(f"用户 {self.colored_uin} 清空缓冲:")
             logger.opt(raw=True).debug(buf)
-            await UniMessage.text(buf).send()
+            await self._send_output(api, buf)
+
+    @contextlib.asynccontextmanager
+    async def _stream_buffer(
+        self,
+        bot: Bot,
+        session: UserSession,
+    ) -> AsyncGenerator[None]:
+        if not (config.buffer_progress or config.buffer_stream):
+            yield
+            return
+
+        async def send(text: str) -> Receipt:
+            logger.debug(f"用户 {self.colored_uin} 输出缓冲:")
+            logger.opt(raw=True).debug(text)
+            return await send_message(bot, session, None, text)
+
+        buffer = Buffer.get(self.uin)
+        streaming = buffer.progress if config.buffer_progress else buffer.stream
+        async with streaming(send):
+            yield
 
     async def _inner_execute(
-        self, executor: T_Executor
+        self,
+        executor: T_Executor,
+        filename: str,
+        line_offset: int,
     ) -> tuple[object, BaseException | None]:
         result = err = None
 
@@ -242,6 +398,7 @@ class Context:
             except ExecutorFinishedException as finished:
                 result = finished.result
             except BaseException as exc:
+                _add_line_note(exc, filename, line_offset)
                 self.ctx["exc"] = err = exc
                 self.ctx["tb"] = traceback.format_exc()
             finally:
@@ -249,41 +406,107 @@ class Context:
 
         return result, err
 
-    @classmethod
-    async def execute(cls, bot: Bot, event: Event, code: str) -> None:
-        info = await get_session(bot, event)
-        if info is None:
-            raise NotImplementedError("无法获取会话信息")
-        user = await get_user(info)
-        if user is None:
-            raise NotImplementedError("无法获取用户信息")
-        session = await get_user_session(info, user)
-        if session is None:
-            raise NotImplementedError("无法获取用户会话信息")
-
-        self = cls.get_context(session)
-
-        async with self.lock, await create_api(bot, event, self.ctx, session):
-            executor, ctx = solve_code(code, self._get_filename(), self.ctx)
-            logger.debug(
-                f"为用户 {self.colored_uin} 创建 executor: {escape_tag(repr(executor))}"
-            )
-
-            with ctx():
-                result, err = await self._inner_execute(executor)
-
-            await self._check_buffer()
-
-            if result is not None:
-                result_repr = repr(result)
+    async def _execute(
+        self,
+        bot: Bot,
+        event: Event,
+        session: UserSession,
+        code: str,
+        timer: StageTimer,
+        line_offset: int,
+    ) -> None:
+        async with contextlib.AsyncExitStack() as stack:
+            with timer.stage("lock"):
+                await stack.enter_async_context(self.lock)
+
+            filename = self._get_filename()
+            with timer.stage("solve_code"):
+                try:
+                    executor, ctx, names = solve_code(code, filename, self.ctx)
+                except SyntaxError as err:
+                    _add_line_note(err, filename, line_offset)
+                    raise
+                if names is None:
+                    self.names = None
+                elif self.names is not None:
+                    self.names |= names
+
+            with timer.stage("create_api"):
+                api = await create_api(bot, event, self.ctx, session, self.names)
+                await stack.enter_async_context(api)
+
+            if debug_switch.enabled:
                 logger.debug(
-                    f"用户 {self.colored_uin} 输出返回值: {escape_tag(result_repr)}"
+                    f"为用户 {self.colored_uin} 创建 executor: "
+                    f"{escape_tag(repr(executor))}"
                 )
-                await UniMessage.text(result_repr).send()
+
+            result = err = None
+            # 代码抛出的异常之外, 发送输出时的异常也需要报告
+            errors: list[BaseException] = []
+            try:
+                with timer.stage("execute"), ctx():
+                    try:
+                        async with (
+                            self._stream_buffer(bot, session),
+                            api.pipeline_feedback(),
+                            api.coalesce_feedback(),
+                        ):
+                            result, err = await self._inner_execute(
+                                executor, filename, line_offset
+                            )
+                    except Exception as exc:
+                        errors.append(exc)
+
+                try:
+                    with timer.stage("check_buffer"):
+                        await self._check_buffer(api)
+
+                    if result is not None:
+                        with timer.stage("send_result"):
+                            result_repr = repr(result)
+                            logger.debug(
+                                f"用户 {self.colored_uin} 输出返回值: "
+                                f"{escape_tag(result_repr)}"
+                            )
+                            await self._send_output(api, result_repr)
+                except Exception as exc:
+                    errors.append(exc)
+            finally:
+                # 执行被取消或发送失败时丢弃剩余内容, 避免遗留到下次执行
+                Buffer.get(self.uin).read()
 
             # 处理异常
             if err is not None:
-                raise err
+                errors.insert(0, err)
+            if len(errors) > 1:
+                raise BaseExceptionGroup("执行代码并发送输出时发生多个错误", errors)
+            if errors:
+                raise errors[0]
+
+    @classmethod
+    async def execute(
+        cls,
+        bot: Bot,
+        event: Event,
+        code: str,
+        session: UserSession | None = None,
+        line_offset: int = 0,
+    ) -> None:
+        timer = StageTimer()
+        uin: int | None = None
+
+        try:
+            with timer.stage("total"):
+                if session is None:
+                    with timer.stage("session"):
+                        session = await resolve_session(bot, event, timer)
+
+                self = cls.get_context(session)
+                uin = self.uin
+                await self._execute(bot, event, session, code, timer, line_offset)
+        finally:
+            execution_stats.record(bot.adapter.get_name(), uin, timer.records)
 
     def cancel(self) -> bool:
         if self.cancel_scope is None:
@@ -0,0 +1,52 @@
+import nonebot
+from nonebot.log import logger
+
+DEBUG_LEVEL = logger.level("DEBUG").no
+
+
+class DebugSwitch:
+    """DEBUG 日志开关
+
+    关闭时跳过仅用于 DEBUG 日志的参数格式化 (如 repr 合并转发列表、图片等).
+    默认跟随 NoneBot 的 `log_level` 配置, 修改配置后调用 `refresh` 重新检测.
+    loguru 未提供查询 handler 等级的公开接口, 额外添加了输出 DEBUG 日志的 handler
+    或在运行时修改 NoneBot 默认 handler 的等级时, 需调用 `set` 手动开启/关闭
+    """
+
+    __slots__ = ("_detected", "_forced")
+
+    _detected: bool
+    _forced: bool | None
+
+    def __init__(self) -> None:
+        self.refresh()
+
+    @property
+    def enabled(self) -> bool:
+        return self._detected if self._forced is None else self._forced
+
+    def refresh(self) -> bool:
+        """根据 NoneBot 的 `log_level` 配置重新检测是否输出 DEBUG 日志, 并取消手动设置
+
+        Returns:
+            bool: 是否输出 DEBUG 日志
+        """
+        level = nonebot.get_driver().config.log_level
+        levelno = logger.level(level).no if isinstance(level, str) else level
+        self._forced = None
+        self._detected = levelno <= DEBUG_LEVEL
+        return self._detected
+
+    def set(self, enabled: bool | None) -> None:  # noqa: FBT001
+        """在运行时开启/关闭 DEBUG 日志
+
+        Args:
+            enabled (bool | None): 是否输出 DEBUG 日志, 为 None 时恢复自动检测
+        """
+        if enabled is None:
+            self.refresh()
+        else:
+            self._forced = enabled
+
+
+debug_switch = DebugSwitch()
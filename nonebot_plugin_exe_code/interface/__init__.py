@@ -1,26 +1,42 @@
-from nonebot.adapters import Bot, Event
+from collections.abc import Set as AbstractSet
+
+from nonebot.adapters import Adapter, Bot, Event
 from nonebot_plugin_user.models import UserSession
 
 from ..typings import T_Context
 from . import adapters as adapters
 from .api import API as API
 from .api import api_registry
+from .user_const_var import const_session_id, preload_const
+from .user_const_var import ensure_builtins as ensure_builtins
 from .user_const_var import get_default_context as get_default_context
 from .utils import Buffer as Buffer
 
+_api_class_cache: dict[type[Adapter], type[API]] = {}
+
+
+def _get_api_class(adapter: Adapter) -> type[API]:
+    if (api := _api_class_cache.get(type(adapter))) is not None:
+        return api
 
-async def create_api(
-    bot: Bot,
-    event: Event,
-    context: T_Context,
-    session: UserSession,
-) -> API[Bot, Event]:
     for cls in api_registry:
-        if isinstance(bot.adapter, cls):
+        if isinstance(adapter, cls):
             api = api_registry[cls]
             break
     else:
         api = API
 
+    return _api_class_cache.setdefault(type(adapter), api)
+
+
+async def create_api(
+    bot: Bot,
+    event: Event,
+    context: T_Context,
+    session: UserSession,
+    names: AbstractSet[str] | None = None,
+) -> API[Bot, Event]:
     assert session is not None, "Session is None"
-    return api(bot, event, session, context)
+    # 在导出常量前于工作线程中加载, 避免阻塞事件循环
+    await preload_const(const_session_id(session))
+    return _get_api_class(bot.adapter)(bot, event, session, context, names)
@@ -11,15 +11,17 @@ import nonebot
 from nonebot.adapters import Event
 from nonebot.utils import escape_tag
 
+from ...config import config
 from ...exception import APICallFailed as BaseAPICallFailed
 from ...exception import ParamMismatch, ParamMissing
 from ...typings import T_ForwardMsg, UserStr
 from ..api import API as BaseAPI
 from ..decorators import Overload, debug_log, export, strict
 from ..group import Group as BaseGroup
-from ..help_doc import descript
+from ..help_doc import descript, help_cache
+from ..scheduler import send_scheduler
 from ..user import User as BaseUser
-from ..utils import Result, as_msg
+from ..utils import Result, as_msg, iter_chunks
 
 if TYPE_CHECKING:
 
@@ -31,6 +33,9 @@ def file2str(file: str | bytes | BytesIO | Path) -> str:
     if isinstance(file, BytesIO):
         file = file.getvalue()
     if isinstance(file, Path):
+        if config.local_file_uri:
+            # 协议端与 bot 位于同一主机时直接传递路径, 不读入内存
+            return file.resolve().as_uri()
         file = file.resolve().read_bytes()
     if isinstance(file, bytes):
         file = f"base64://{b64encode(file).decode()}"
@@ -217,19 +222,75 @@ with contextlib.suppress(ImportError):
             assert self.gid is not None, "获取上下文失败"
             return await self.send_grp_fwd(self.gid, msgs)
 
+        async def _send_forward(self, messages: Message) -> Result:
+            if not self.is_group():
+                return await self.call_api(
+                    "send_private_forward_msg",
+                    user_id=int(self.uid),
+                    messages=messages,
+                )
+            assert self.gid is not None, "获取上下文失败"
+            return await self.call_api(
+                "send_group_forward_msg",
+                group_id=int(self.gid),
+                messages=messages,
+            )
+
+        @override
+        async def _send_long_output(self, text: str) -> bool:
+            from nonebot.adapters.onebot.v11 import MessageSegment
+
+            size = config.output_chunk_size
+            if len(text) > size * config.output_max_chunks:
+                await self.send_file(text.encode(), "output.txt")
+                return True
+
+            await self._send_forward(
+                Message(
+                    # 输出内容作为纯文本发送, 不解析其中的 CQ 码
+                    MessageSegment.node_custom(
+                        0, "forward", Message(MessageSegment.text(chunk))
+                    )
+                    for chunk in iter_chunks(text, size)
+                )
+            )
+            return True
+
+        @override
+        async def _send_feedback_batch(self, texts: list[str]) -> None:
+            if len(texts) < config.feedback_forward_threshold:
+                await super()._send_feedback_batch(texts)
+                return
+
+            from nonebot.adapters.onebot.v11 import MessageSegment
+
+            await send_scheduler.acquire_send(self.bot, self.session, None)
+            await self._send_forward(
+                Message(
+                    MessageSegment.node_custom(
+                        0, "forward", Message(MessageSegment.text(text))
+                    )
+                    for text in texts
+                )
+            )
+
         @overload
         async def help(self, method: Callable[..., Any]) -> None:
             await super().help(method)
 
         @overload
         async def help(self) -> None:
-            content, description = self.get_all_description()
-            msgs = [
-                "   ===== API说明 =====   ",
-                " - API说明文档 - 目录 - \n" + "\n".join(content),
-                *description,
-            ]
-            await self.send_fwd(msgs)
+            # 合并转发消息按 API 类缓存, 在 type_alias 变化时随帮助文档一同失效
+            key = (type(self), "forward")
+            if (messages := help_cache.get(key)) is None:
+                content, description = self.get_all_description()
+                msgs = [
+                    "   ===== API说明 =====   ",
+                    " - API说明文档 - 目录 - \n" + "\n".join(content),
+                    *description,
+                ]
+                messages = help_cache[key] = await convert_forward(msgs)
+            await self._send_forward(messages)
 
         @Overload
         @descript(
@@ -13,6 +13,7 @@ with contextlib.suppress(ImportError):
 
     class API(BaseAPI[Bot, MessageEvent], adapter=Adapter):
         __slots__ = ()
+        __output_file__ = True
 
         @classmethod
         @override
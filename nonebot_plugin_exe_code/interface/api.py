@@ -1,4 +1,7 @@
-from collections.abc import Callable, Iterable
+import contextlib
+import functools
+from collections.abc import AsyncGenerator, Callable, Iterable
+from collections.abc import Set as AbstractSet
 from typing import Any, ClassVar, Self, override
 
 import anyio
@@ -14,6 +17,7 @@ from nonebot_plugin_alconna.uniseg import (
 from nonebot_plugin_user.models import UserSession
 from nonebot_plugin_waiter.unimsg import prompt as waiter_prompt
 
+from ..config import config
 from ..exception import BotEventMismatch, ExecutorFinishedException, NoMethodDescription
 from ..typings import (
     T_ConstVar,
@@ -25,13 +29,23 @@ from ..typings import (
 )
 from .decorators import debug_log, export, strict
 from .group import Group
-from .help_doc import descript, message_alia
+from .help_doc import descript, help_cache, message_alia
 from .http import Http
 from .interface import Interface
 from .user import User
-from .user_const_var import get_default_context, load_const, set_const
+from .user_const_var import (
+    const_names,
+    const_session_id,
+    get_default_context,
+    load_const,
+    set_const,
+)
 from .utils import (
+    SUPERUSER_EXPORTS,
     Buffer,
+    FeedbackBatch,
+    FeedbackPipeline,
+    SendFuture,
     as_msg,
     as_unimsg,
     export_message,
@@ -48,7 +62,9 @@ message_alia(Message, MessageSegment)
 
 class API[B: Bot, E: Event](Interface):
     __inst_name__: ClassVar[str] = "api"
-    __slots__ = ("__bot", "__event", "__session")
+    __output_file__: ClassVar[bool] = False
+    """超长输出是否以文件形式发送"""
+    __slots__ = ("__batch", "__bot", "__event", "__pipeline", "__session")
 
     def __init__(
         self,
@@ -56,14 +72,17 @@ class API[B: Bot, E: Event](Interface):
         event: E,
         session: UserSession,
         context: T_Context,
+        names: AbstractSet[str] | None = None,
     ) -> None:
         if not self._validate(bot, event):
             raise BotEventMismatch("Bot/Event type mismatch")
 
-        super().__init__(context)
+        super().__init__(context, names)
         self.__bot = bot
         self.__event = event
         self.__session = session
+        self.__batch: FeedbackBatch | None = None
+        self.__pipeline: FeedbackPipeline | None = None
 
     def __init_subclass__(cls, adapter: type[Adapter], **kwargs: object) -> None:
         super().__init_subclass__(**kwargs)
@@ -71,6 +90,7 @@ class API[B: Bot, E: Event](Interface):
         adapter_name = adapter.get_name()
         for desc in cls.__method_description__:
             desc.description = f"[{adapter_name}] {desc.description}"
+        help_cache.clear()
 
     @property
     def bot(self) -> B:
@@ -99,7 +119,7 @@ class API[B: Bot, E: Event](Interface):
 
     @property
     def session_id(self) -> str:
-        return f"{self.session.platform}_{self.session.platform_user.id}"
+        return const_session_id(self.session)
 
     @property
     def mid(self) -> str | int:
@@ -186,25 +206,107 @@ class API[B: Bot, E: Event](Interface):
     @descript(
         description="向当前会话发送消息",
         parameters=dict(msg="需要发送的消息"),
+        result=(
+            "消息回执，启用合并发送且消息为文本时为 None，"
+            "启用流水线发送时为可 await 获取回执的 SendFuture"
+        ),
     )
     @export
     @debug_log
-    async def feedback(self, msg: object) -> Receipt:
+    async def feedback(self, msg: object) -> Receipt | SendFuture[Receipt] | None:
         if not is_message_t(msg):
             msg = str(msg)
 
-        return await send_message(
-            self.bot,
-            session=self.session,
-            target=None,
-            message=msg,
-        )
+        if (batch := self.__batch) is not None:
+            if isinstance(msg, str):
+                await batch.add(msg)
+                return None
+            # 先发送之前合并的文本, 保持消息顺序
+            await batch.flush()
+
+        send = functools.partial(send_message, self.bot, self.session, None, msg)
+        if self.__pipeline is not None:
+            return await self.__pipeline.submit(send)
+        return await send()
+
+    async def _send_feedback_batch(self, texts: list[str]) -> None:
+        """发送合并后的 feedback 文本"""
+        await send_message(self.bot, self.session, None, "\n".join(texts))
+
+    async def _submit_feedback_batch(self, texts: list[str]) -> None:
+        send = functools.partial(self._send_feedback_batch, texts)
+        if self.__pipeline is not None:
+            await self.__pipeline.submit(send)
+        else:
+            await send()
+
+    @contextlib.asynccontextmanager
+    async def coalesce_feedback(self) -> AsyncGenerator[None]:
+        """启用 `feedback_coalesce` 时, 在上下文中合并连续的文本 feedback"""
+        if not config.feedback_coalesce:
+            yield
+            return
+
+        async with FeedbackBatch.scope(self._submit_feedback_batch) as self.__batch:
+            try:
+                yield
+            finally:
+                self.__batch = None
+
+    @contextlib.asynccontextmanager
+    async def pipeline_feedback(self) -> AsyncGenerator[None]:
+        """启用 `feedback_pipeline` 时, 在上下文中按顺序在后台发送 feedback"""
+        if not config.feedback_pipeline:
+            yield
+            return
+
+        async with FeedbackPipeline.scope() as self.__pipeline:
+            try:
+                yield
+            finally:
+                self.__pipeline = None
 
     @debug_log
     async def feedback_from(self, msgs: Iterable[object]) -> None:
         for msg in msgs:
             await self.feedback(msg)
 
+    async def _send_long_output(self, text: str) -> bool:
+        """发送超过长度上限的输出, 适配器不支持时返回 False"""
+        if not self.__output_file__:
+            return False
+        await UniMessage.file(
+            raw=text.encode(),
+            mimetype="text/plain",
+            name="output.txt",
+        ).send(bot=self.bot)
+        return True
+
+    async def send_output(self, text: str, varname: str | None = None) -> str | None:
+        """发送执行结果或缓冲区内容
+
+        超过 `output_limit` 时按适配器发送合并转发消息或文件, 均不支持时截断
+
+        Args:
+            varname (str | None): 截断时提示用于获取剩余内容的变量名
+
+        Returns:
+            str | None: 截断时未发送的剩余内容
+        """
+        limit = config.output_limit
+        if len(text) <= limit:
+            await UniMessage.text(text).send(bot=self.bot)
+            return None
+        if await self._send_long_output(text):
+            return None
+
+        rest = text[limit:]
+        hint = f", 可通过 {varname} 获取" if varname is not None else ""
+        await UniMessage.text(
+            f"{text[:limit]}\n...(输出过长, 已省略 {len(rest)} 个字符{hint})"
+        ).send(bot=self.bot)
+        return rest
+
     @descript(
         description="立即中止当前代码执行",
         parameters=dict(obj="需要输出的对象"),
@@ -319,23 +421,35 @@ class API[B: Bot, E: Event](Interface):
         self.export()
 
     @override
-    def export(self) -> None:
-        super().export()
+    def export(self, names: AbstractSet[str] | None = None) -> None:
+        super().export(names)
         self._export("__api__", self)
 
-        for k, v in load_const(self.session_id).items():
-            self._export(k, v)
-        self._export("uid", self.uid)
-        self._export("qid", self.uid)
-        self._export("gid", self.gid)
+        def wanted(name: str) -> bool:
+            return names is None or name in names
+
+        # 仅解析代码引用的常量
+        if names is None or not names.isdisjoint(const_names(self.session_id)):
+            for k, v in load_const(self.session_id, names).items():
+                self._export(k, v)
+        for k in ("uid", "qid"):
+            if wanted(k):
+                self._export(k, self.uid)
+        if wanted("gid"):
+            self._export("gid", self.gid)
         for k, v in export_message(self.bot.adapter):
-            self._export(k, v)
+            if wanted(k):
+                self._export(k, v)
 
-        if is_super_user(self.bot, self.session.platform_user.id):
+        if (names is None or not names.isdisjoint(SUPERUSER_EXPORTS)) and is_super_user(
+            self.bot, self.session.platform_user.id
+        ):
             for k, v in export_superuser():
-                self._export(k, v)
+                if wanted(k):
+                    self._export(k, v)
 
-        self._export("http", Http())
+        if wanted("http"):
+            self._export("http", Http())
 
     def __repr__(self) -> str:
         return f"<{self.__class__.__name__} user_id={self.uin}>"
@@ -0,0 +1,215 @@
+import contextlib
+import json
+import sqlite3
+import threading
+from collections.abc import Generator, Mapping
+from pathlib import Path
+from typing import Protocol, cast, override
+
+type ConstData = dict[str, str]
+"""常量名称到 JSON 文本的映射"""
+type ConstChanges = Mapping[str, Mapping[str, str | None]]
+"""各用户需要写入的常量, 值为 None 时删除该常量"""
+
+
+class ConstBackend(Protocol):
+    """常量的存储后端
+
+    `open` 在启动时于工作线程中调用, `load` 在首次访问用户常量时调用,
+    `write` 在工作线程中批量写入修改.
+    `version` 在每次执行代码前调用, 返回值变化时说明其他进程修改了存储,
+    不支持多进程共享的后端始终返回 None
+    """
+
+    def open(self) -> None: ...
+    def version(self) -> int | None: ...
+    def load(self, uin: str) -> ConstData: ...
+    def write(self, changes: ConstChanges) -> None: ...
+    def close(self) -> None: ...
+
+
+class JsonBackend(ConstBackend):
+    """每个用户一个 JSON 文件, 写入时先写临时文件再重命名
+
+    仅供单个进程使用, 不检测其他进程对文件的修改
+    """
+
+    directory: Path
+
+    def __init__(self, directory: Path) -> None:
+        self.directory = directory
+
+    def _path(self, uin: str) -> Path:
+        return self.directory / f"{uin}.json"
+
+    @override
+    def open(self) -> None:
+        return None
+
+    @override
+    def version(self) -> int | None:
+        return None
+
+    @override
+    def load(self, uin: str) -> ConstData:
+        fp = self._path(uin)
+        if not fp.exists():
+            return {}
+        return {k: json.dumps(v) for k, v in json.loads(fp.read_text()).items()}
+
+    @override
+    def write(self, changes: ConstChanges) -> None:
+        for uin, items in changes.items():
+            data = self.load(uin)
+            for name, value in items.items():
+                if value is None:
+                    data.pop(name, None)
+                else:
+                    data[name] = value
+
+            fp = self._path(uin)
+            if not data:
+                fp.unlink(missing_ok=True)
+                continue
+            text = ", ".join(f"{json.dumps(k)}: {v}" for k, v in data.items())
+            tmp = fp.with_name(f"{fp.name}.tmp")
+            tmp.write_text(f"{{{text}}}")
+            tmp.replace(fp)
+
+    @override
+    def close(self) -> None:
+        return None
+
+
+class SqliteBackend(ConstBackend):
+    """所有用户共用一个 SQLite 数据库
+
+    使用 WAL 模式, 以 (session, name) 为主键, 每次写入在单个事务中逐项更新,
+    多个进程共享数据目录时不会覆盖彼此写入的其他常量,
+    `version` 返回 `PRAGMA data_version`, 其他连接提交修改后该值变化.
+    首次连接时将数据目录中已有的 JSON 文件导入数据库, 仅执行一次.
+    """
+
+    MIGRATED_KEY = "json_migrated"
+
+    path: Path
+    json_dir: Path | None
+    _conn: sqlite3.Connection | None
+    _lock: threading.Lock
+
+    def __init__(self, path: Path, json_dir: Path | None = None) -> None:
+        self.path = path
+        self.json_dir = json_dir
+        self._conn = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    @contextlib.contextmanager
+    def _transaction(conn: sqlite3.Connection) -> Generator[None]:
+        # BEGIN IMMEDIATE 立即获取写锁, 其他进程在 busy timeout 内等待
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is not None:
+            return self._conn
+
+        conn = sqlite3.connect(
+            self.path,
+            timeout=30,
+            isolation_level=None,
+            check_same_thread=False,
+        )
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS const_var ("
+            "session TEXT NOT NULL, name TEXT NOT NULL, value TEXT NOT NULL, "
+            "PRIMARY KEY (session, name)) WITHOUT ROWID"
+        )
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS meta ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL)"
+        )
+        if self.json_dir is not None:
+            self._migrate(conn, self.json_dir)
+        self._conn = conn
+        return conn
+
+    def _migrate(self, conn: sqlite3.Connection, json_dir: Path) -> None:
+        with self._transaction(conn):
+            row = conn.execute(
+                "SELECT 1 FROM meta WHERE key = ?", (self.MIGRATED_KEY,)
+            ).fetchone()
+            if row is not None:
+                return
+
+            rows: list[tuple[str, str, str]] = []
+            for fp in json_dir.glob("*.json"):
+                with contextlib.suppress(OSError, ValueError, AttributeError):
+                    data: dict[str, object] = json.loads(fp.read_text())
+                    rows.extend((fp.stem, k, json.dumps(v)) for k, v in data.items())
+
+            # 数据库中已有的常量优先
+            conn.executemany("INSERT OR IGNORE INTO const_var VALUES (?, ?, ?)", rows)
+            conn.execute(
+                "INSERT INTO meta VALUES (?, ?)", (self.MIGRATED_KEY, str(len(rows)))
+            )
+
+    @override
+    def open(self) -> None:
+        """连接数据库并导入 JSON 文件, 避免在首次读取常量时阻塞事件循环"""
+        with self._lock:
+            self._connect()
+
+    @override
+    def version(self) -> int | None:
+        with self._lock:
+            row = self._connect().execute("PRAGMA data_version").fetchone()
+            return cast("int", row[0])
+
+    @override
+    def load(self, uin: str) -> ConstData:
+        with self._lock:
+            cursor = self._connect().execute(
+                "SELECT name, value FROM const_var WHERE session = ?", (uin,)
+            )
+            return dict(cursor.fetchall())
+
+    @override
+    def write(self, changes: ConstChanges) -> None:
+        upserts = [
+            (uin, name, value)
+            for uin, items in changes.items()
+            for name, value in items.items()
+            if value is not None
+        ]
+        deletes = [
+            (uin, name)
+            for uin, items in changes.items()
+            for name, value in items.items()
+            if value is None
+        ]
+        with self._lock:
+            conn = self._connect()
+            with self._transaction(conn):
+                conn.executemany(
+                    "INSERT INTO const_var VALUES (?, ?, ?) "
+                    "ON CONFLICT (session, name) DO UPDATE SET value = excluded.value",
+                    upserts,
+                )
+                conn.executemany(
+                    "DELETE FROM const_var WHERE session = ? AND name = ?", deletes
+                )
+
+    @override
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
@@ -10,16 +10,18 @@ from typing import (
     Protocol,
     cast,
     get_overloads,
-    get_type_hints,
     overload,
     runtime_checkable,
 )
 
 import nonebot
 from nonebot.utils import is_coroutine_callable
-from tarina import generic_isinstance
 
+from ..debug import debug_switch
 from ..exception import ParamMismatch
+from .validator import T_Args as T_Args
+from .validator import T_Kwargs as T_Kwargs
+from .validator import get_validator
 
 INTERFACE_EXPORT_METHOD = "__export_method__"
 """接口方法上的 bool 类型变量，标识该方法是否为导出函数"""
@@ -45,13 +47,50 @@ def export[**P, R](call: Callable[P, R]) -> Callable[P, R]:
 
 
 type Coro[T] = Coroutine[None, None, T]
-type T_Args = tuple[Any, ...]
-type T_Kwargs = dict[str, Any]
 type BeforeWrapped = Callable[[T_Args, T_Kwargs], tuple[T_Args, T_Kwargs] | None]
 type AfterWrapped = Callable[[T_Args, T_Kwargs, object], tuple[bool, object]]
 type AnyCallable[**P, R] = Callable[P, Coro[R]] | Callable[P, R]
 
 
+@functools.cache
+def _wrapper_factory(
+    n_before: int,
+    n_after: int,
+    *,
+    is_async: bool,
+) -> Callable[..., Callable[..., Any]]:
+    """生成按顺序内联调用各钩子的 wrapper 工厂函数
+
+    生成的工厂函数接收 (call, *before, *after), 返回对应的 wrapper
+    """
+    before = [f"_b{i}" for i in range(n_before)]
+    after = [f"_a{i}" for i in range(n_after)]
+    await_ = "await " if is_async else ""
+
+    lines = [
+        f"def factory({', '.join(['_call', *before, *after])}):",
+        f"    {'async ' if is_async else ''}def wrapper(*args, **kwargs):",
+    ]
+    for name in before:
+        lines.append(f"        if res := {name}(args, kwargs):")
+        lines.append("            args, kwargs = res")
+    if after:
+        lines.append(f"        result = {await_}_call(*args, **kwargs)")
+        for name in after:
+            lines.append(f"        mock, value = {name}(args, kwargs, result)")
+            lines.append("        if mock:")
+            lines.append("            result = value")
+        lines.append("        return result")
+    else:
+        lines.append(f"        return {await_}_call(*args, **kwargs)")
+    lines.append("    return wrapper")
+
+    source = "\n".join(lines)
+    namespace: dict[str, Any] = {}
+    exec(compile(source, f"<make_wrapper {n_before}/{n_after}>", "exec"), namespace)  # noqa: S102
+    return namespace["factory"]
+
+
 def make_wrapper[**P, R](
     wrapped: AnyCallable[P, R],
     before: BeforeWrapped | None = None,
@@ -78,42 +117,24 @@ def make_wrapper[**P, R](
 
     # 如果已经被包装过，提取原函数和对应的 _before/_after
     # before -> *_before -> call -> *_after -> after
-    if wrapped_data := getattr(wrapped, "__exe_code_wrapped__", None):
+    # 绑定方法会将属性访问转发至原函数, 不能直接展开
+    target: object = wrapped
+    if not inspect.ismethod(target) and (
+        wrapped_data := getattr(target, "__exe_code_wrapped__", None)
+    ):
         _before: tuple[BeforeWrapped, ...]
         _after: tuple[AfterWrapped, ...]
         call, _before, _after = wrapped_data
         before_calls = (*before_calls, *_before)
         after_calls = (*_after, *after_calls)
 
-    def call_before(args: T_Args, kwargs: T_Kwargs) -> tuple[T_Args, T_Kwargs]:
-        for call in before_calls:
-            if res := call(args, kwargs):
-                args, kwargs = res
-        return args, kwargs
-
-    def call_after(args: T_Args, kwargs: T_Kwargs, result: object) -> object:
-        for call in after_calls:
-            mock, value = call(args, kwargs, result)
-            if mock:
-                result = value
-        return result
-
-    # 解析被包装函数的类型，创建 同步/异步 wrapper
-    if is_coroutine_callable(call):
-
-        async def wrapper_async(*args: Any, **kwargs: Any) -> Any:
-            args, kwargs = call_before(args, kwargs)
-            result = await cast(Callable[P, Coro[R]], call)(*args, **kwargs)
-            return call_after(args, kwargs, result)
-
-        wrapper = cast(Callable[P, R], wrapper_async)
-
-    else:
-
-        def wrapper(*args: Any, **kwargs: Any) -> Any:
-            args, kwargs = call_before(args, kwargs)
-            result = cast(Callable[P, R], call)(*args, **kwargs)
-            return call_after(args, kwargs, result)
+    # 按钩子数量生成专用的 wrapper, 避免每次调用时遍历钩子元组
+    factory = _wrapper_factory(
+        len(before_calls),
+        len(after_calls),
+        is_async=is_coroutine_callable(call),
+    )
+    wrapper = cast("Callable[P, R]", factory(call, *before_calls, *after_calls))
 
     # 使用 functools.update_wrapper 更新 wrapper 上的各属性
     wrapper = functools.update_wrapper(wrapper, wrapped, assigned=WRAPPER_ASSIGNMENTS)
@@ -135,6 +156,8 @@ def debug_log[**P, R](call: Callable[P, R]) -> Callable[P, R]: ...
 
 def debug_log[**P, R](call: AnyCallable[P, R]) -> AnyCallable[P, R]:
     """装饰一个函数，使其在被调用时输出 DEBUG 日志
+
+    未开启 DEBUG 日志时不会格式化参数
     Args:
         call (Callable[P, R]): 被装饰的函数
     Returns:
@@ -142,7 +165,8 @@ def debug_log[**P, R](call: AnyCallable[P, R]) -> AnyCallable[P, R]:
     """
 
     def before(args: T_Args, kwargs: T_Kwargs) -> None:
-        nonebot.logger.debug(f"{call.__name__}: args={args!r}, kwargs={kwargs!r}")
+        if debug_switch.enabled:
+            nonebot.logger.debug(f"{call.__name__}: args={args!r}, kwargs={kwargs!r}")
 
     return make_wrapper(call, before)
 
@@ -160,23 +184,7 @@ def _check_args(call: Callable[..., Any], args: T_Args, kwargs: T_Kwargs) -> Non
             / 无法解析函数类型注解
             / 函数参数不符合类型注解
     """
-    arguments = inspect.signature(call).bind(*args, **kwargs).arguments
-    arguments.pop("cls", None)
-    arguments.pop("self", None)
-    if not arguments:
-        return
-
-    annotations = get_type_hints(call)
-    for name, value in arguments.items():
-        annotation = annotations[name]
-        if not generic_isinstance(value, annotation):
-            from .help_doc import format_annotation
-
-            raise TypeError(
-                f"Invalid argument for param {name!r} of {call.__name__!r}: "
-                f"expected {format_annotation(annotation)}, "
-                f"got {format_annotation(type(value))}"
-            )
+    get_validator(call)(args, kwargs)
 
 
 @overload
@@ -208,6 +216,10 @@ def strict[**P, R](call: AnyCallable[P, R]) -> AnyCallable[P, R]:
                 f"Parameter {name!r} of strict callable {call.__name__!r} is not typed"
             )
 
+    # 尽可能在装饰时解析类型注解, 注解引用了尚未定义的名称时推迟至首次调用
+    with contextlib.suppress(NameError):
+        get_validator(call)
+
     def before(args: T_Args, kwargs: T_Kwargs) -> None:
         _check_args(call, args, kwargs)
 
@@ -225,11 +237,20 @@ class _DescriptorType[T, **P, R](Protocol):
     def __set_name__(self, owner: type[T], name: str) -> None: ...
 
 
+type _DispatchKey = tuple[tuple[type, ...], tuple[tuple[str, type], ...]]
+
+_DISPATCH_CACHE_SIZE = 128
+"""单个 Overload 按参数类型缓存的重载数量上限"""
+
+
 class Overload[T, **P, R]:
+    __dispatch: dict[_DispatchKey, Callable[..., Any]]
+
     def __init__(
         self, call: Callable[Concatenate[T, P], R] | _DescriptorType[T, P, R]
     ) -> None:
         self.__origin = call
+        self.__dispatch = {}
 
     def __set_name__(self, owner: type[T], name: str) -> None:
         self.__name = name
@@ -237,22 +258,26 @@ class Overload[T, **P, R]:
             _set_name(owner, name)
 
     def __find_overload(self, args: T_Args, kwargs: T_Kwargs) -> Callable[..., Any]:
+        key: _DispatchKey = (
+            tuple(map(type, args)),
+            tuple((k, type(v)) for k, v in kwargs.items()) if kwargs else (),
+        )
+        if (call := self.__dispatch.get(key)) is not None:
+            return call
+
+        # 仅当命中的重载及其之前的所有重载都只依赖参数类型时,
+        # 相同类型的参数才必然匹配到同一重载, 此时可以缓存结果
+        cacheable = True
         for call in self.__overloads__:
-            with contextlib.suppress(TypeError):
-                _check_args(call, args, kwargs)
+            validator = get_validator(call)
+            cacheable = cacheable and validator.type_determined
+            if validator.check(args, kwargs):
+                if cacheable and len(self.__dispatch) < _DISPATCH_CACHE_SIZE:
+                    self.__dispatch[key] = call
                 return call
         raise ParamMismatch(f"未找到匹配的重载: {args=}, {kwargs=}")
 
-    @overload
-    def __get__(self, obj: T, objtype: type[T]) -> Callable[P, R]: ...
-    @overload
-    def __get__(
-        self, obj: None, objtype: type[T]
-    ) -> Callable[Concatenate[T, P], R]: ...
-
-    def __get__(
-        self, obj: T | None, objtype: type[T]
-    ) -> Callable[P, R] | Callable[Concatenate[T, P], R]:
+    def __make_wrapper(self, obj: T | None, objtype: type[T]) -> Callable[..., Any]:
         call = self.__origin
         if _get := getattr(self.__origin, "__get__", None):
             call = _get(obj, objtype)
@@ -281,6 +306,26 @@ class Overload[T, **P, R]:
 
         return functools.update_wrapper(wrapper, call, assigned=WRAPPER_ASSIGNMENTS)
 
+    @overload
+    def __get__(self, obj: T, objtype: type[T]) -> Callable[P, R]: ...
+    @overload
+    def __get__(
+        self, obj: None, objtype: type[T]
+    ) -> Callable[Concatenate[T, P], R]: ...
+
+    def __get__(
+        self, obj: T | None, objtype: type[T]
+    ) -> Callable[P, R] | Callable[Concatenate[T, P], R]:
+        # 接口实例上的绑定结果缓存在 __bound_methods__ 中, 与 MethodDescriptor 一致
+        bound: dict[object, Callable[..., Any]] | None = getattr(
+            obj, "__bound_methods__", None
+        )
+        if bound is None:
+            return self.__make_wrapper(obj, objtype)
+        if (wrapper := bound.get(self)) is None:
+            wrapper = bound[self] = self.__make_wrapper(obj, objtype)
+        return wrapper
+
     def __set__(self, obj: T, value: Any) -> Any:
         raise AttributeError(f"attribute {self.__name!r} of {obj!r} is readonly")
 
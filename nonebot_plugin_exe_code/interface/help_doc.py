@@ -1,4 +1,5 @@
 import inspect
+import types
 import weakref
 from collections.abc import Callable
 from dataclasses import dataclass
@@ -8,7 +9,7 @@ from nonebot.adapters import Message, MessageSegment
 from nonebot_plugin_alconna.uniseg import Receipt
 
 from ..typings import T_ConstVar, T_ForwardMsg, T_Message
-from .decorators import INTERFACE_METHOD_DESCRIPTION, make_wrapper
+from .decorators import INTERFACE_METHOD_DESCRIPTION
 from .utils import Result
 
 if TYPE_CHECKING:
@@ -30,9 +31,17 @@ type_alias: dict[object, str] = {
 }
 
 
+help_cache: dict[object, Any] = {}
+"""格式化后的帮助文档缓存, 依赖 type_alias, 在其变化时清空"""
+
+
 def message_alia(m: type[Message], ms: type[MessageSegment], /) -> None:
+    if type_alias.get(m) == "Message" and type_alias.get(ms) == "MessageSegment":
+        return
+
     type_alias[m] = "Message"
     type_alias[ms] = "MessageSegment"
+    help_cache.clear()
 
 
 def format_annotation(t: object) -> str:
@@ -70,16 +79,18 @@ class MethodDescription[T: "Interface", **P, R]:
         return self.call.__name__
 
     def format(self) -> str:
-        return DESCRIPTION_FORMAT.format(
-            decl=func_declaration(self.call, self.ignore),
-            desc=self.description,
-            params=(
-                "\n".join(f" - {k}: {v}" for k, v in self.parameters.items())
-                if self.parameters
-                else "无"
-            ),
-            res=self.result or "无",
-        )
+        if (text := help_cache.get(self)) is None:
+            text = help_cache[self] = DESCRIPTION_FORMAT.format(
+                decl=func_declaration(self.call, self.ignore),
+                desc=self.description,
+                params=(
+                    "\n".join(f" - {k}: {v}" for k, v in self.parameters.items())
+                    if self.parameters
+                    else "无"
+                ),
+                res=self.result or "无",
+            )
+        return text
 
     @override
     def __hash__(self) -> int:
@@ -99,11 +110,12 @@ class MethodDescriptor[T: "Interface", **P, R]:
         self.__name = name
         self.__desc.inst_name = owner.__inst_name__
 
-    def __make_wrapper(self, obj: T) -> Callable[P, R]:
-        def before(args: tuple, kwargs: dict) -> tuple[tuple, dict]:
-            return (obj, *args), kwargs
-
-        return cast(Callable[P, R], make_wrapper(self.__desc.call, before))
+    def __bind(self, obj: T) -> Callable[P, R]:
+        # 绑定结果缓存在实例上, 避免每次属性访问都创建新对象
+        bound = obj.__bound_methods__
+        if (method := bound.get(self)) is None:
+            method = bound[self] = types.MethodType(self.__desc.call, obj)
+        return cast("Callable[P, R]", method)
 
     @overload
     def __get__(self, obj: T, objtype: type[T]) -> Callable[P, R]: ...
@@ -115,7 +127,7 @@ class MethodDescriptor[T: "Interface", **P, R]:
     def __get__(
         self, obj: T | None, objtype: type[T]
     ) -> Callable[P, R] | Callable[Concatenate[T, P], R]:
-        return self.__desc.call if obj is None else self.__make_wrapper(obj)
+        return self.__desc.call if obj is None else self.__bind(obj)
 
     def __set__(self, obj: T, value: Callable[Concatenate[T, P], R]) -> NoReturn:
         raise AttributeError(f"attribute {self.__name!r} of {obj!r} is readonly")
@@ -1,8 +1,14 @@
+import contextlib
 import functools
-from collections.abc import Mapping
+import shutil
+import uuid
+from collections import OrderedDict
+from collections.abc import AsyncGenerator, Iterable, Mapping
 from http.cookiejar import CookieJar
+from pathlib import Path
 from typing import IO, Self, override
 
+import anyio
 from multidict import CIMultiDict
 from nonebot import get_driver
 from nonebot.drivers import HTTPClientMixin
@@ -13,10 +19,23 @@ from nonebot.internal.driver.model import (
 )
 from yarl import URL
 
+from ..config import config
+from ..constant import CACHE_DIR
 from .decorators import debug_log, strict
 from .help_doc import descript
+from .http_cache import http_cache
 from .interface import Interface
 
+DOWNLOAD_DIR = CACHE_DIR / "download"
+
+_downloads: OrderedDict[Path, int] = OrderedDict()
+"""已下载的文件及其大小, 按下载顺序排列"""
+
+
+class ResponseTooLarge(OverflowError):  # noqa: N818
+    """响应内容超过 `limit` 或配置项 `http_stream_limit`"""
+
+
 SimpleQuery = str | int | float
 QueryTypes = (
     None
@@ -48,6 +67,30 @@ _PARAMETER_DESCRIPTION = dict(
     json="请求 JSON 数据",
     files="上传文件",
 )
+_CACHE_DESCRIPTION = "是否使用响应缓存, 默认跟随配置项 `http_cache`"
+_LIMIT_DESCRIPTION = "允许读取的最大字节数, 不超过配置项 `http_stream_limit`"
+
+
+def _evict_downloads() -> list[Path]:
+    """超出 `http_download_quota`/`http_download_max_files` 时移除最早下载的文件
+
+    最新下载的文件总是保留
+    """
+    total = sum(_downloads.values())
+    stale: list[Path] = []
+    while len(_downloads) > 1 and (
+        len(_downloads) > config.http_download_max_files
+        or total > config.http_download_quota
+    ):
+        path, size = _downloads.popitem(last=False)
+        total -= size
+        stale.append(path)
+    return stale
+
+
+def _remove_files(paths: Iterable[Path]) -> None:
+    for path in paths:
+        path.unlink(missing_ok=True)
 
 
 class WrappedResponse:
@@ -100,6 +143,7 @@ class Http(Interface):
         parameters=dict(
             method="请求方法",
             **_PARAMETER_DESCRIPTION,
+            cache=_CACHE_DESCRIPTION,
         ),
         result="请求响应",
     )
@@ -117,6 +161,7 @@ class Http(Interface):
         data: DataTypes = None,
         json: object = None,
         files: FilesTypes = None,
+        cache: bool | None = None,
     ) -> WrappedResponse:
         setup = Request(
             method=method,
@@ -129,11 +174,15 @@ class Http(Interface):
             json=json,
             files=files,
         )
+        if cache is None:
+            cache = config.http_cache
+        if cache:
+            return WrappedResponse(await http_cache.fetch(self._http, setup))
         return WrappedResponse(await self._http.request(setup))
 
     @descript(
         description="发送 GET 请求",
-        parameters=_PARAMETER_DESCRIPTION.copy(),
+        parameters=dict(**_PARAMETER_DESCRIPTION, cache=_CACHE_DESCRIPTION),
         result="请求响应",
     )
     async def get(
@@ -147,6 +196,7 @@ class Http(Interface):
         data: DataTypes = None,
         json: object = None,
         files: FilesTypes = None,
+        cache: bool | None = None,
     ) -> WrappedResponse:
         return await self.request(
             "GET",
@@ -158,6 +208,7 @@ class Http(Interface):
             data=data,
             json=json,
             files=files,
+            cache=cache,
         )
 
     @descript(
@@ -188,3 +239,121 @@ class Http(Interface):
             json=json,
             files=files,
         )
+
+    @descript(
+        description="发送 HTTP 请求, 逐块读取响应内容而不是一次性读入内存",
+        parameters=dict(
+            method="请求方法",
+            **_PARAMETER_DESCRIPTION,
+            chunk_size="每次读取的字节数",
+            limit=_LIMIT_DESCRIPTION,
+        ),
+        result="响应内容的异步迭代器, 响应状态码错误或内容超过限制时抛出异常",
+    )
+    @debug_log
+    @strict
+    async def stream(
+        self,
+        method: str | bytes,
+        url: URL | str,
+        *,
+        params: QueryTypes = None,
+        headers: HeaderTypes = None,
+        cookies: CookieTypes = None,
+        content: ContentTypes = None,
+        data: DataTypes = None,
+        json: object = None,
+        files: FilesTypes = None,
+        chunk_size: int = 65536,
+        limit: int | None = None,
+    ) -> AsyncGenerator[bytes]:
+        setup = Request(
+            method=method,
+            url=url,
+            params=params,
+            headers=headers,
+            cookies=cookies,
+            content=content,
+            data=data,
+            json=json,
+            files=files,
+        )
+        if limit is None or limit > config.http_stream_limit:
+            limit = config.http_stream_limit
+
+        received = 0
+        stream = self._http.stream_request(setup, chunk_size=chunk_size)
+        async with contextlib.aclosing(stream):
+            async for response in stream:
+                wrapped = WrappedResponse(response)
+                if received == 0:
+                    wrapped.raise_for_status()
+                    length = response.headers.get("Content-Length", "")
+                    if length.isdigit() and int(length) > limit:
+                        raise ResponseTooLarge(
+                            f"响应内容长度 {length} 超过限制 {limit}"
+                        )
+
+                chunk = wrapped.read()
+                received += len(chunk)
+                if received > limit:
+                    raise ResponseTooLarge(f"响应内容超过限制 {limit}")
+                yield chunk
+
+    @descript(
+        description="下载文件至临时目录, 返回的路径可直接用于发送文件",
+        parameters=dict(
+            url="请求地址",
+            params="请求参数",
+            headers="请求头",
+            cookies="请求 cookies",
+            limit=_LIMIT_DESCRIPTION,
+        ),
+        result=(
+            "下载的文件路径, 后缀名与请求地址相同; "
+            "超出配置项 `http_download_quota`/`http_download_max_files` 时"
+            "最早下载的文件会被删除"
+        ),
+    )
+    async def download(
+        self,
+        url: URL | str,
+        *,
+        params: QueryTypes = None,
+        headers: HeaderTypes = None,
+        cookies: CookieTypes = None,
+        limit: int | None = None,
+    ) -> Path:
+        path = DOWNLOAD_DIR / f"{uuid.uuid4().hex}{Path(URL(url).path).suffix}"
+        await anyio.Path(DOWNLOAD_DIR).mkdir(parents=True, exist_ok=True)
+        size = 0
+        try:
+            async with await anyio.open_file(path, "wb") as file:
+                async for chunk in self.stream(
+                    "GET",
+                    url,
+                    params=params,
+                    headers=headers,
+                    cookies=cookies,
+                    limit=limit,
+                ):
+                    await file.write(chunk)
+                    size += len(chunk)
+        except BaseException:
+            # 超过大小限制或下载失败时删除不完整的文件
+            await anyio.Path(path).unlink(missing_ok=True)
+            raise
+
+        _downloads[path] = size
+        if stale := _evict_downloads():
+            await anyio.to_thread.run_sync(_remove_files, stale)
+        return path
+
+
+@get_driver().on_startup
+@get_driver().on_shutdown
+async def _cleanup_downloads() -> None:
+    """删除下载的文件, 启动时一并清理上次异常退出时残留的文件"""
+    _downloads.clear()
+    cleanup = functools.partial(shutil.rmtree, DOWNLOAD_DIR, ignore_errors=True)
+    await anyio.to_thread.run_sync(cleanup)
@@ -0,0 +1,377 @@
+import contextlib
+import email.utils
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Mapping
+from pathlib import Path
+from typing import NamedTuple, Self
+
+import anyio
+from multidict import CIMultiDict
+from nonebot.drivers import HTTPClientMixin
+from nonebot.internal.driver.model import Request, Response
+
+from ..config import config
+from ..constant import CACHE_DIR
+
+HTTP_CACHE_DIR = CACHE_DIR / "http"
+
+CONDITIONAL_HEADERS = frozenset({"if-none-match", "if-modified-since"})
+"""请求中已包含这些请求头时, 由用户代码自行处理条件请求, 不使用缓存"""
+
+
+def parse_cache_control(value: str) -> dict[str, str | None]:
+    directives: dict[str, str | None] = {}
+    for item in value.split(","):
+        name, sep, arg = item.strip().partition("=")
+        if name:
+            directives[name.lower()] = arg.strip('"') if sep else None
+    return directives
+
+
+def _parse_date(value: str | None) -> float | None:
+    if not value:
+        return None
+    try:
+        return email.utils.parsedate_to_datetime(value).timestamp()
+    except (TypeError, ValueError):
+        return None
+
+
+def freshness_lifetime(headers: Mapping[str, str]) -> float | None:
+    """根据响应头计算响应的有效期 (秒)
+
+    Returns:
+        float | None: 响应的有效期, 响应不可缓存时返回 None
+    """
+    directives = parse_cache_control(headers.get("Cache-Control", ""))
+    if "no-store" in directives:
+        return None
+    if "no-cache" in directives:
+        return 0
+
+    age = 0
+    with contextlib.suppress(ValueError):
+        age = int(headers.get("Age", 0))
+
+    if (max_age := directives.get("max-age")) is not None:
+        with contextlib.suppress(ValueError):
+            return max(int(max_age) - age, 0)
+
+    if "Expires" in headers:
+        # 无法解析的 Expires 视为已过期
+        expires = _parse_date(headers["Expires"])
+        date = _parse_date(headers.get("Date")) or time.time()
+        return max(expires - date - age, 0) if expires is not None else 0
+
+    return max(config.http_cache_ttl - age, 0)
+
+
+class CachedResponse(NamedTuple):
+    status_code: int
+    headers: tuple[tuple[str, str], ...]
+    content: bytes
+    expires: float
+    """过期时间 (Unix 时间戳), 过期后需要重新验证"""
+
+    @property
+    def validators(self) -> dict[str, str]:
+        """重新验证时附加的条件请求头"""
+        headers = CIMultiDict(self.headers)
+        result: dict[str, str] = {}
+        if etag := headers.get("ETag"):
+            result["If-None-Match"] = etag
+        if last_modified := headers.get("Last-Modified"):
+            result["If-Modified-Since"] = last_modified
+        return result
+
+    @property
+    def private(self) -> bool:
+        """响应仅供单个用户使用, 不写入共享的磁盘缓存"""
+        headers = CIMultiDict(self.headers)
+        return "private" in parse_cache_control(headers.get("Cache-Control", ""))
+
+    @classmethod
+    def from_response(cls, response: Response, now: float) -> Self | None:
+        if response.status_code != 200:
+            return None
+
+        content = response.content or b""
+        if isinstance(content, str):
+            content = content.encode()
+        if len(content) > config.http_cache_max_bytes:
+            return None
+
+        entry = cls(response.status_code, tuple(response.headers.items()), content, 0)
+        return entry.refresh({}, now)
+
+    def refresh(self, headers: Mapping[str, str], now: float) -> Self | None:
+        """使用重新验证 (304) 响应的响应头更新缓存条目
+
+        Returns:
+            Self | None: 更新后的缓存条目, 不可缓存时返回 None
+        """
+        merged = CIMultiDict(self.headers)
+        merged.update(headers)
+        if (lifetime := freshness_lifetime(merged)) is None:
+            return None
+        # 已过期且无法重新验证的响应没有缓存价值
+        entry = self._replace(headers=tuple(merged.items()), expires=now + lifetime)
+        return entry if lifetime > 0 or entry.validators else None
+
+    def to_response(self, request: Request) -> Response:
+        return Response(
+            self.status_code,
+            headers=CIMultiDict(self.headers),
+            content=self.content,
+            request=request,
+        )
+
+    def dump(self) -> bytes:
+        meta = [self.status_code, self.headers, self.expires]
+        return json.dumps(meta).encode() + b"\n" + self.content
+
+    @classmethod
+    def load(cls, raw: bytes) -> Self | None:
+        meta, _, content = raw.partition(b"\n")
+        try:
+            status_code, headers, expires = json.loads(meta)
+            return cls(
+                int(status_code),
+                tuple((str(k), str(v)) for k, v in headers),
+                content,
+                float(expires),
+            )
+        except (TypeError, ValueError):
+            return None
+
+
+class HttpCacheInfo(NamedTuple):
+    hits: int
+    revalidated: int
+    misses: int
+    disk_hits: int
+    evictions: int
+    maxsize: int
+    currsize: int
+    disksize: int
+    diskbytes: int
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.revalidated + self.misses
+        return (self.hits + self.revalidated) / total if total else 0
+
+
+class HttpCache:
+    """HTTP 响应缓存
+
+    内存中保存最近使用的 `maxsize` 个响应, 设置 `directory` 时同时写入磁盘,
+    内存未命中时从磁盘读取. 仅缓存不带请求体的 GET 请求的 200 响应,
+    遵循 Cache-Control/Expires 计算有效期, 过期后使用 ETag/Last-Modified
+    发送条件请求, 收到 304 时继续使用缓存的响应体.
+    声明 `Cache-Control: private` 的响应仅保存在内存中.
+    """
+
+    maxsize: int
+    directory: Path | None
+    hits: int
+    """未过期直接命中"""
+    revalidated: int
+    """过期后经服务器确认未修改"""
+    misses: int
+    disk_hits: int
+    evictions: int
+    _data: OrderedDict[str, CachedResponse]
+    disk_bytes: int
+    """磁盘中缓存文件的总大小"""
+    _disk: OrderedDict[str, int] | None
+    """磁盘中的缓存文件及其大小, 按写入顺序排列, 首次访问磁盘时扫描目录"""
+    _disk_lock: threading.Lock
+
+    def __init__(self, maxsize: int, directory: Path | None = None) -> None:
+        self.maxsize = maxsize
+        self.directory = directory
+        self._data = OrderedDict()
+        self.disk_bytes = 0
+        self._disk = None
+        self._disk_lock = threading.Lock()
+        self.clear()
+
+    @staticmethod
+    def make_key(request: Request) -> str | None:
+        """计算请求的缓存键, 请求不可缓存时返回 None"""
+        if (
+            request.method != "GET"
+            or any(
+                x is not None
+                for x in (request.content, request.data, request.json, request.files)
+            )
+            or not CONDITIONAL_HEADERS.isdisjoint(map(str.lower, request.headers))
+        ):
+            return None
+
+        headers = sorted((k.lower(), v) for k, v in request.headers.items())
+        cookies = sorted(
+            (c.name, c.value or "", c.domain, c.path) for c in request.cookies.jar
+        )
+        data = json.dumps([str(request.url), headers, cookies])
+        return hashlib.sha256(data.encode()).hexdigest()
+
+    def _scan(self) -> OrderedDict[str, int]:
+        """读取磁盘中已有的缓存文件, 忽略未完成写入的临时文件"""
+        assert self.directory is not None
+        if self._disk is not None:
+            return self._disk
+
+        files: list[tuple[float, str, int]] = []
+        with contextlib.suppress(OSError):
+            for path in self.directory.iterdir():
+                if path.suffix == ".tmp":
+                    continue
+                # 文件可能被并发删除
+                with contextlib.suppress(OSError):
+                    stat = path.stat()
+                    files.append((stat.st_mtime, path.name, stat.st_size))
+        files.sort()
+        self._disk = OrderedDict((name, size) for _, name, size in files)
+        self.disk_bytes = sum(self._disk.values())
+        return self._disk
+
+    def _forget(self, key: str) -> None:
+        with self._disk_lock:
+            size = self._scan().pop(key, 0)
+            self.disk_bytes -= size
+
+    def _read(self, key: str) -> CachedResponse | None:
+        assert self.directory is not None
+        try:
+            raw = (self.directory / key).read_bytes()
+        except OSError:
+            self._forget(key)
+            return None
+        return CachedResponse.load(raw)
+
+    def _write(self, key: str, entry: CachedResponse | None) -> None:
+        assert self.directory is not None
+        fp = self.directory / key
+        if entry is None:
+            self._forget(key)
+            fp.unlink(missing_ok=True)
+            return
+
+        self.directory.mkdir(parents=True, exist_ok=True)
+        data = entry.dump()
+        tmp = fp.with_name(f"{key}.{threading.get_ident()}.tmp")
+        tmp.write_bytes(data)
+        tmp.replace(fp)
+
+        # 超出容量时删除最早写入的文件
+        excess: list[str] = []
+        with self._disk_lock:
+            disk = self._scan()
+            size = disk.pop(key, 0)
+            self.disk_bytes += len(data) - size
+            disk[key] = len(data)
+            while len(disk) > config.http_cache_disk_size:
+                name, size = disk.popitem(last=False)
+                self.disk_bytes -= size
+                excess.append(name)
+        for name in excess:
+            (self.directory / name).unlink(missing_ok=True)
+
+    async def get(self, key: str) -> CachedResponse | None:
+        if (entry := self._data.get(key)) is not None:
+            self._data.move_to_end(key)
+            return entry
+
+        if self.directory is None:
+            return None
+        if (entry := await anyio.to_thread.run_sync(self._read, key)) is not None:
+            self.disk_hits += 1
+            self._store(key, entry)
+        return entry
+
+    def _store(self, key: str, entry: CachedResponse) -> None:
+        if self.maxsize <= 0:
+            return
+
+        self._data[key] = entry
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    async def put(self, key: str, entry: CachedResponse | None) -> None:
+        """写入缓存条目, 为 None 时删除"""
+        if entry is None:
+            self._data.pop(key, None)
+        else:
+            self._store(key, entry)
+        if self.directory is not None:
+            disk_entry = None if entry is not None and entry.private else entry
+            await anyio.to_thread.run_sync(self._write, key, disk_entry)
+
+    async def fetch(self, http: HTTPClientMixin, request: Request) -> Response:
+        """通过缓存发送请求"""
+        if (key := self.make_key(request)) is None:
+            return await http.request(request)
+
+        now = time.time()
+        if (entry := await self.get(key)) is not None:
+            if now < entry.expires:
+                self.hits += 1
+                return entry.to_response(request)
+            request.headers.update(entry.validators)
+
+        response = await http.request(request)
+        now = time.time()
+        if entry is not None and response.status_code == 304:
+            self.revalidated += 1
+            refreshed = entry.refresh(response.headers, now)
+            await self.put(key, refreshed)
+            return (refreshed or entry).to_response(request)
+
+        self.misses += 1
+        new = CachedResponse.from_response(response, now)
+        if new is not None or entry is not None:
+            await self.put(key, new)
+        return response
+
+    def clear(self) -> None:
+        """清空内存中的缓存和统计数据"""
+        self._data.clear()
+        self.hits = self.revalidated = self.misses = 0
+        self.disk_hits = self.evictions = 0
+
+    def cache_info(self) -> HttpCacheInfo:
+        return HttpCacheInfo(
+            hits=self.hits,
+            revalidated=self.revalidated,
+            misses=self.misses,
+            disk_hits=self.disk_hits,
+            evictions=self.evictions,
+            maxsize=self.maxsize,
+            currsize=len(self._data),
+            disksize=len(self._disk or ()),
+            diskbytes=self.disk_bytes,
+        )
+
+    def format_stats(self) -> str:
+        info = self.cache_info()
+        return (
+            f"http_cache: hits={info.hits} revalidated={info.revalidated} "
+            f"misses={info.misses} hit_rate={info.hit_rate:.1%}\n"
+            f"disk_hits={info.disk_hits} evictions={info.evictions} "
+            f"size={info.currsize}/{info.maxsize} "
+            f"disk={info.disksize} ({info.diskbytes} bytes)"
+        )
+
+
+http_cache = HttpCache(
+    config.http_cache_size,
+    HTTP_CACHE_DIR if config.http_cache_disk else None,
+)
@@ -1,10 +1,15 @@
 import functools
-from collections.abc import Generator
-from typing import ClassVar, NamedTuple, Self
+import inspect
+import operator
+import types
+from collections.abc import Callable
+from collections.abc import Set as AbstractSet
+from typing import Any, ClassVar, NamedTuple, Self
 
 from ..typings import T_Context
-from .help_doc import MethodDescription
-from .user_const_var import BUILTINS_KEY, DEFAULT_BUILTINS
+from .decorators import Overload
+from .help_doc import MethodDescription, MethodDescriptor, help_cache
+from .user_const_var import ensure_builtins
 from .utils import get_method_description, is_export_method
 
 
@@ -15,21 +20,54 @@ class _Desc(NamedTuple):
     description: str
 
 
+type _Binder = Callable[[Any], object]
+
+_MISSING = object()
+
+
+def _make_binder(cls: type, name: str) -> _Binder:
+    # 方法在类创建时解析一次, 导出时仅需绑定实例
+    if isinstance(
+        inspect.getattr_static(cls, name),
+        types.FunctionType | MethodDescriptor | Overload,
+    ):
+        return functools.partial(types.MethodType, getattr(cls, name))
+    return operator.attrgetter(name)  # pragma: no cover
+
+
 class Interface:
-    __slots__ = ("__builtins", "__context", "__exported")
+    __slots__ = (
+        "__bound_methods__",
+        "__builtins",
+        "__context",
+        "__names",
+        "__shadowed",
+    )
 
     __inst_name__: ClassVar[str] = "interface"
     __export_method__: ClassVar[set[str]] = set()
+    __export_table__: ClassVar[tuple[tuple[str, _Binder], ...]] = ()
     __method_description__: ClassVar[set[MethodDescription]] = set()
 
+    __bound_methods__: dict[object, Callable[..., Any]]
+    """实例上已绑定的方法, 以描述符为键"""
     __builtins: dict[str, object] | None
     __context: T_Context | None
-    __exported: set[str]
-
-    def __init__(self, context: T_Context | None = None) -> None:
-        self.__builtins = DEFAULT_BUILTINS.copy() if context is not None else None
+    __names: AbstractSet[str] | None
+    """执行的代码引用的名称, 进入时仅导出这些名称"""
+    __shadowed: dict[str, object]
+    """导出时被覆盖的 builtins 原值, 退出时恢复"""
+
+    def __init__(
+        self,
+        context: T_Context | None = None,
+        names: AbstractSet[str] | None = None,
+    ) -> None:
+        self.__bound_methods__ = {}
+        self.__builtins = None
         self.__context = context
-        self.__exported = set()
+        self.__names = names
+        self.__shadowed = {}
 
     def __init_subclass__(cls) -> None:
         # e.g.: User[xxx]
@@ -47,32 +85,54 @@ class Interface:
             for value in cls.__dict__.values()
             if (desc := get_method_description(value))
         }
+        export_names = set[str]().union(
+            *(c.__export_method__ for c in cls.mro() if issubclass(c, Interface))
+        )
+        cls.__export_table__ = tuple(
+            (name, _make_binder(cls, name)) for name in sorted(export_names)
+        )
 
     def _export(self, key: str, val: object) -> None:
-        if self.__builtins is None:  # pragma: no cover
+        if self.__context is None:  # pragma: no cover
             raise TypeError(
                 f"Interface class {type(self).__name__!r} not allowed to export"
             )
-        self.__builtins[key] = val
-        self.__exported.add(key)
 
-    def export(self) -> None:
+        # 直接写入上下文的 builtins, 不再为每次执行复制完整的 builtins
+        builtins = ensure_builtins(self.__context)
+        if builtins is not self.__builtins:
+            # 上下文被重置时, builtins 已被替换
+            self.__builtins, self.__shadowed = builtins, {}
+        if key not in self.__shadowed:
+            self.__shadowed[key] = builtins.get(key, _MISSING)
+        builtins[key] = val
+
+    def export(self, names: AbstractSet[str] | None = None) -> None:
+        """向上下文的 builtins 导出接口
+
+        Args:
+            names (AbstractSet[str] | None, optional):
+                仅导出其中的名称, 为 None 时导出全部. 默认值为 None.
+        """
         self._export(self.__inst_name__, self)
-        for name in self._get_export_method():
-            self._export(name, getattr(self, name))
+        for name, bind in self.__export_table__:
+            if names is None or name in names:
+                self._export(name, bind(self))
 
     def __enter__(self) -> Self:
         assert self.__context is not None
-        assert self.__builtins is not None
 
-        self.export()
-        self.__context[BUILTINS_KEY] = self.__builtins
+        self.export(self.__names)
         return self
 
     def __exit__(self, *_: object) -> bool:
-        if _builtins := self.__builtins:
-            for name in self.__exported:
-                _builtins.pop(name, None)
+        if (builtins := self.__builtins) is not None:
+            for name, value in self.__shadowed.items():
+                if value is _MISSING:
+                    builtins.pop(name, None)
+                else:
+                    builtins[name] = value
+            self.__shadowed.clear()
         return False
 
     async def __aenter__(self) -> Self:
@@ -82,15 +142,14 @@ class Interface:
         return self.__exit__(*_)
 
     @classmethod
-    def _get_export_method(cls) -> Generator[str, None, None]:
-        yield from functools.reduce(
-            set[str].union,
-            (c.__export_method__ for c in cls.mro() if issubclass(c, Interface)),
-            set(),
-        )
+    def get_all_description(cls) -> tuple[list[str], list[str]]:
+        if (cached := help_cache.get(cls)) is None:
+            cached = help_cache[cls] = cls._build_all_description()
+        content, result = cached
+        return list(content), list(result)
 
     @classmethod
-    def get_all_description(cls) -> tuple[list[str], list[str]]:
+    def _build_all_description(cls) -> tuple[tuple[str, ...], tuple[str, ...]]:
         method_dict: dict[str, _Desc] = {}
 
         c: type[Interface]
@@ -118,4 +177,4 @@ class Interface:
             content.append(prefix + desc.func_name)
             result.append(prefix + desc.description)
 
-        return content, result
+        return tuple(content), tuple(result)
@@ -0,0 +1,214 @@
+import bisect
+import itertools
+import math
+import time
+from collections.abc import Hashable, Iterator
+
+import anyio
+from nonebot.adapters import Bot
+from nonebot.internal.matcher import current_event
+from nonebot_plugin_alconna.uniseg import Target, get_target
+from nonebot_plugin_user.models import UserSession
+
+from ..config import config
+from ..stats import Histogram, format_histograms
+
+type BucketKey = tuple[str, Hashable]
+type _Request = tuple[int, int, tuple[BucketKey, ...]]
+
+PRIORITY_REPLY = 0
+"""回复当前会话的消息"""
+PRIORITY_BULK = 1
+"""向指定用户/群组发送的消息"""
+
+
+class ReachLimit(Exception):  # noqa: N818
+    def __init__(self, msg: str) -> None:
+        self.msg = msg
+
+
+class TokenBucket:
+    """令牌桶: 最多积累 `burst` 个令牌, 每 `interval` 秒补充一个"""
+
+    __slots__ = ("burst", "interval", "tokens", "updated")
+
+    burst: int
+    interval: float
+    tokens: float
+    updated: float
+
+    def __init__(self, burst: int, interval: float) -> None:
+        self.burst = burst
+        self.interval = interval
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def refill(self, now: float) -> float:
+        if self.interval <= 0:
+            self.tokens = self.burst
+        else:
+            elapsed = (now - self.updated) / self.interval
+            self.tokens = min(self.burst, self.tokens + elapsed)
+        self.updated = now
+        return self.tokens
+
+    def delay(self, tokens: float) -> float:
+        """可用令牌数为 `tokens` 时, 获得一个令牌需要等待的时间"""
+        return max(1 - tokens, 0) * self.interval
+
+
+class SendScheduler:
+    """消息发送调度器
+
+    每次发送需要同时从机器人、用户、发送目标三个令牌桶中各取得一个令牌,
+    令牌不足时等待而不是直接失败. 等待中的请求按优先级和到达顺序排列,
+    回复当前会话的消息优先于向指定用户/群组发送的消息,
+    使用相同令牌桶的请求不会越过之前仍在等待该令牌桶的请求.
+    """
+
+    MAX_BUCKETS = 4096
+
+    _buckets: dict[BucketKey, TokenBucket]
+    _pending: list[_Request]
+    _changed: anyio.Event | None
+    _seq: Iterator[int]
+    wait_time: Histogram
+    """取得令牌前的等待时间 (微秒)"""
+    max_depth: int
+    """等待队列的最大长度"""
+
+    def __init__(self) -> None:
+        self._buckets = {}
+        self._pending = []
+        self._changed = None
+        self._seq = itertools.count()
+        self.wait_time = Histogram()
+        self.max_depth = 0
+
+    @property
+    def depth(self) -> int:
+        """当前等待队列的长度"""
+        return len(self._pending)
+
+    def _bucket(self, key: BucketKey) -> TokenBucket:
+        if (bucket := self._buckets.get(key)) is None:
+            burst, interval = getattr(config, f"send_rate_{key[0]}")
+            bucket = self._buckets[key] = TokenBucket(burst, interval)
+        return bucket
+
+    def _evict(self, now: float) -> None:
+        if len(self._buckets) <= self.MAX_BUCKETS:
+            return
+        pending = {key for request in self._pending for key in request[2]}
+        for key, bucket in list(self._buckets.items()):
+            if key not in pending and bucket.refill(now) >= bucket.burst:
+                del self._buckets[key]
+
+    def _grant(self, request: _Request, now: float) -> float | None:
+        """尝试为请求取得令牌, 成功时返回 None, 否则返回建议的等待时间"""
+        reserved: dict[BucketKey, int] = {}
+        starved: set[BucketKey] = set()
+        for item in self._pending:
+            keys = item[2]
+            tokens = {
+                key: self._bucket(key).refill(now) - reserved.get(key, 0)
+                for key in keys
+            }
+            blocked = {key for key, value in tokens.items() if value < 1}
+            blocked.update(starved.intersection(keys))
+
+            if item is request:
+                if blocked:
+                    return max(self._buckets[key].delay(tokens[key]) for key in blocked)
+                for key in keys:
+                    self._buckets[key].tokens -= 1
+                return None
+
+            # 之前的请求可以取得令牌时为其预留, 否则阻塞其等待的令牌桶
+            if blocked:
+                starved |= blocked
+            else:
+                for key in keys:
+                    reserved[key] = reserved.get(key, 0) + 1
+
+        raise RuntimeError("request not in pending queue")  # pragma: no cover
+
+    def _notify(self) -> None:
+        if self._changed is not None:
+            self._changed.set()
+            self._changed = None
+
+    async def _wait(self, delay: float) -> None:
+        """等待其他请求取得令牌或离开队列, 最多等待 `delay` 秒"""
+        if self._changed is None:
+            self._changed = anyio.Event()
+        with anyio.move_on_after(delay):
+            await self._changed.wait()
+
+    async def acquire(self, keys: tuple[BucketKey, ...], priority: int) -> None:
+        """等待取得发送消息所需的令牌
+
+        Args:
+            keys (tuple[BucketKey, ...]): 需要取得令牌的令牌桶
+            priority (int): 优先级, 值越小越优先
+
+        Raises:
+            ReachLimit: 等待时间超过 `send_timeout`
+        """
+        start = time.monotonic()
+        deadline = start + config.send_timeout
+
+        # 等待队列已满时, 等待其他请求完成
+        while len(self._pending) >= config.send_queue_size:
+            if (now := time.monotonic()) >= deadline:
+                raise ReachLimit("消息发送队列已满")
+            await self._wait(deadline - now)
+
+        request: _Request = (priority, next(self._seq), keys)
+        bisect.insort(self._pending, request)
+        self.max_depth = max(self.max_depth, len(self._pending))
+        try:
+            while (delay := self._grant(request, now := time.monotonic())) is not None:
+                if now >= deadline:
+                    raise ReachLimit("消息发送触发次数限制")
+                # 被之前的请求阻塞时, 等待其取得令牌
+                await self._wait(min(delay or math.inf, deadline - now))
+        finally:
+            self._pending.remove(request)
+            self._notify()
+
+        now = time.monotonic()
+        self.wait_time.record(int((now - start) * 1_000_000))
+        self._evict(now)
+
+    async def acquire_send(
+        self,
+        bot: Bot,
+        session: UserSession,
+        target: Target | None,
+    ) -> None:
+        """等待向 `target` 发送消息, 为 None 时为回复当前会话"""
+        priority = PRIORITY_REPLY if target is None else PRIORITY_BULK
+        if target is None:
+            target = get_target(current_event.get(), bot)
+        keys: tuple[BucketKey, ...] = (
+            ("bot", (bot.adapter.get_name(), bot.self_id)),
+            ("user", session.user_id),
+            ("target", (target.id, target.parent_id, target.channel, target.private)),
+        )
+        await self.acquire(keys, priority)
+
+    def format_stats(self) -> str:
+        return (
+            f"send_queue: depth={self.depth} max={self.max_depth}\n"
+            f"{format_histograms({'send_wait': self.wait_time})}"
+        )
+
+    def reset(self) -> None:
+        """清空令牌桶和统计数据"""
+        self._buckets.clear()
+        self.wait_time = Histogram()
+        self.max_depth = len(self._pending)
+
+
+send_scheduler = SendScheduler()
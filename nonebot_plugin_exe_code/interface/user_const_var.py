@@ -1,14 +1,23 @@
 import builtins
 import json
+import types
+from collections.abc import KeysView
+from collections.abc import Set as AbstractSet
 from pathlib import Path
-from typing import Any
+from typing import Any, cast
 
+import anyio
+import nonebot
 from nonebot_plugin_alconna.uniseg import At, Image, Reply, Text, UniMessage
+from nonebot_plugin_user.models import UserSession
 from yarl import URL
 
+from ..config import config
 from ..constant import DATA_DIR
 from ..exception import InternalException
 from ..typings import T_ConstVar, T_Context, UserStr
+from .const_backend import ConstBackend, ConstData, JsonBackend, SqliteBackend
+from .utils import call_later
 
 DEFAULT_BUILTINS = {k: v for k, v in builtins.__dict__.items() if not k.startswith("_")}
 BUILTINS_KEY = "__builtins__"
@@ -39,29 +48,197 @@ context_var(lambda x: Reply(id=str(x)), "Reply")
 context_var(UniMessage, "U")  # shortcut
 
 
-def get_default_context() -> T_Context:
-    return {BUILTINS_KEY: DEFAULT_BUILTINS.copy()}
+SHARED_BUILTINS = types.MappingProxyType(DEFAULT_BUILTINS)
+"""所有上下文共享的只读 builtins, 在首次写入时才复制 (copy-on-write)"""
 
 
-def _const_var_path(uin: str) -> Path:
-    fp = DATA_DIR / f"{uin}.json"
-    if not fp.exists():
-        fp.write_text("{}")
-    return fp
+def get_default_context() -> T_Context:
+    return {BUILTINS_KEY: SHARED_BUILTINS}
+
+
+def ensure_builtins(context: T_Context) -> dict[str, object]:
+    """获取上下文独占的 builtins 字典, 仍为共享的只读 builtins 时复制一份
+
+    编译后的代码仅在 globals 和 builtins 均为 dict 时使用快速查找路径,
+    因此复制后的 builtins 为普通 dict, 并在同一上下文的多次执行之间复用
+    """
+    value = context.get(BUILTINS_KEY)
+    if type(value) is not dict:
+        value = context[BUILTINS_KEY] = DEFAULT_BUILTINS.copy()
+    return cast("dict[str, object]", value)
+
+
+class ConstCache:
+    """常量的进程内缓存
+
+    首次访问某用户的常量时从存储后端加载, 之后的读取不再访问后端.
+    每次执行代码前 `preload` 检查后端的 `version`, 变化时说明其他进程修改了存储,
+    此时所有已缓存的用户在下次访问时重新加载, 尚未写入后端的修改保留在缓存中.
+    修改的常量被标记为脏数据, 在 `delay` 秒后合并, 在工作线程中批量写入后端.
+
+    常量以 JSON 文本保存, 每次读取时重新解析, 执行的代码修改读取到的值不会影响缓存.
+    定时写入失败时记录日志, 并以指数退避重新安排写入.
+    """
+
+    retry_delay: float = 1
+    retry_max_delay: float = 300
+
+    backend: ConstBackend
+    delay: float
+    _data: dict[str, ConstData]
+    _dirty: dict[str, set[str]]
+    _flushing: dict[str, set[str]]
+    _stale: set[str]
+    _version: int | None
+    _scheduled: bool
+    _failures: int
+    _lock: anyio.Lock
+
+    def __init__(self, backend: ConstBackend, delay: float) -> None:
+        self.backend = backend
+        self.delay = delay
+        self._data = {}
+        self._dirty = {}
+        self._flushing = {}
+        self._stale = set()
+        self._version = None
+        self._scheduled = False
+        self._failures = 0
+        self._lock = anyio.Lock()
+
+    def _load(self, uin: str) -> ConstData:
+        if (data := self._data.get(uin)) is None:
+            data = self._data[uin] = self.backend.load(uin)
+        return data
+
+    async def preload(self, uin: str) -> None:
+        """在工作线程中检查存储后端是否被修改, 并按需加载用户的常量"""
+        version = await anyio.to_thread.run_sync(self.backend.version)
+        if version != self._version:
+            self._version = version
+            self._stale.update(self._data)
+        if uin in self._data and uin not in self._stale:
+            return
+
+        data = await anyio.to_thread.run_sync(self.backend.load, uin)
+        # 加载期间可能有新的修改, 未写入后端的常量以缓存为准
+        if (current := self._data.get(uin)) is not None:
+            pending = self._dirty.get(uin, set()) | self._flushing.get(uin, set())
+            for name in pending:
+                if (value := current.get(name)) is None:
+                    data.pop(name, None)
+                else:
+                    data[name] = value
+        self._data[uin] = data
+        self._stale.discard(uin)
+
+    def names(self, uin: str) -> KeysView[str]:
+        return self._load(uin).keys()
+
+    def get(
+        self,
+        uin: str,
+        names: AbstractSet[str] | None = None,
+    ) -> dict[str, T_ConstVar]:
+        return {
+            k: json.loads(v)
+            for k, v in self._load(uin).items()
+            if names is None or k in names
+        }
+
+    def set(self, uin: str, name: str, value: T_ConstVar = None) -> None:
+        data = self._load(uin)
+        if value is not None:
+            data[name] = json.dumps(value)
+        elif data.pop(name, None) is None:
+            return
+
+        self._dirty.setdefault(uin, set()).add(name)
+        if not self._scheduled:
+            self._scheduled = True
+            call_later(self.delay, self._scheduled_flush)
+
+    async def _scheduled_flush(self) -> None:
+        # 在 driver 的任务组中运行, 异常不能向外抛出, 否则会取消所有后台任务
+        try:
+            await self.flush()
+        except Exception as err:
+            self._failures += 1
+            delay = min(
+                self.retry_delay * 2 ** (self._failures - 1),
+                self.retry_max_delay,
+            )
+            nonebot.logger.opt(exception=err).warning(
+                f"写入常量失败 (第 {self._failures} 次), {delay:.1f} 秒后重试"
+            )
+            if not self._scheduled:
+                self._scheduled = True
+                call_later(delay, self._scheduled_flush)
+        else:
+            self._failures = 0
+
+    async def flush(self) -> None:
+        """将所有脏数据写入存储后端"""
+        async with self._lock:
+            self._scheduled = False
+            dirty, self._dirty = self._dirty, {}
+            changes = {
+                uin: {name: self._data[uin].get(name) for name in names}
+                for uin, names in dirty.items()
+            }
+            self._flushing = dirty
+            try:
+                await anyio.to_thread.run_sync(self.backend.write, changes)
+            except BaseException:
+                for uin, names in dirty.items():
+                    self._dirty.setdefault(uin, set()).update(names)
+                raise
+            finally:
+                self._flushing = {}
+
+
+def _create_backend() -> ConstBackend:
+    if config.const_backend == "sqlite":
+        return SqliteBackend(DATA_DIR / "const_var.sqlite3", json_dir=DATA_DIR)
+    return JsonBackend(DATA_DIR)
+
+
+const_cache = ConstCache(_create_backend(), config.const_flush_delay)
+
+
+@nonebot.get_driver().on_startup
+async def _open_const_backend() -> None:
+    await anyio.to_thread.run_sync(const_cache.backend.open)
+
+
+@nonebot.get_driver().on_shutdown
+async def _flush_const_cache() -> None:
+    await const_cache.flush()
+    await anyio.to_thread.run_sync(const_cache.backend.close)
+
+
+def const_session_id(session: UserSession) -> str:
+    """用户常量的存储键"""
+    return f"{session.platform}_{session.platform_user.id}"
+
+
+async def preload_const(uin: str) -> None:
+    await const_cache.preload(uin)
 
 
 def set_const(uin: str, name: str, value: T_ConstVar = None) -> None:
     if not name.isidentifier():
         raise ValueError(f"{name!r} 不是合法的 Python 标识符")
 
-    fp = _const_var_path(uin)
-    data = json.loads(fp.read_text())
-    if value is not None:
-        data[name] = value
-    elif name in data:
-        del data[name]
-    fp.write_text(json.dumps(data))
+    const_cache.set(uin, name, value)
+
+
+def load_const(
+    uin: str,
+    names: AbstractSet[str] | None = None,
+) -> dict[str, T_ConstVar]:
+    return const_cache.get(uin, names)
 
 
-def load_const(uin: str) -> dict[str, T_ConstVar]:
-    return json.loads(_const_var_path(uin).read_text())
+def const_names(uin: str) -> KeysView[str]:
+    return const_cache.names(uin)
@@ -1,8 +1,11 @@
-from collections.abc import Awaitable, Callable, Generator
-from typing import TYPE_CHECKING, Any, ClassVar, Self, cast
+import contextlib
+import threading
+from collections.abc import AsyncGenerator, Awaitable, Callable, Generator
+from typing import TYPE_CHECKING, Any, ClassVar, Self, cast, override
 
 import anyio
 import nonebot
+from anyio.streams.memory import MemoryObjectReceiveStream, MemoryObjectSendStream
 from nonebot.adapters import Adapter, Bot, Message, MessageSegment
 from nonebot_plugin_alconna.uniseg import Receipt, Segment, Target, UniMessage
 from nonebot_plugin_user.models import UserSession
@@ -10,6 +13,8 @@ from nonebot_plugin_user.models import UserSession
 from ..config import config
 from ..typings import T_API_Result, T_Context, T_Message, is_message_t
 from .decorators import INTERFACE_EXPORT_METHOD, INTERFACE_METHOD_DESCRIPTION, strict
+from .scheduler import ReachLimit as ReachLimit
+from .scheduler import send_scheduler
 
 if TYPE_CHECKING:
     from .help_doc import MethodDescription
@@ -41,12 +46,174 @@ def is_super_user(bot: Bot, uin: str) -> bool:
     )
 
 
+def iter_chunks(text: str, size: int) -> Generator[str]:
+    """按长度依次生成文本的分段, 不预先切分整个文本"""
+    for i in range(0, len(text), size):
+        yield text[i : i + size]
+
+
+def _message_size() -> int:
+    """流式/进度输出中单条消息的最大长度, 不超过 `output_limit`"""
+    return min(config.buffer_size, config.output_limit)
+
+
+class _BufferStream:
+    """流式输出: 缓冲区超过大小或等待超过时间间隔时, 在执行期间发送缓冲区内容
+
+    已从缓冲区取出的内容在屏蔽取消的范围内发送, 退出时通知发送任务停止并等待其结束
+    """
+
+    buffer: "Buffer"
+    send: Callable[[str], Awaitable[object]]
+    thread: int
+    wakeup: anyio.Event
+    lock: anyio.Lock
+    error: Exception | None
+    raised: bool
+    stopping: bool
+
+    def __init__(
+        self,
+        buffer: "Buffer",
+        send: Callable[[str], Awaitable[object]],
+    ) -> None:
+        self.buffer = buffer
+        self.send = send
+        self.thread = threading.get_ident()
+        self.wakeup = anyio.Event()
+        self.lock = anyio.Lock()
+        self.error = None
+        self.raised = False
+        self.stopping = False
+
+    def check_error(self) -> None:
+        if self.error is not None:
+            self.raised = True
+            raise self.error
+
+    def stop(self) -> None:
+        """通知发送任务在当前发送完成后退出"""
+        self.stopping = True
+        self.wakeup.set()
+
+    def notify(self, size: int) -> None:
+        if size < config.buffer_size:
+            return
+        if threading.get_ident() == self.thread:
+            # 在事件循环中调用时无法等待, 由发送任务在代码让出控制权后发送
+            self.wakeup.set()
+            return
+        # 在工作线程中调用时阻塞, 直到缓冲区内容发送完毕
+        anyio.from_thread.run(self.flush)
+        self.check_error()
+
+    async def flush(self) -> None:
+        async with self.lock:
+            text = self.buffer.read()
+            # 内容已从缓冲区取出, 取消发送会导致内容丢失
+            with anyio.CancelScope(shield=True):
+                for chunk in iter_chunks(text, _message_size()):
+                    if self.error is not None or not (chunk := chunk.rstrip("\n")):
+                        continue
+                    try:
+                        await self.send(chunk)
+                    except Exception as err:
+                        self.error = err
+
+    @property
+    def interval(self) -> float:
+        return config.buffer_stream_interval
+
+    async def run(self) -> None:
+        while self.error is None and not self.stopping:
+            with anyio.move_on_after(self.interval):
+                await self.wakeup.wait()
+            self.wakeup = anyio.Event()
+            if self.stopping:
+                return
+            await self.flush()
+
+    async def close(self) -> None:
+        """执行结束时调用, 剩余内容由 `Context` 发送"""
+
+
+class _BufferProgress(_BufferStream):
+    """进度输出: 将缓冲区内容定期编辑到同一条消息中
+
+    消息超过缓冲区大小时发送新消息继续编辑, 不支持编辑消息的适配器每次发送新内容
+    """
+
+    send_receipt: Callable[[str], Awaitable[Receipt]]
+    receipt: Receipt | None
+    text: str
+    shown: str
+
+    def __init__(
+        self,
+        buffer: "Buffer",
+        send: Callable[[str], Awaitable[Receipt]],
+    ) -> None:
+        super().__init__(buffer, send)
+        self.send_receipt = send
+        self.receipt = None
+        self.text = self.shown = ""
+
+    @property
+    @override
+    def interval(self) -> float:
+        return config.buffer_progress_interval
+
+    async def show(self, text: str) -> None:
+        if not (text := text.rstrip("\n")):
+            return
+        # 仅在编辑同一条消息时跳过未变化的内容, 新消息可能与上一条相同
+        if self.receipt is not None and text == self.shown:
+            return
+        if self.receipt is None:
+            receipt = await self.send_receipt(text)
+            self.receipt = receipt if receipt.editable else None
+        else:
+            await self.receipt.edit(text)
+        self.shown = text
+
+    @override
+    async def flush(self) -> None:
+        async with self.lock:
+            if self.error is not None:
+                return
+            # 缓冲区为空时仍需显示之前未显示的内容
+            self.text += self.buffer.read()
+            if not self.text:
+                return
+            size = _message_size()
+            with anyio.CancelScope(shield=True):
+                try:
+                    while len(self.text) > size:
+                        await self.show(self.text[:size])
+                        self.receipt, self.text = None, self.text[size:]
+                    await self.show(self.text)
+                except Exception as err:
+                    self.error = err
+            if self.receipt is None:
+                self.text = ""
+
+    @override
+    async def close(self) -> None:
+        await self.flush()
+
+
 class Buffer:
     _user_buf: ClassVar[dict[int, Self]] = {}
-    _buffer: str
+    _parts: list[str]
+    _size: int
+    _lock: threading.Lock
+    _stream: _BufferStream | None
 
     def __init__(self) -> None:
-        self._buffer = ""
+        self._parts = []
+        self._size = 0
+        self._lock = threading.Lock()
+        self._stream = None
 
     @classmethod
     def get(cls, uin: int) -> Self:
@@ -54,15 +221,286 @@ class Buffer:
             cls._user_buf[uin] = cls()
         return cls._user_buf[uin]
 
-    def write(self, text: str) -> None:
-        if len(self._buffer) + len(text) > config.buffer_size:
-            raise OverflowError("缓冲区溢出")
+    def __len__(self) -> int:
+        return self._size
 
-        self._buffer += str(text)
+    def write(self, text: str) -> None:
+        text = str(text)
+        stream = self._stream
+        if stream is not None:
+            stream.check_error()
+
+        # 流式输出时允许超出缓冲区大小, 直到发送任务取走内容.
+        # 在事件循环中执行的代码不让出控制权时无法发送, 最多积累到 buffer_stream_limit
+        limit = config.buffer_size
+        if stream is not None:
+            limit = max(limit, config.buffer_stream_limit)
+        with self._lock:
+            size = self._size + len(text)
+            if size > limit:
+                raise OverflowError("缓冲区溢出")
+            self._parts.append(text)
+            self._size = size
+
+        if stream is not None:
+            stream.notify(size)
 
     def read(self) -> str:
-        value, self._buffer = self._buffer, ""
-        return value
+        with self._lock:
+            parts, self._parts, self._size = self._parts, [], 0
+        return "".join(parts)
+
+    @contextlib.asynccontextmanager
+    async def _streaming(self, stream: _BufferStream) -> AsyncGenerator[None]:
+        self._stream = stream
+        try:
+            async with anyio.create_task_group() as tg:
+                tg.start_soon(stream.run)
+                try:
+                    yield
+                finally:
+                    stream.stop()
+            await stream.close()
+        finally:
+            self._stream = None
+
+        if not stream.raised:
+            stream.check_error()
+
+    def stream(
+        self,
+        send: Callable[[str], Awaitable[object]],
+    ) -> contextlib.AbstractAsyncContextManager[None]:
+        """在上下文中启用流式输出, 退出时剩余内容仍保留在缓冲区中
+
+        Args:
+            send (Callable[[str], Awaitable[object]]): 发送缓冲区内容的函数
+
+        Raises:
+            Exception: 发送失败且未在 `write` 中抛出时, 在退出时抛出
+        """
+        return self._streaming(_BufferStream(self, send))
+
+    def progress(
+        self,
+        send: Callable[[str], Awaitable[Receipt]],
+    ) -> contextlib.AbstractAsyncContextManager[None]:
+        """在上下文中启用进度输出, 退出时将剩余内容编辑到消息中
+
+        Args:
+            send (Callable[[str], Awaitable[Receipt]]): 发送新消息的函数
+
+        Raises:
+            Exception: 发送失败且未在 `write` 中抛出时, 在退出时抛出
+        """
+        return self._streaming(_BufferProgress(self, send))
+
+
+class FeedbackBatch:
+    """合并一段时间内连续发送的文本 feedback
+
+    第一条文本加入后等待 `feedback_coalesce_window` 秒再一并发送,
+    合并后的长度超过 `feedback_coalesce_size` 时立即发送之前的内容.
+    已取出的内容在屏蔽取消的范围内发送, 退出时通知发送任务停止并发送剩余内容
+    """
+
+    send: Callable[[list[str]], Awaitable[object]]
+    items: list[str]
+    size: int
+    ready: anyio.Event
+    stopped: anyio.Event
+    lock: anyio.Lock
+    error: Exception | None
+    raised: bool
+
+    def __init__(self, send: Callable[[list[str]], Awaitable[object]]) -> None:
+        self.send = send
+        self.items = []
+        self.size = 0
+        self.ready = anyio.Event()
+        self.stopped = anyio.Event()
+        self.lock = anyio.Lock()
+        self.error = None
+        self.raised = False
+
+    def check_error(self) -> None:
+        if self.error is not None:
+            self.raised = True
+            raise self.error
+
+    def stop(self) -> None:
+        """通知发送任务在当前发送完成后退出, 剩余内容由 `scope` 发送"""
+        self.stopped.set()
+        self.ready.set()
+
+    async def add(self, text: str) -> None:
+        self.check_error()
+        if self.items and self.size + len(text) > config.feedback_coalesce_size:
+            try:
+                await self.flush()
+            except Exception as err:
+                self.error, self.raised = err, True
+                raise
+        self.items.append(text)
+        self.size += len(text)
+        self.ready.set()
+
+    async def flush(self) -> None:
+        async with self.lock:
+            items, self.items, self.size = self.items, [], 0
+            if items:
+                # 内容已从队列取出, 取消发送会导致内容丢失
+                with anyio.CancelScope(shield=True):
+                    await self.send(items)
+
+    async def run(self) -> None:
+        while True:
+            await self.ready.wait()
+            with anyio.move_on_after(config.feedback_coalesce_window):
+                await self.stopped.wait()
+            self.ready = anyio.Event()
+            if self.stopped.is_set():
+                return
+            try:
+                await self.flush()
+            except Exception as err:
+                self.error = err
+                return
+
+    @classmethod
+    @contextlib.asynccontextmanager
+    async def scope(
+        cls,
+        send: Callable[[list[str]], Awaitable[object]],
+    ) -> AsyncGenerator[Self]:
+        """在上下文中合并 feedback, 退出时发送剩余内容
+
+        Raises:
+            Exception: 发送失败且未在 `add` 中抛出时, 在退出时抛出
+        """
+        batch = cls(send)
+        async with anyio.create_task_group() as tg:
+            tg.start_soon(batch.run)
+            try:
+                yield batch
+            finally:
+                batch.stop()
+
+        # 异常已在 `add` 中抛出时丢弃剩余内容, 避免再次发送并重复报告
+        if not batch.raised:
+            batch.check_error()
+            await batch.flush()
+
+
+class SendFuture[T]:
+    """流水线中等待发送的消息, 可在发送完成后获取结果"""
+
+    __slots__ = ("_done", "_error", "_pipeline", "_result")
+
+    _done: anyio.Event
+    _error: Exception | None
+    _pipeline: "FeedbackPipeline"
+    _result: T | None
+
+    def __init__(self, pipeline: "FeedbackPipeline") -> None:
+        self._done = anyio.Event()
+        self._error = None
+        self._pipeline = pipeline
+        self._result = None
+
+    def done(self) -> bool:
+        return self._done.is_set()
+
+    def set_result(self, result: T) -> None:
+        self._result = result
+        self._done.set()
+
+    def set_error(self, error: Exception) -> None:
+        self._error = error
+        self._done.set()
+
+    async def wait(self) -> T:
+        """等待消息发送完成
+
+        Raises:
+            Exception: 发送消息时抛出的异常
+        """
+        await self._done.wait()
+        if self._error is not None:
+            self._pipeline.raised = True
+            raise self._error
+        return cast(T, self._result)
+
+    def __await__(self) -> Generator[Any, None, T]:
+        return self.wait().__await__()
+
+    def __repr__(self) -> str:
+        state = "done" if self.done() else "pending"
+        return f"<{self.__class__.__name__} {state}>"
+
+
+type _PipelineItem = tuple[Callable[[], Awaitable[Any]], SendFuture[Any]]
+
+
+class FeedbackPipeline:
+    """按顺序在后台发送 feedback, 使代码执行与网络请求重叠
+
+    队列已满时 `submit` 等待, 某条消息发送失败后, 之后的消息均以同一异常结束
+    """
+
+    send_stream: MemoryObjectSendStream[_PipelineItem]
+    receive_stream: MemoryObjectReceiveStream[_PipelineItem]
+    error: Exception | None
+    raised: bool
+
+    def __init__(self) -> None:
+        self.send_stream, self.receive_stream = anyio.create_memory_object_stream[
+            _PipelineItem
+        ](config.feedback_pipeline_size)
+        self.error = None
+        self.raised = False
+
+    def check_error(self) -> None:
+        if self.error is not None:
+            self.raised = True
+            raise self.error
+
+    async def submit[T](self, send: Callable[[], Awaitable[T]]) -> SendFuture[T]:
+        self.check_error()
+        future = SendFuture[T](self)
+        await self.send_stream.send((send, future))
+        return future
+
+    async def run(self) -> None:
+        async with self.receive_stream:
+            async for send, future in self.receive_stream:
+                if self.error is not None:
+                    future.set_error(self.error)
+                    continue
+                try:
+                    future.set_result(await send())
+                except Exception as err:
+                    self.error = err
+                    future.set_error(err)
+
+    @classmethod
+    @contextlib.asynccontextmanager
+    async def scope(cls) -> AsyncGenerator[Self]:
+        """在上下文中启用流水线发送, 退出时等待队列中的消息发送完毕
+
+        Raises:
+            Exception: 发送失败且未在 `submit` 或 `SendFuture` 中抛出时, 在退出时抛出
+        """
+        pipeline = cls()
+        async with anyio.create_task_group() as tg:
+            tg.start_soon(pipeline.run)
+            try:
+                yield pipeline
+            finally:
+                pipeline.send_stream.close()
+
+        if not pipeline.raised:
+            pipeline.check_error()
 
 
 class Result:
@@ -133,42 +571,15 @@ def call_later[**P](
     nonebot.get_driver().task_group.start_soon(wrapper)
 
 
-class ReachLimit(Exception):  # noqa: N818
-    limit: int = 6
-
-    def __init__(self, msg: str) -> None:
-        self.msg = msg
-
-
-def _send_message():  # noqa: ANN202
-    call_cnt: dict[int, int] = {}
-
-    async def clean(key: int) -> None:  # pragma: no cover
-        call_cnt.pop(key, None)
-
-    async def send_message(
-        bot: Bot,
-        session: UserSession,
-        target: Target | None,
-        message: T_Message,
-    ) -> Receipt:
-        key = id(session)
-        if key not in call_cnt:
-            call_cnt[key] = 1
-            call_later(60, clean, key)
-        elif 0 <= call_cnt[key] < ReachLimit.limit:
-            call_cnt[key] += 1
-        else:
-            call_cnt[key] = -1
-            raise ReachLimit("消息发送触发次数限制")
-
-        msg = await as_unimsg(message)
-        return await msg.send(target, bot=bot)
-
-    return send_message
-
-
-send_message = _send_message()
+async def send_message(
+    bot: Bot,
+    session: UserSession,
+    target: Target | None,
+    message: T_Message,
+) -> Receipt:
+    await send_scheduler.acquire_send(bot, session, target)
+    msg = await as_unimsg(message)
+    return await msg.send(target, bot=bot)
 
 
 class _Sudo:
@@ -206,6 +617,10 @@ class _Sudo:
         )()
 
 
+SUPERUSER_EXPORTS = frozenset({"sudo"})
+"""仅向超级用户导出的名称"""
+
+
 def export_superuser() -> Generator[tuple[str, Any], Any, None]:
     yield from {"sudo": _Sudo()}.items()
 
@@ -0,0 +1,273 @@
+import inspect
+import itertools
+import types
+import weakref
+from collections.abc import Callable, Collection, Iterable, Mapping, Sequence
+from typing import (
+    Annotated,
+    Any,
+    Literal,
+    TypeAliasType,
+    TypeVar,
+    Union,
+    get_args,
+    get_origin,
+    get_type_hints,
+    is_typeddict,
+)
+
+from tarina import generic_isinstance
+
+from ..config import config
+
+type Checker = Callable[[object], bool]
+type T_Args = tuple[Any, ...]
+type T_Kwargs = dict[str, Any]
+
+_UNION_TYPES = (Union, types.UnionType)
+_IGNORED_PARAMS = frozenset({"self", "cls"})
+
+
+def _always(_: object) -> bool:
+    return True
+
+
+def _iter_items[T](value: Collection[T]) -> Iterable[T]:
+    """按配置的容器检查模式返回需要检查的元素"""
+    mode, size = config.strict_container_check, config.strict_container_size
+    if mode == "full" or len(value) <= size:
+        return value
+    if mode == "sampled" and isinstance(value, Sequence):
+        # 等间距抽样, 并始终包含最后一个元素
+        step = -(-len(value) // size)
+        return itertools.chain(value[:-1:step], value[-1:])
+    return itertools.islice(value, size)
+
+
+def _compile_items(origin: type, args: tuple[Any, ...]) -> Checker:
+    if origin is tuple and not (len(args) == 2 and args[1] is Ellipsis):
+        checkers = tuple(map(compile_checker, args))
+
+        def check_tuple(value: object) -> bool:
+            return (
+                isinstance(value, tuple)
+                and len(value) == len(checkers)
+                and all(c(v) for c, v in zip(checkers, value, strict=True))
+            )
+
+        return check_tuple
+
+    if len(args) == 2 and issubclass(origin, Mapping):
+        check_key, check_value = map(compile_checker, args)
+
+        def check_mapping(value: object) -> bool:
+            if not (isinstance(value, origin) and isinstance(value, Mapping)):
+                return False
+            return all(
+                check_key(k) and check_value(value[k]) for k in _iter_items(value)
+            )
+
+        return check_mapping
+
+    if len(args) >= 1 and issubclass(origin, Iterable):
+        check_item = compile_checker(args[0])
+
+        def check_collection(value: object) -> bool:
+            if not isinstance(value, origin):
+                return False
+            # 不消耗迭代器等无法重复遍历的对象
+            if not isinstance(value, Collection):
+                return True
+            return all(map(check_item, _iter_items(value)))
+
+        return check_collection
+
+    return lambda value: isinstance(value, origin)
+
+
+def compile_checker(annotation: object) -> Checker:
+    """将类型注解编译为检查函数, 语义与 `tarina.generic_isinstance` 保持一致
+
+    Args:
+        annotation (object): 类型注解
+
+    Returns:
+        Checker: 接收待检查的值, 返回其是否符合类型注解
+    """
+    if annotation is Any or annotation is object:
+        return _always
+    if annotation is None or annotation is types.NoneType:
+        return lambda value: value is None
+    if isinstance(annotation, TypeAliasType):
+        return compile_checker(annotation.__value__)
+    if isinstance(annotation, TypeVar):
+        if annotation.__constraints__:
+            return compile_checker(Union[annotation.__constraints__])  # noqa: UP007
+        if annotation.__bound__ is not None:
+            return compile_checker(annotation.__bound__)
+        return _always
+
+    origin, args = get_origin(annotation), get_args(annotation)
+    if origin is Annotated:
+        return compile_checker(args[0])
+    if origin is Literal:
+        return lambda value: value in args
+    if origin in _UNION_TYPES:
+        # 仅由普通类组成的联合类型可直接交给 isinstance
+        if all(inspect.isclass(arg) and get_origin(arg) is None for arg in args):
+            return lambda value: isinstance(value, args)
+        checkers = tuple(map(compile_checker, args))
+        return lambda value: any(c(value) for c in checkers)
+    if is_typeddict(annotation):
+        return lambda value: generic_isinstance(value, annotation)
+    if inspect.isclass(annotation) and origin is None:
+        return lambda value: isinstance(value, annotation)
+    if inspect.isclass(origin):
+        if origin is Callable or not args:
+            return lambda value: isinstance(value, origin)
+        return _compile_items(origin, args)
+
+    return lambda value: generic_isinstance(value, annotation)  # pragma: no cover
+
+
+def is_type_determined(annotation: object) -> bool:
+    """判断类型注解的检查结果是否仅取决于值的类型
+
+    容器元素、字面量等注解的检查结果与值本身相关, 不能按类型缓存
+    """
+    if annotation is Any or annotation is object or annotation is None:
+        return True
+    if isinstance(annotation, TypeAliasType):
+        return is_type_determined(annotation.__value__)
+    if isinstance(annotation, TypeVar):
+        if annotation.__constraints__:
+            return all(map(is_type_determined, annotation.__constraints__))
+        return annotation.__bound__ is None or is_type_determined(annotation.__bound__)
+
+    origin, args = get_origin(annotation), get_args(annotation)
+    if origin is Annotated:
+        return is_type_determined(args[0])
+    if origin in _UNION_TYPES:
+        return all(map(is_type_determined, args))
+    if is_typeddict(annotation) or origin is Literal:
+        return False
+    if inspect.isclass(annotation) and origin is None:
+        return True
+    return inspect.isclass(origin) and (origin is Callable or not args)
+
+
+class Validator:
+    """在首次使用前解析函数签名和类型注解, 调用时仅执行编译后的检查"""
+
+    __slots__ = (
+        "annotations",
+        "call",
+        "checkers",
+        "keywords",
+        "positional",
+        "required",
+        "signature",
+        "type_determined",
+    )
+
+    call: Callable[..., Any]
+    signature: inspect.Signature
+    annotations: dict[str, object]
+    checkers: dict[str, Checker]
+    positional: tuple[str, ...] | None
+    keywords: frozenset[str]
+    required: tuple[str, ...]
+    type_determined: bool
+
+    def __init__(self, call: Callable[..., Any]) -> None:
+        self.call = call
+        self.signature = sig = inspect.signature(call)
+        hints = get_type_hints(call)
+        self.annotations = {
+            name: hints[name]
+            for name in sig.parameters
+            if name not in _IGNORED_PARAMS and name in hints
+        }
+        self.checkers = {
+            name: compile_checker(annotation)
+            for name, annotation in self.annotations.items()
+        }
+        self.type_determined = all(map(is_type_determined, self.annotations.values()))
+
+        params = sig.parameters.values()
+        kind = inspect.Parameter
+        if any(p.kind in {kind.VAR_POSITIONAL, kind.VAR_KEYWORD} for p in params):
+            # 含有可变参数时使用 Signature.bind
+            self.positional = None
+        else:
+            self.positional = tuple(
+                p.name
+                for p in params
+                if p.kind in {kind.POSITIONAL_ONLY, kind.POSITIONAL_OR_KEYWORD}
+            )
+        self.keywords = frozenset(
+            p.name for p in params if p.kind != kind.POSITIONAL_ONLY
+        )
+        self.required = tuple(p.name for p in params if p.default is p.empty)
+
+    def bind(self, args: T_Args, kwargs: T_Kwargs) -> dict[str, Any]:
+        if self.positional is None:
+            return self.signature.bind(*args, **kwargs).arguments
+
+        if len(args) > len(self.positional):
+            raise TypeError("too many positional arguments")
+        arguments = dict(zip(self.positional, args, strict=False))
+        for name, value in kwargs.items():
+            if name not in self.keywords:
+                raise TypeError(f"got an unexpected keyword argument {name!r}")
+            if name in arguments:
+                raise TypeError(f"multiple values for argument {name!r}")
+            arguments[name] = value
+        for name in self.required:
+            if name not in arguments:
+                raise TypeError(f"missing a required argument: {name!r}")
+        return arguments
+
+    def _find_invalid(self, arguments: dict[str, Any]) -> str | None:
+        for name, value in arguments.items():
+            if (checker := self.checkers.get(name)) is not None and not checker(value):
+                return name
+        return None
+
+    def check(self, args: T_Args, kwargs: T_Kwargs) -> bool:
+        """检查函数调用是否符合类型注解, 不符合时返回 False 而不抛出异常"""
+        try:
+            arguments = self.bind(args, kwargs)
+        except TypeError:
+            return False
+        return self._find_invalid(arguments) is None
+
+    def __call__(self, args: T_Args, kwargs: T_Kwargs) -> None:
+        """检查函数调用是否符合类型注解
+
+        Raises:
+            TypeError: 传入的参数无法正确调用函数 / 函数参数不符合类型注解
+        """
+        arguments = self.bind(args, kwargs)
+        if (name := self._find_invalid(arguments)) is None:
+            return
+
+        from .help_doc import format_annotation
+
+        raise TypeError(
+            f"Invalid argument for param {name!r} of {self.call.__name__!r}: "
+            f"expected {format_annotation(self.annotations[name])}, "
+            f"got {format_annotation(type(arguments[name]))}"
+        )
+
+
+_validators: weakref.WeakKeyDictionary[Callable[..., Any], Validator] = (
+    weakref.WeakKeyDictionary()
+)
+
+
+def get_validator(call: Callable[..., Any]) -> Validator:
+    """获取函数的参数检查器, 同一函数仅解析一次"""
+    if (validator := _validators.get(call)) is None:
+        validator = _validators[call] = Validator(call)
+    return validator
@@ -1,5 +1,7 @@
 from . import code as code
+from . import dispatch as dispatch
 from . import getimg as getimg
 from . import getmid as getmid
 from . import getraw as getraw
+from . import stats as stats
 from . import terminate as terminate
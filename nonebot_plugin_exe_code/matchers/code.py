@@ -1,21 +1,25 @@
 from typing import NoReturn
 
 import anyio
-from nonebot import on_message
 from nonebot.adapters import Bot, Event
 from nonebot.log import logger
 from nonebot_plugin_alconna.uniseg import UniMessage
 
 from ..context import Context
-from .depends import AllowExeCode, ExtractCode, startswith
+from .depends import CodeLineOffset, CodeSession, ExtractCode, command
+from .dispatch import matcher
 
-matcher = on_message(startswith("code"), permission=AllowExeCode)
 
-
-@matcher.handle()
-async def handle_code(bot: Bot, event: Event, code: ExtractCode) -> NoReturn:
+@matcher.handle(parameterless=[command("code")])
+async def handle_code(
+    bot: Bot,
+    event: Event,
+    code: ExtractCode,
+    session: CodeSession,
+    line_offset: CodeLineOffset,
+) -> NoReturn:
     try:
-        await Context.execute(bot, event, code)
+        await Context.execute(bot, event, code, session, line_offset)
     except anyio.get_cancelled_exc_class():
         pass  # pragma: no cover
     except BaseException as err:
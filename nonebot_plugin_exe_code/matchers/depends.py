@@ -1,20 +1,33 @@
 import contextlib
+from collections.abc import Awaitable, Callable
 from typing import Annotated, Any
 
 from nonebot.adapters import Bot, Event, Message
 from nonebot.matcher import Matcher
 from nonebot.params import Depends
-from nonebot.permission import SUPERUSER, Permission
+from nonebot.permission import SUPERUSER
 from nonebot.rule import Rule
+from nonebot.typing import T_State
 from nonebot_plugin_alconna.uniseg import UniMessage, UniMsg, reply_fetch
-from nonebot_plugin_alconna.uniseg.segment import At, Image, Reply, Text
-from nonebot_plugin_user import UserSession
+from nonebot_plugin_alconna.uniseg.segment import At, Image, Reply, Segment, Text
+from nonebot_plugin_user.models import UserSession
 
 from ..config import config
 from ..context import Context
+from ..session import resolve_session
 
 
-def _allow_exe_code() -> Permission:
+def _code_session() -> Any:
+    async def code_session(bot: Bot, event: Event) -> UserSession:
+        try:
+            return await resolve_session(bot, event)
+        except NotImplementedError:  # pragma: no cover
+            Matcher.skip()
+
+    return Depends(code_session)
+
+
+def _allow_exe_code() -> Callable[[Bot, Event], Awaitable[bool]]:
     def check_console(bot: Bot) -> bool:  # pragma: no cover  # noqa: ARG001
         return False
 
@@ -24,11 +37,16 @@ def _allow_exe_code() -> Permission:
         def check_console(bot: Bot) -> bool:
             return isinstance(bot, ConsoleBot)
 
-    async def check(bot: Bot, session: UserSession) -> bool:
+    async def allow_exe_code(bot: Bot, event: Event) -> bool:
         # ConsoleBot 仅有标准输入, 跳过检查
-        if check_console(bot):
+        if check_console(bot) or await SUPERUSER(bot, event):
             return True
 
+        try:
+            session = await resolve_session(bot, event)
+        except NotImplementedError:  # pragma: no cover
+            return False
+
         # 对于 superuser 和 配置允许的用户, 在任意对话均可触发
         if session.platform_user.id in config.user:
             return True
@@ -38,40 +56,84 @@ def _allow_exe_code() -> Permission:
         g = s.group or s.channel or s.guild
         return g is not None and g.id in config.group
 
-    return SUPERUSER | check
+    return allow_exe_code
 
 
 def _code_context() -> Any:
-    async def code_context(session: UserSession) -> Context:
+    async def code_context(session: CodeSession) -> Context:
         return Context.get_context(session)
 
     return Depends(code_context)
 
 
-def _extract_code() -> Any:
-    async def extract_code(event: Event) -> str:
-        msg = UniMessage.of(message=event.get_message())
-        code = ""
-        for seg in msg:
-            if isinstance(seg, Text):
-                code += seg.text
-            elif isinstance(seg, At):
-                code += f'UserStr("{seg.target}")'
-            elif isinstance(seg, Image):
-                code += f'"{seg.url or "[url]"}"'
-
-        code = code.strip()
+def _format_segment(seg: Segment) -> str:
+    if isinstance(seg, Text):
+        return seg.text
+    if isinstance(seg, At):
+        return f'UserStr("{seg.target}")'
+    if isinstance(seg, Image):
+        return f'"{seg.url or "[url]"}"'
+    return ""
 
+
+def parse_code_message(msg: UniMessage) -> tuple[str, int] | None:
+    """从消息中提取代码
+
+    Args:
+        msg (UniMessage): 以 `code` 开头的消息
+
+    Returns:
+        tuple[str, int] | None: 代码及其首行在消息中的行偏移量, 消息不是代码时返回 None
+    """
+    segments = iter(msg)
+    line_offset = 0
+    parts: list[str] = []
+
+    for seg in segments:
         # 特例：@xxx code print(123)
         #  --> "xxx" code print(123)
-        if not code.startswith("code"):
+        if isinstance(seg, At | Image):
+            return None
+        if not isinstance(seg, Text):
+            continue
+        if text := seg.text.lstrip():
+            if not text.startswith("code"):
+                return None
+            line_offset += seg.text.count("\n", 0, len(seg.text) - len(text))
+            parts.append(text.removeprefix("code"))
+            break
+        line_offset += seg.text.count("\n")
+    else:
+        return None
+
+    parts.extend(_format_segment(seg) for seg in segments)
+    code = "".join(parts)
+    stripped = code.lstrip()
+    line_offset += code.count("\n", 0, len(code) - len(stripped))
+    return stripped.rstrip(), line_offset
+
+
+_LINE_OFFSET_KEY = "_exe_code_line_offset"
+
+
+def _extract_code() -> Any:
+    async def extract_code(msg: UniMsg, state: T_State) -> str:
+        if (result := parse_code_message(msg)) is None:
             Matcher.skip()
 
-        return code.removeprefix("code").strip()
+        code, state[_LINE_OFFSET_KEY] = result
+        return code
 
     return Depends(extract_code)
 
 
+def _code_line_offset() -> Any:
+    async def code_line_offset(state: T_State, _: ExtractCode) -> int:
+        return state[_LINE_OFFSET_KEY]
+
+    return Depends(code_line_offset)
+
+
 def _event_image() -> Any:
     async def event_image(msg: UniMessage, *, _in_reply: bool = False) -> Image:
         if msg.has(Image):
@@ -112,21 +174,102 @@ def _event_reply_message() -> Any:
     return Depends(event_reply_message)
 
 
-def startswith(text: str) -> Rule:
-    def starts_checker(event: Event) -> bool:
+class PrefixTrie:
+    """按字符索引的命令前缀树, 匹配文本开头最长的已注册前缀"""
+
+    __slots__ = ("children", "prefix")
+
+    children: dict[str, "PrefixTrie"]
+    prefix: str | None
+
+    def __init__(self) -> None:
+        self.children = {}
+        self.prefix = None
+
+    def insert(self, prefix: str) -> None:
+        node = self
+        for char in prefix:
+            node = node.children.setdefault(char, PrefixTrie())
+        node.prefix = prefix
+
+    def match(self, text: str) -> str | None:
+        node, result = self, None
+        for char in text:
+            if (node := node.children.get(char)) is None:
+                break
+            if node.prefix is not None:
+                result = node.prefix
+        return result
+
+    def match_message(self, message: Message) -> tuple[str, str] | None:
+        # 绝大多数消息不是命令, 仅检查首个非空文本段的首字符即可返回
+        for seg in message:
+            if seg.is_text() and (text := str(seg).lstrip()):
+                if text[0] not in self.children:
+                    return None
+                break
+        else:
+            return None
+
+        text = message.extract_plain_text().strip()
+        if (prefix := self.match(text)) is None:
+            return None
+        return prefix, text
+
+
+_COMMAND_KEY = "_exe_code_command"
+_command_trie = PrefixTrie()
+
+
+def _dispatch() -> Rule:
+    # NoneBot 先检查权限再检查规则, 且同一规则的检查函数并发执行,
+    # 因此在同一检查函数中匹配命令后再检查权限, 普通消息不会查询用户会话
+    async def dispatch_checker(bot: Bot, event: Event, state: T_State) -> bool:
         try:
             msg = event.get_message()
         except NotImplementedError:  # pragma: no cover
+            return False
+
+        if (result := _command_trie.match_message(msg)) is None:
+            return False
+        if not await _allow_exe_code_check(bot, event):
+            return False
+
+        state[_COMMAND_KEY] = result
+        return True
+
+    return Rule(dispatch_checker)
+
+
+def command(prefix: str) -> Any:
+    """注册命令前缀, 返回仅在事件匹配该前缀时通过的依赖
+
+    应作为 `parameterless` 使用, 以确保在其他依赖之前完成检查
+    """
+    _command_trie.insert(prefix)
+
+    def command_checker(state: T_State) -> None:
+        if state.get(_COMMAND_KEY, (None,))[0] != prefix:
             Matcher.skip()
 
-        return msg.extract_plain_text().strip().startswith(text)
+    return Depends(command_checker)
+
+
+def _command_arg() -> Any:
+    def command_arg(state: T_State) -> str:
+        prefix, text = state[_COMMAND_KEY]
+        return text.removeprefix(prefix).strip()
 
-    return Rule(starts_checker)
+    return Depends(command_arg)
 
 
-AllowExeCode: Permission = _allow_exe_code()
+CodeSession = Annotated[UserSession, _code_session()]
+_allow_exe_code_check = _allow_exe_code()
+DispatchCommand: Rule = _dispatch()
+CommandArg = Annotated[str, _command_arg()]
 CodeContext = Annotated[Context, _code_context()]
 ExtractCode = Annotated[str, _extract_code()]
+CodeLineOffset = Annotated[int, _code_line_offset()]
 EventImage = Annotated[Image, _event_image()]
 EventReply = Annotated[Reply, _event_reply()]
 EventReplyMessage = Annotated[Message, _event_reply_message()]
@@ -0,0 +1,7 @@
+from nonebot import on_message
+
+from .depends import DispatchCommand
+
+# code/getimg/getmid/getraw 共用同一个响应器, 由前缀树分发至各自的处理函数,
+# 匹配命令后在规则中检查用户是否允许执行代码
+matcher = on_message(DispatchCommand)
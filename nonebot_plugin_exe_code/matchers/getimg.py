@@ -2,31 +2,23 @@ import contextlib
 from io import BytesIO
 from typing import NoReturn
 
-from nonebot import on_message
 from nonebot.adapters import Bot, Event
 from nonebot_plugin_alconna.uniseg import UniMessage, image_fetch
 
-from .depends import AllowExeCode, CodeContext, EventImage, startswith
+from .depends import CodeContext, CommandArg, EventImage, command
+from .dispatch import matcher
 
 with contextlib.suppress(ImportError):
     import PIL.Image
 
-    matcher = on_message(startswith("getimg"), permission=AllowExeCode)
-
-    @matcher.handle()
+    @matcher.handle(parameterless=[command("getimg")])
     async def handle_getimg(
         bot: Bot,
         event: Event,
         ctx: CodeContext,
         image: EventImage,
+        varname: CommandArg,
     ) -> NoReturn:
-        varname = (
-            event.get_message()
-            .extract_plain_text()
-            .strip()
-            .removeprefix("getimg")
-            .strip()
-        )
         if (varname := varname or "img") and not varname.isidentifier():
             await UniMessage(f"{varname} 不是一个合法的 Python 标识符").finish()
 
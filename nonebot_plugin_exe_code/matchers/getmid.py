@@ -1,20 +1,12 @@
 from typing import NoReturn
 
-from nonebot import on_message
 from nonebot_plugin_alconna.uniseg import UniMessage
 
-from .depends import (
-    AllowExeCode,
-    CodeContext,
-    EventReply,
-    EventReplyMessage,
-    startswith,
-)
+from .depends import CodeContext, EventReply, EventReplyMessage, command
+from .dispatch import matcher
 
-matcher = on_message(startswith("getmid"), permission=AllowExeCode)
 
-
-@matcher.handle()
+@matcher.handle(parameterless=[command("getmid")])
 async def handle_getmid(
     ctx: CodeContext,
     reply: EventReply,
@@ -1,14 +1,12 @@
 from typing import NoReturn
 
-from nonebot import on_message
 from nonebot_plugin_alconna.uniseg import UniMessage
 
-from .depends import AllowExeCode, CodeContext, EventReplyMessage, startswith
+from .depends import CodeContext, EventReplyMessage, command
+from .dispatch import matcher
 
-matcher = on_message(startswith("getraw"), permission=AllowExeCode)
 
-
-@matcher.handle()
+@matcher.handle(parameterless=[command("getraw")])
 async def handle_getraw(
     ctx: CodeContext,
     message: EventReplyMessage,
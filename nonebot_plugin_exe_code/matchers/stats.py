@@ -0,0 +1,36 @@
+from typing import NoReturn
+
+from nonebot.adapters import Bot
+from nonebot.permission import SUPERUSER
+from nonebot_plugin_alconna import Alconna, Args, on_alconna
+from nonebot_plugin_alconna.uniseg import At, UniMessage
+
+from ..config import config
+from ..context import Context
+from ..interface.http_cache import http_cache
+from ..interface.scheduler import send_scheduler
+from ..stats import execution_stats, format_histograms
+
+matcher = on_alconna(Alconna("exestats", Args["target?", At]), permission=SUPERUSER)
+
+
+@matcher.handle()
+async def handle_stats(bot: Bot, target: At | None = None) -> NoReturn:
+    if target is not None:
+        try:
+            uin = Context.get_context(target.target).uin
+        except Exception as err:
+            await matcher.finish(f"获取 Context 失败: {err}")
+        title = f"用户 {uin} 执行耗时统计"
+        histograms = execution_stats.by_user(uin)
+    else:
+        adapter = bot.adapter.get_name()
+        title = f"[{adapter}] 执行耗时统计"
+        histograms = execution_stats.by_adapter(adapter)
+
+    text = f"{title}\n{format_histograms(histograms)}"
+    if target is None:
+        text += f"\n\n消息发送统计\n{send_scheduler.format_stats()}"
+        if config.http_cache:
+            text += f"\n\nHTTP 缓存统计\n{http_cache.format_stats()}"
+    await UniMessage.text(text).finish()
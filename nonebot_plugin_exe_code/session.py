@@ -0,0 +1,149 @@
+import time
+from collections import OrderedDict
+from typing import NamedTuple
+
+from nonebot.adapters import Bot, Event
+from nonebot.matcher import Matcher
+from nonebot.message import run_postprocessor
+from nonebot_plugin_uninfo import get_session
+from nonebot_plugin_user.models import UserSession
+from nonebot_plugin_user.params import get_user, get_user_session
+
+from .config import config
+from .stats import StageTimer
+
+
+class SessionKey(NamedTuple):
+    adapter: str
+    self_id: str
+    user_id: str
+    scene_id: str
+
+
+class SessionCache:
+    """带存活时间和数量上限的 UserSession 缓存
+
+    以 `event.get_session_id()` 作为场景标识, 同一用户在不同群聊/私聊中分别缓存
+    """
+
+    maxsize: int
+    ttl: float
+    hits: int
+    misses: int
+    _data: OrderedDict[SessionKey, tuple[float, UserSession]]
+
+    def __init__(self, maxsize: int, ttl: float) -> None:
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = self.misses = 0
+        self._data = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: SessionKey) -> UserSession | None:
+        if (item := self._data.get(key)) is None:
+            self.misses += 1
+            return None
+
+        expire, session = item
+        if expire <= time.monotonic():
+            del self._data[key]
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        self._data.move_to_end(key)
+        return session
+
+    def put(self, key: SessionKey, session: UserSession) -> None:
+        if self.maxsize <= 0 or self.ttl <= 0:
+            return
+
+        self._data[key] = (time.monotonic() + self.ttl, session)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def invalidate(
+        self,
+        *,
+        adapter: str | None = None,
+        user_id: str | None = None,
+    ) -> int:
+        """移除匹配的缓存条目, 未指定条件时清空缓存
+
+        Args:
+            adapter (str | None, optional): 适配器名称. 默认值为 None.
+            user_id (str | None, optional): 平台用户 ID. 默认值为 None.
+
+        Returns:
+            int: 移除的条目数量
+        """
+        keys = [
+            key
+            for key in self._data
+            if (adapter is None or key.adapter == adapter)
+            and (user_id is None or key.user_id == user_id)
+        ]
+        for key in keys:
+            del self._data[key]
+        return len(keys)
+
+
+session_cache = SessionCache(config.session_cache_size, config.session_cache_ttl)
+
+USER_PLUGIN_ID = "nonebot_plugin_user"
+
+
+@run_postprocessor
+async def _invalidate_session_cache(matcher: Matcher) -> None:
+    # nonebot_plugin_user 的命令可能绑定/解绑账号或修改用户名,
+    # 绑定涉及两个平台账号, 直接清空缓存
+    if matcher.plugin_id == USER_PLUGIN_ID:
+        session_cache.invalidate()
+
+
+def make_session_key(bot: Bot, event: Event) -> SessionKey | None:
+    try:
+        return SessionKey(
+            adapter=bot.adapter.get_name(),
+            self_id=bot.self_id,
+            user_id=event.get_user_id(),
+            scene_id=event.get_session_id(),
+        )
+    except (NotImplementedError, ValueError):  # pragma: no cover
+        return None
+
+
+async def resolve_session(
+    bot: Bot,
+    event: Event,
+    timer: StageTimer | None = None,
+) -> UserSession:
+    """获取事件对应的 UserSession, 优先从缓存中读取
+
+    Raises:
+        NotImplementedError: 无法获取会话/用户信息
+    """
+    key = make_session_key(bot, event)
+    if key is not None and (session := session_cache.get(key)) is not None:
+        return session
+
+    timer = timer or StageTimer()
+    with timer.stage("get_session"):
+        info = await get_session(bot, event)
+    if info is None:
+        raise NotImplementedError("无法获取会话信息")
+    with timer.stage("get_user"):
+        user = await get_user(info)
+    if user is None:
+        raise NotImplementedError("无法获取用户信息")
+    with timer.stage("get_user_session"):
+        session = await get_user_session(info, user)
+    if session is None:
+        raise NotImplementedError("无法获取用户会话信息")  # pragma: no cover
+
+    if key is not None:
+        session_cache.put(key, session)
+    return session
@@ -0,0 +1,186 @@
+import contextlib
+import math
+import time
+from collections import defaultdict
+from collections.abc import Generator, Iterable, Mapping
+
+STAGES = (
+    "session",
+    "get_session",
+    "get_user",
+    "get_user_session",
+    "lock",
+    "solve_code",
+    "create_api",
+    "execute",
+    "check_buffer",
+    "send_result",
+    "total",
+)
+"""Context.execute 中按顺序记录的各阶段名称
+
+`session` 为获取 UserSession 的总耗时, 其后三项仅在会话缓存未命中时记录
+"""
+
+
+class Histogram:
+    """HdrHistogram 风格的对数-线性直方图, 以微秒为单位记录耗时
+
+    小于 `2 ** SUB_BUCKET_BITS` 的值精确记录, 更大的值按二进制数量级分段,
+    每段再细分为 `2 ** (SUB_BUCKET_BITS - 1)` 个桶, 相对误差小于 1%.
+    """
+
+    SUB_BUCKET_BITS = 8
+
+    __slots__ = ("buckets", "count", "max", "min", "total")
+
+    buckets: dict[int, int]
+    count: int
+    total: int
+    min: int
+    max: int
+
+    def __init__(self) -> None:
+        self.buckets = {}
+        self.count = self.total = self.min = self.max = 0
+
+    @classmethod
+    def _index(cls, value: int) -> int:
+        if (shift := value.bit_length() - cls.SUB_BUCKET_BITS) <= 0:
+            return value
+        return (shift << cls.SUB_BUCKET_BITS) | (value >> shift)
+
+    @classmethod
+    def _value(cls, index: int) -> int:
+        shift = index >> cls.SUB_BUCKET_BITS
+        mantissa = index & ((1 << cls.SUB_BUCKET_BITS) - 1)
+        # 返回桶内可能的最大值
+        return ((mantissa + 1) << shift) - 1 if shift else mantissa
+
+    def record(self, value: int) -> None:
+        value = max(value, 0)
+        index = self._index(value)
+        self.buckets[index] = self.buckets.get(index, 0) + 1
+        self.min = min(self.min, value) if self.count else value
+        self.max = max(self.max, value)
+        self.count += 1
+        self.total += value
+
+    def merge(self, other: "Histogram") -> None:
+        for index, count in other.buckets.items():
+            self.buckets[index] = self.buckets.get(index, 0) + count
+        if other.count:
+            self.min = min(self.min, other.min) if self.count else other.min
+            self.max = max(self.max, other.max)
+        self.count += other.count
+        self.total += other.total
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0
+
+    def percentile(self, percent: float) -> int:
+        if not self.count:
+            return 0
+
+        target = max(math.ceil(self.count * percent / 100), 1)
+        seen = 0
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            if seen >= target:
+                return min(self._value(index), self.max)
+        return self.max  # pragma: no cover
+
+    def __repr__(self) -> str:
+        return (
+            f"<{self.__class__.__name__} count={self.count} "
+            f"p50={self.percentile(50)}us p99={self.percentile(99)}us>"
+        )
+
+
+class StageTimer:
+    """记录单次执行中各阶段的耗时"""
+
+    __slots__ = ("records",)
+
+    records: list[tuple[str, int]]
+
+    def __init__(self) -> None:
+        self.records = []
+
+    @contextlib.contextmanager
+    def stage(self, name: str) -> Generator[None]:
+        start = time.perf_counter_ns()
+        try:
+            yield
+        finally:
+            self.records.append((name, (time.perf_counter_ns() - start) // 1000))
+
+
+class ExecutionStats:
+    """按适配器和用户汇总的执行阶段耗时"""
+
+    _by_adapter: defaultdict[str, defaultdict[str, Histogram]]
+    _by_user: defaultdict[int, defaultdict[str, Histogram]]
+
+    def __init__(self) -> None:
+        self._by_adapter = defaultdict(lambda: defaultdict(Histogram))
+        self._by_user = defaultdict(lambda: defaultdict(Histogram))
+
+    def record(
+        self,
+        adapter: str,
+        uin: int | None,
+        records: Iterable[tuple[str, int]],
+    ) -> None:
+        adapter_hist = self._by_adapter[adapter]
+        user_hist = self._by_user[uin] if uin is not None else None
+        for stage, value in records:
+            adapter_hist[stage].record(value)
+            if user_hist is not None:
+                user_hist[stage].record(value)
+
+    def adapters(self) -> list[str]:
+        return list(self._by_adapter)
+
+    def users(self) -> list[int]:
+        return list(self._by_user)
+
+    def by_adapter(self, adapter: str) -> dict[str, Histogram]:
+        return dict(self._by_adapter.get(adapter, {}))
+
+    def by_user(self, uin: int) -> dict[str, Histogram]:
+        return dict(self._by_user.get(uin, {}))
+
+    def overall(self) -> dict[str, Histogram]:
+        result: defaultdict[str, Histogram] = defaultdict(Histogram)
+        for histograms in self._by_adapter.values():
+            for stage, hist in histograms.items():
+                result[stage].merge(hist)
+        return dict(result)
+
+    def reset(self) -> None:
+        self._by_adapter.clear()
+        self._by_user.clear()
+
+
+def _format_us(value: float) -> str:
+    return f"{value / 1000:.2f}ms"
+
+
+def format_histograms(histograms: Mapping[str, Histogram]) -> str:
+    order = {stage: index for index, stage in enumerate(STAGES)}
+    lines = [
+        f"{stage}: n={hist.count} "
+        f"p50={_format_us(hist.percentile(50))} "
+        f"p99={_format_us(hist.percentile(99))} "
+        f"max={_format_us(hist.max)}"
+        for stage, hist in sorted(
+            histograms.items(),
+            key=lambda item: order.get(item[0], len(order)),
+        )
+    ]
+    return "\n".join(lines) or "暂无数据"
+
+
+execution_stats = ExecutionStats()
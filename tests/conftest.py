@@ -27,6 +27,9 @@ def pytest_configure(config: pytest.Config) -> None:
         "exe_code": {
             "user": [str(exe_code_user)],
             "group": [str(exe_code_group)],
+            "send_rate_bot": [1000, 0],
+            "send_rate_user": [1000, 0],
+            "send_rate_target": [1000, 0],
         },
     }
     os.environ["PLUGIN_ALCONNA_TESTENV"] = "1"
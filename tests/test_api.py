@@ -1,3 +1,4 @@
+from collections.abc import AsyncGenerator, Awaitable, Callable
 from typing import Any, cast
 
 import anyio
@@ -11,6 +12,7 @@ from nonebot.adapters.onebot.v11.event import Reply, Sender
 from nonebot.adapters.satori import Message as SatoriMessage
 from nonebot.adapters.satori import MessageSegment as SatoriMessageSegment
 from nonebug import App
+from pytest_mock import MockerFixture
 
 from .conftest import exe_code_group, superuser
 from .fake.common import (
@@ -134,6 +136,333 @@ async def test_buffer_size(app: App) -> None:
             config.buffer_size = original
 
 
+@pytest.mark.anyio
+@pytest.mark.usefixtures("app")
+async def test_buffer_stream() -> None:
+    from nonebot_plugin_exe_code.config import config
+    from nonebot_plugin_exe_code.interface.utils import Buffer
+
+    buffer = Buffer()
+    sent: list[str] = []
+
+    async def send(text: str) -> None:
+        sent.append(text)
+
+    async def fail(_: str) -> None:
+        raise RuntimeError
+
+    original, config.buffer_size = config.buffer_size, 10
+    # 未发送的内容最多积累到 buffer_stream_limit
+    config.buffer_stream_limit = 25
+    try:
+        async with buffer.stream(send):
+            buffer.write("a" * 25)
+            assert len(buffer) == 25
+            with pytest.raises(OverflowError):
+                buffer.write("b")
+            await anyio.sleep(0.01)
+            assert sent == ["a" * 10, "a" * 10, "a" * 5]
+            buffer.write("\n" * 10)
+            await anyio.sleep(0.01)
+            buffer.write("b\n")
+        assert sent == ["a" * 10, "a" * 10, "a" * 5]
+        assert buffer.read() == "b\n"
+
+        async def stream_fail() -> None:
+            async with buffer.stream(fail):
+                buffer.write("a" * 10)
+                await anyio.sleep(0.01)
+
+        with pytest.raises(RuntimeError):
+            await stream_fail()
+
+        # 每条消息不超过 output_limit
+        sent.clear()
+        config.output_limit = 4
+        try:
+            async with buffer.stream(send):
+                buffer.write("a" * 10)
+                await anyio.sleep(0.01)
+        finally:
+            config.output_limit = 4096
+        assert sent == ["aaaa", "aaaa", "aa"]
+
+        async with buffer.stream(fail):
+            buffer.write("a" * 10)
+            await anyio.sleep(0.01)
+            with pytest.raises(RuntimeError):
+                buffer.write("b")
+    finally:
+        config.buffer_size = original
+        config.buffer_stream_limit = 1 << 20
+
+
+@pytest.mark.anyio
+@pytest.mark.usefixtures("app")
+async def test_buffer_stream_inflight() -> None:
+    from nonebot_plugin_exe_code.config import config
+    from nonebot_plugin_exe_code.interface.utils import Buffer
+
+    buffer = Buffer()
+    sent: list[str] = []
+    started = anyio.Event()
+
+    async def send(text: str) -> None:
+        started.set()
+        await anyio.sleep(0.05)
+        sent.append(text)
+
+    async def stream_raise() -> None:
+        async with buffer.stream(send):
+            buffer.write("b" * config.buffer_size)
+            await started.wait()
+            raise RuntimeError
+
+    # 退出时正在发送的内容不会被取消
+    async with buffer.stream(send):
+        buffer.write("a" * config.buffer_size)
+        await started.wait()
+    assert "".join(sent) == "a" * config.buffer_size
+    assert not len(buffer)
+
+    started = anyio.Event()
+    with pytest.raises(ExceptionGroup):
+        await stream_raise()
+    assert "".join(sent).count("b") == config.buffer_size
+
+
+@pytest.mark.anyio
+@pytest.mark.usefixtures("app")
+async def test_buffer_progress() -> None:
+    from nonebot_plugin_alconna.uniseg import Receipt
+
+    from nonebot_plugin_exe_code.config import config
+    from nonebot_plugin_exe_code.interface.utils import Buffer
+
+    messages: list[list[str]] = []
+
+    class FakeReceipt:
+        def __init__(self, *, editable: bool) -> None:
+            self.editable = editable
+            self.history: list[str] = []
+            messages.append(self.history)
+
+        async def edit(self, text: str) -> None:
+            self.history.append(text)
+
+    def sender(*, editable: bool) -> Callable[[str], Awaitable[Receipt]]:
+        async def send(text: str) -> Receipt:
+            receipt = FakeReceipt(editable=editable)
+            await receipt.edit(text)
+            return cast(Receipt, receipt)
+
+        return send
+
+    buffer = Buffer()
+    config.buffer_progress_interval = 0.1
+    original, config.buffer_size = config.buffer_size, 10
+    try:
+        async with buffer.progress(sender(editable=True)):
+            buffer.write("1\n")
+            await anyio.sleep(0.15)
+            buffer.write("\n")
+            await anyio.sleep(0.15)
+            buffer.write("2\n")
+            buffer.write("3" * 8)
+            await anyio.sleep(0.02)
+            buffer.write("4")
+        assert messages == [["1", "1\n\n2\n33333"], ["333", "3334"]]
+        assert buffer.read() == ""
+
+        messages.clear()
+        async with buffer.progress(sender(editable=False)):
+            buffer.write("1")
+            await anyio.sleep(0.15)
+            buffer.write("2")
+        assert messages == [["1"], ["2"]]
+
+        async def fail(_: str) -> Receipt:
+            raise RuntimeError
+
+        async def progress_fail() -> None:
+            async with buffer.progress(fail):
+                buffer.write("1")
+                await anyio.sleep(0.15)
+
+        with pytest.raises(RuntimeError):
+            await progress_fail()
+    finally:
+        config.buffer_progress_interval = 1
+        config.buffer_size = original
+
+
+@pytest.mark.anyio
+@pytest.mark.usefixtures("app")
+async def test_buffer_progress_inflight() -> None:
+    from nonebot_plugin_alconna.uniseg import Receipt
+
+    from nonebot_plugin_exe_code.config import config
+    from nonebot_plugin_exe_code.interface.utils import Buffer, _BufferProgress
+
+    shown: list[str] = []
+    started = anyio.Event()
+
+    class FakeReceipt:
+        editable = False
+
+    async def send(text: str) -> Receipt:
+        started.set()
+        await anyio.sleep(0.05)
+        shown.append(text)
+        return cast(Receipt, FakeReceipt())
+
+    # 退出时正在发送的内容不会被取消
+    buffer = Buffer()
+    async with buffer.progress(send):
+        buffer.write("a" * config.buffer_size)
+        await started.wait()
+    assert "".join(shown) == "a" * config.buffer_size
+
+    # 缓冲区为空时, 仍显示之前未显示的内容
+    progress = _BufferProgress(buffer, send)
+    progress.text = "pending"
+    await progress.close()
+    assert shown[-1] == "pending"
+    assert not progress.text
+    progress.text = "\n"
+    await progress.close()
+    assert shown[-1] == "pending"
+
+
+@pytest.mark.anyio
+@pytest.mark.usefixtures("app")
+async def test_feedback_batch() -> None:
+    from nonebot_plugin_exe_code.config import config
+    from nonebot_plugin_exe_code.interface.utils import FeedbackBatch
+
+    async def fail(_: list[str]) -> None:
+        raise RuntimeError
+
+    async def batch_fail() -> None:
+        async with FeedbackBatch.scope(fail) as batch:
+            await batch.add("a")
+            await anyio.sleep(0.1)
+
+    config.feedback_coalesce_window = 0.05
+    try:
+        with pytest.raises(RuntimeError):
+            await batch_fail()
+
+        async with FeedbackBatch.scope(fail) as batch:
+            await batch.add("a")
+            await anyio.sleep(0.1)
+            with pytest.raises(RuntimeError):
+                await batch.add("b")
+    finally:
+        config.feedback_coalesce_window = 0.5
+
+
+@pytest.mark.anyio
+@pytest.mark.usefixtures("app")
+async def test_feedback_batch_inflight() -> None:
+    from nonebot_plugin_exe_code.config import config
+    from nonebot_plugin_exe_code.interface.utils import FeedbackBatch
+
+    sent: list[list[str]] = []
+    started = anyio.Event()
+
+    async def send(items: list[str]) -> None:
+        started.set()
+        await anyio.sleep(0.05)
+        sent.append(items)
+
+    # 退出时正在发送的内容不会被取消, 之后加入的内容在退出时发送
+    config.feedback_coalesce_window = 0.01
+    try:
+        async with FeedbackBatch.scope(send) as batch:
+            await batch.add("a")
+            await started.wait()
+            await batch.add("b")
+    finally:
+        config.feedback_coalesce_window = 0.5
+    assert sent == [["a"], ["b"]]
+
+    # 退出时不等待合并窗口结束
+    sent.clear()
+    with anyio.fail_after(0.3):
+        async with FeedbackBatch.scope(send) as batch:
+            await batch.add("c")
+    assert sent == [["c"]]
+
+
+@pytest.mark.anyio
+@pytest.mark.usefixtures("app")
+async def test_feedback_batch_raised() -> None:
+    from nonebot_plugin_exe_code.config import config
+    from nonebot_plugin_exe_code.interface.utils import FeedbackBatch
+
+    calls: list[list[str]] = []
+    started = anyio.Event()
+
+    async def fail(items: list[str]) -> None:
+        calls.append(items)
+        started.set()
+        await anyio.sleep(0.05)
+        raise RuntimeError
+
+    # 异常已在 add 中抛出时, 退出时不再发送剩余内容
+    config.feedback_coalesce_window = 0.01
+    try:
+        async with FeedbackBatch.scope(fail) as batch:
+            await batch.add("a")
+            await started.wait()
+            await batch.add("b")
+            await anyio.sleep(0.1)
+            with pytest.raises(RuntimeError):
+                await batch.add("c")
+        assert calls == [["a"]]
+
+        calls.clear()
+        config.feedback_coalesce_size = 1
+        async with FeedbackBatch.scope(fail) as batch:
+            await batch.add("a")
+            with pytest.raises(RuntimeError):
+                await batch.add("b")
+        assert calls == [["a"]]
+    finally:
+        config.feedback_coalesce_window = 0.5
+        config.feedback_coalesce_size = 2048
+
+
+@pytest.mark.anyio
+@pytest.mark.usefixtures("app")
+async def test_feedback_pipeline() -> None:
+    from nonebot_plugin_exe_code.interface.utils import FeedbackPipeline
+
+    async def send() -> int:
+        await anyio.sleep(0.01)
+        return 1
+
+    async def fail() -> int:
+        raise RuntimeError
+
+    async with FeedbackPipeline.scope() as pipeline:
+        future = await pipeline.submit(send)
+        assert not future.done()
+        assert repr(future) == "<SendFuture pending>"
+        assert await future == 1
+        assert repr(future) == "<SendFuture done>"
+
+        failed = await pipeline.submit(fail)
+        skipped = await pipeline.submit(send)
+        with pytest.raises(RuntimeError):
+            await failed
+        with pytest.raises(RuntimeError):
+            await skipped
+        with pytest.raises(RuntimeError):
+            await pipeline.submit(send)
+
+
 @pytest.mark.anyio
 async def test_descriptor(app: App) -> None:
     async with app.test_api() as ctx:
@@ -184,20 +513,29 @@ async def test_superuser(app: App) -> None:
 
 @pytest.mark.anyio
 async def test_send_limit(app: App) -> None:
+    from nonebot_plugin_exe_code.config import config
+    from nonebot_plugin_exe_code.interface.scheduler import send_scheduler
     from nonebot_plugin_exe_code.interface.utils import ReachLimit
 
-    async with app.test_api() as ctx:
-        bot = fake_v11_bot(ctx)
-        event = fake_v11_event()
-
-        for i in range(6):
-            ctx.should_call_send(event, V11Message(str(i)))
+    original = config.send_rate_user, config.send_timeout
+    config.send_rate_user, config.send_timeout = (6, 60), 0.1
+    send_scheduler.reset()
+    try:
+        async with app.test_api() as ctx:
+            bot = fake_v11_bot(ctx)
+            event = fake_v11_event()
 
-        async with ensure_context(bot, event) as api:
             for i in range(6):
-                await api.feedback(i)
-            with pytest.raises(ReachLimit):
-                await api.feedback(6)
+                ctx.should_call_send(event, V11Message(str(i)))
+
+            async with ensure_context(bot, event) as api:
+                for i in range(6):
+                    await api.feedback(i)
+                with pytest.raises(ReachLimit):
+                    await api.feedback(6)
+    finally:
+        config.send_rate_user, config.send_timeout = original
+        send_scheduler.reset()
 
 
 @pytest.mark.anyio
@@ -216,6 +554,43 @@ async def test_is_group(app: App) -> None:
                 assert api.is_group()
 
 
+@pytest.mark.anyio
+async def test_help_cache(app: App, mocker: MockerFixture) -> None:
+    from nonebot.adapters.onebot.v11 import Message, MessageSegment
+
+    from nonebot_plugin_exe_code.interface.adapters import onebot11
+    from nonebot_plugin_exe_code.interface.help_doc import help_cache, message_alia
+
+    API = onebot11.API  # noqa: N806
+    message_alia(Message, MessageSegment)
+    content, description = API.get_all_description()
+    assert API.get_all_description() == (content, description)
+    assert API in help_cache
+
+    # 重复注册的类型不会使缓存失效, 新类型则会
+    message_alia(Message, MessageSegment)
+    assert API in help_cache
+    message_alia(type("_Message", (Message,), {}), MessageSegment)
+    assert API not in help_cache
+    message_alia(Message, MessageSegment)
+
+    convert = mocker.spy(onebot11, "convert_forward")
+    async with app.test_api() as ctx:
+        bot = fake_v11_bot(ctx)
+        event = fake_v11_event(group_id=fake_group_id())
+        with ensure_v11_session_cache(bot, event):
+            async with ensure_context(bot, event) as api:
+                for _ in range(2):
+                    ctx.should_call_api(
+                        "send_group_forward_msg",
+                        {"group_id": event.group_id, "messages": mocker.ANY},
+                        {},
+                    )
+                    await api.help()
+
+    assert convert.call_count == 1
+
+
 @pytest.mark.anyio
 async def test_send_private_forward(app: App) -> None:
     async with app.test_api() as ctx:
@@ -391,6 +766,88 @@ async def test_api_http_request() -> None:
         resp.raise_for_status().read()
 
 
+@respx.mock
+@pytest.mark.anyio
+@pytest.mark.usefixtures("app")
+async def test_api_http_stream() -> None:
+    from nonebot_plugin_exe_code.interface.http import Http, ResponseTooLarge
+
+    url = "https://example.com/file.txt"
+    respx.get(url).mock(httpx.Response(200, content=b"0123456789"))
+    chunks = [chunk async for chunk in Http().stream("GET", url, chunk_size=4)]
+    assert chunks == [b"0123", b"4567", b"89"]
+
+    async def read(limit: int) -> None:
+        async for _ in Http().stream("GET", url, limit=limit):
+            pass
+
+    with pytest.raises(ResponseTooLarge, match="长度 10"):
+        await read(5)
+
+    async def content() -> AsyncGenerator[bytes]:
+        yield b"0123"
+        yield b"4567"
+
+    respx.get(url).mock(httpx.Response(200, content=content()))
+    with pytest.raises(ResponseTooLarge, match="超过限制 6"):
+        await read(6)
+
+    respx.get(url).mock(httpx.Response(404, content=b"not found"))
+    with pytest.raises(RuntimeError):
+        await read(6)
+
+
+@respx.mock
+@pytest.mark.anyio
+@pytest.mark.usefixtures("app")
+async def test_api_http_download() -> None:
+    from nonebot_plugin_exe_code.config import config
+    from nonebot_plugin_exe_code.interface.http import (
+        DOWNLOAD_DIR,
+        Http,
+        ResponseTooLarge,
+        _cleanup_downloads,
+    )
+
+    # 启动时清理上次异常退出时残留的文件
+    await anyio.Path(DOWNLOAD_DIR).mkdir(parents=True, exist_ok=True)
+    await anyio.Path(DOWNLOAD_DIR / "leftover.txt").write_bytes(b"0")
+    await _cleanup_downloads()
+    assert not await anyio.Path(DOWNLOAD_DIR).exists()
+
+    url = "https://example.com/file.txt"
+    respx.get(url).mock(httpx.Response(200, content=b"0123456789"))
+    path = await Http().download(url)
+    assert path.parent == DOWNLOAD_DIR
+    assert path.suffix == ".txt"
+    assert await anyio.Path(path).read_bytes() == b"0123456789"
+
+    # 超过大小限制时删除不完整的文件
+    with pytest.raises(ResponseTooLarge):
+        await Http().download(url, limit=5)
+    assert [p async for p in anyio.Path(DOWNLOAD_DIR).iterdir()] == [path]
+
+    # 超出配额时删除最早下载的文件, 最新下载的文件总是保留
+    config.http_download_quota = 25
+    config.http_download_max_files = 2
+    try:
+        paths = [await Http().download(url) for _ in range(2)]
+        assert {p async for p in anyio.Path(DOWNLOAD_DIR).iterdir()} == {
+            anyio.Path(p) for p in paths
+        }
+        config.http_download_quota = 5
+        latest = await Http().download(url)
+        assert [p async for p in anyio.Path(DOWNLOAD_DIR).iterdir()] == [
+            anyio.Path(latest)
+        ]
+    finally:
+        config.http_download_quota = 256 << 20
+        config.http_download_max_files = 64
+
+    await _cleanup_downloads()
+    assert not await anyio.Path(DOWNLOAD_DIR).exists()
+
+
 @pytest.mark.anyio
 async def test_api_native_send(app: App) -> None:
     async with app.test_api() as ctx:
@@ -399,3 +856,39 @@ async def test_api_native_send(app: App) -> None:
         ctx.should_call_send(event, V11Message("123"), arg="test")
         async with ensure_context(bot, event) as api:
             await api.native_send("123", arg="test")
+
+
+@pytest.mark.anyio
+async def test_export_table(app: App) -> None:
+    from nonebot_plugin_exe_code.interface import create_api, get_default_context
+    from nonebot_plugin_exe_code.interface.adapters.onebot11 import API
+    from nonebot_plugin_exe_code.interface.user_const_var import DEFAULT_BUILTINS
+    from nonebot_plugin_exe_code.interface.utils import is_export_method
+
+    names = [name for name, _ in API.__export_table__]
+    assert names == sorted(names)
+    assert {"feedback", "print", "send_fwd", "user"} <= set(names)
+
+    async with app.test_api() as ctx:
+        bot = fake_v11_bot(ctx)
+        event = fake_v11_event()
+        session = await fake_session(bot, event)
+        context = get_default_context()
+        assert not isinstance(context["__builtins__"], dict)
+        exported: dict[str, Any] = {}
+
+        async with await create_api(bot, event, context, session) as api:
+            assert isinstance(api, API)
+            exported = cast(dict[str, Any], context["__builtins__"])
+            assert type(exported) is dict
+            for name in names:
+                method = exported[name]
+                assert method.__self__ is api
+                assert is_export_method(method)
+            assert exported["user"]("123").uid == "123"
+
+        # 退出后恢复被覆盖的 builtins, 并在下次执行时复用同一字典
+        assert context["__builtins__"] is exported
+        assert exported == DEFAULT_BUILTINS
+        async with await create_api(bot, event, context, session):
+            assert context["__builtins__"] is exported
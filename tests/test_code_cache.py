@@ -0,0 +1,141 @@
+import marshal
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+import pytest
+from nonebot.adapters.onebot.v11 import Message
+from nonebug import App
+
+from .fake.common import ensure_context
+from .fake.onebot11 import fake_v11_bot, fake_v11_event
+
+if TYPE_CHECKING:
+    from nonebot_plugin_exe_code.code_cache import CacheEntry
+
+
+def _entry(source: str) -> "tuple[bytes, CacheEntry]":
+    from nonebot_plugin_exe_code.code_cache import (
+        CacheEntry,
+        CodeCache,
+        TransformedSource,
+    )
+
+    code = compile(source, "<test>", "exec")
+    entry = CacheEntry(code, is_coro=False, source=TransformedSource(source))
+    return CodeCache.make_key(source), entry
+
+
+@pytest.mark.usefixtures("app")
+def test_code_cache_lru() -> None:
+    from nonebot_plugin_exe_code.code_cache import CodeCache
+
+    cache = CodeCache(2)
+    key1, entry1 = _entry("a = 1")
+    key2, entry2 = _entry("a = 2")
+    key3, entry3 = _entry("a = 3")
+
+    assert cache.get(key1) is None
+    cache.put(key1, entry1)
+    cache.put(key2, entry2)
+    assert cache.get(key1) is entry1
+    cache.put(key3, entry3)
+    assert cache.get(key2) is None
+    assert cache.get(key3) is entry3
+
+    info = cache.cache_info()
+    assert (info.hits, info.misses, info.evictions) == (2, 2, 1)
+    assert (info.maxsize, info.currsize) == (2, 2)
+
+    cache.clear()
+    assert cache.cache_info() == (0, 0, 0, 2, 0)
+
+    disabled = CodeCache(0)
+    disabled.put(key1, entry1)
+    assert disabled.get(key1) is None
+
+
+@pytest.mark.usefixtures("app")
+def test_code_cache_persist(tmp_path: Path) -> None:
+    from nonebot_plugin_exe_code.code_cache import CodeCache, _cache_header
+
+    path = tmp_path / "code_cache.bin"
+    cache = CodeCache(4)
+    assert cache.load(path) == 0
+
+    key, entry = _entry("a = 1")
+    cache.put(key, entry)
+    cache.dump(path)
+
+    loaded = CodeCache(4)
+    assert loaded.load(path) == 1
+    cached = loaded.get(key)
+    assert cached is not None
+    assert cached.code == entry.code
+    assert cached.source.text == entry.source.text
+
+    path.write_bytes(b"invalid")
+    assert CodeCache(4).load(path) == 0
+    path.write_bytes(_cache_header() + b"\xff")
+    assert CodeCache(4).load(path) == 0
+    path.write_bytes(_cache_header() + marshal.dumps([(b"key",)]))
+    assert CodeCache(4).load(path) == 0
+
+
+@pytest.mark.anyio
+@pytest.mark.usefixtures("app")
+async def test_code_cache_hook() -> None:
+    from nonebot_plugin_exe_code.code_cache import (
+        CODE_CACHE_FILE,
+        _dump_code_cache,
+        _load_code_cache,
+        code_cache,
+    )
+    from nonebot_plugin_exe_code.config import config
+
+    config.code_cache_persist = True
+    try:
+        await _dump_code_cache()
+        assert CODE_CACHE_FILE.exists()
+        await _load_code_cache()
+    finally:
+        config.code_cache_persist = False
+        CODE_CACHE_FILE.unlink(missing_ok=True)
+
+    assert code_cache.cache_info().currsize <= config.code_cache_size
+
+
+@pytest.mark.anyio
+async def test_code_cache_execute(app: App) -> None:
+    from nonebot_plugin_exe_code.code_cache import code_cache
+    from nonebot_plugin_exe_code.context import Context
+
+    code = "def f():\n    return 1 / 0\nprint(f.__code__.co_filename == __name__)"
+
+    async with app.test_api() as ctx:
+        bot = fake_v11_bot(ctx)
+        event = fake_v11_event()
+
+        ctx.should_call_send(event, Message("True"))
+        ctx.should_call_send(event, Message("True"))
+        async with ensure_context(bot, event):
+            await Context.execute(bot, event, code)
+            hits = code_cache.cache_info().hits
+            await Context.execute(bot, event, code)
+            assert code_cache.cache_info().hits == hits + 1
+
+
+@pytest.mark.usefixtures("app")
+def test_collect_names() -> None:
+    from nonebot_plugin_exe_code.code_cache import collect_names
+
+    def names(source: str) -> frozenset[str] | None:
+        return collect_names(compile(source, "<test>", "exec"))
+
+    assert names("x = print(gid)") == {"x", "print", "gid"}
+    assert names("def f():\n    def g(): return api.uid\n    return g") == {
+        "f",
+        "api",
+        "uid",
+    }
+    assert names("print(globals())") is None
+    assert names("def f():\n    return eval('gid')") is None
@@ -1,6 +1,13 @@
+import json
+import sqlite3
+from pathlib import Path
+from typing import cast
+
+import anyio
 import pytest
 from nonebot.adapters.onebot.v11 import Message
 from nonebug import App
+from pytest_mock import MockerFixture
 
 from .fake.common import ensure_context, fake_session, fake_user_id
 from .fake.onebot11 import fake_v11_bot, fake_v11_event
@@ -69,3 +76,188 @@ async def test_invalid_const_var_value(app: App) -> None:
         async with ensure_context(bot, event):
             with pytest.raises(TypeError, match="Invalid argument"):
                 await Context.execute(bot, event, code_test_invalid_const_var_value)
+
+
+@pytest.mark.anyio
+@pytest.mark.usefixtures("app")
+async def test_const_cache() -> None:
+    from nonebot_plugin_exe_code.constant import DATA_DIR
+    from nonebot_plugin_exe_code.interface.const_backend import JsonBackend
+    from nonebot_plugin_exe_code.interface.user_const_var import ConstCache
+
+    uin = f"test_{fake_user_id()}"
+    fp = DATA_DIR / f"{uin}.json"
+    backend = JsonBackend(DATA_DIR)
+    cache = ConstCache(backend, 3600)
+
+    assert not cache.names(uin)
+    assert not fp.exists()
+
+    cache.set(uin, "a", {"b": [1]})
+    value = cache.get(uin)["a"]
+    assert isinstance(value, dict)
+    value["b"].append(2)
+    assert cache.get(uin) == {"a": {"b": [1]}}
+    assert not fp.exists()
+
+    await cache.flush()
+    assert json.loads(fp.read_text()) == {"a": {"b": [1]}}
+    assert list(DATA_DIR.glob(f"{uin}*")) == [fp]
+
+    fresh = ConstCache(backend, 3600)
+    assert fresh.get(uin, {"a"}) == {"a": {"b": [1]}}
+    assert fresh.get(uin, {"x"}) == {}
+
+    cache.set(uin, "missing")
+    cache.set(uin, "a")
+    await cache.flush()
+    assert not fp.exists()
+
+    timed = ConstCache(backend, 0)
+    timed.set(uin, "c", 1)
+    timed.set(uin, "d", 2)
+    await anyio.sleep(0.5)
+    assert json.loads(fp.read_text()) == {"c": 1, "d": 2}
+    timed.set(uin, "c")
+    timed.set(uin, "d")
+    await timed.flush()
+
+
+@pytest.mark.usefixtures("app")
+def test_sqlite_backend(tmp_path: Path) -> None:
+    from nonebot_plugin_exe_code.interface.const_backend import SqliteBackend
+
+    (tmp_path / "user_1.json").write_text(json.dumps({"a": 1, "b": [2]}))
+    (tmp_path / "user_2.json").write_text("invalid")
+    db = tmp_path / "const_var.sqlite3"
+
+    backend = SqliteBackend(db, json_dir=tmp_path)
+    backend.open()
+    (tmp_path / "user_1.json").unlink()
+    assert backend.load("user_1") == {"a": "1", "b": "[2]"}
+    assert backend.load("user_2") == {}
+
+    # 多个进程共享数据库时, 写入不同的常量不会相互覆盖
+    other = SqliteBackend(db, json_dir=tmp_path)
+    backend.write({"user_1": {"a": None, "c": '"c"'}})
+    other.write({"user_1": {"d": "4"}})
+    assert other.load("user_1") == {"b": "[2]", "c": '"c"', "d": "4"}
+
+    # 写入失败时回滚整个批次
+    with pytest.raises(sqlite3.ProgrammingError):
+        other.write({"user_1": {"e": "5"}, "user_3": {"f": cast("str", object())}})
+    assert "e" not in other.load("user_1")
+
+    backend.close()
+    other.close()
+    backend.close()
+
+    # JSON 文件仅在首次连接时导入
+    (tmp_path / "user_5.json").write_text(json.dumps({"x": 1}))
+    backend = SqliteBackend(db, json_dir=tmp_path)
+    assert backend.load("user_5") == {}
+    assert backend.load("user_1") == {"b": "[2]", "c": '"c"', "d": "4"}
+    backend.close()
+
+
+@pytest.mark.anyio
+@pytest.mark.usefixtures("app")
+async def test_sqlite_const_cache(tmp_path: Path, mocker: MockerFixture) -> None:
+    from nonebot_plugin_exe_code.config import config
+    from nonebot_plugin_exe_code.interface import user_const_var
+    from nonebot_plugin_exe_code.interface.const_backend import SqliteBackend
+
+    mocker.patch.object(config, "const_backend", "sqlite")
+    mocker.patch.object(user_const_var, "DATA_DIR", tmp_path)
+    backend = user_const_var._create_backend()  # noqa: SLF001
+    assert isinstance(backend, SqliteBackend)
+
+    await user_const_var._open_const_backend()  # noqa: SLF001
+    cache = user_const_var.ConstCache(backend, 3600)
+    spy = mocker.spy(backend, "load")
+    await cache.preload("user")
+    await cache.preload("user")
+    assert cache.get("user") == {}
+    assert spy.call_count == 1
+    cache.set("user", "a", {"b": 1})
+    cache.set("user", "c", 2)
+    await cache.flush()
+    assert backend.load("user") == {"a": '{"b": 1}', "c": "2"}
+    backend.close()
+
+
+@pytest.mark.anyio
+@pytest.mark.usefixtures("app")
+async def test_sqlite_const_cache_shared(tmp_path: Path, mocker: MockerFixture) -> None:
+    from nonebot_plugin_exe_code.interface.const_backend import SqliteBackend
+    from nonebot_plugin_exe_code.interface.user_const_var import ConstCache
+
+    db = tmp_path / "const_var.sqlite3"
+    backend, other = SqliteBackend(db), SqliteBackend(db)
+    cache, other_cache = ConstCache(backend, 3600), ConstCache(other, 3600)
+    spy = mocker.spy(backend, "load")
+
+    await cache.preload("user")
+    cache.set("user", "a", 1)
+    await cache.flush()
+    await other_cache.preload("user")
+    assert other_cache.get("user") == {"a": 1}
+
+    # 自身的写入不会使缓存失效
+    await cache.preload("user")
+    assert spy.call_count == 1
+
+    # 其他进程修改后重新加载, 尚未写入的修改以缓存为准
+    cache.set("user", "b", 2)
+    cache.set("user", "a")
+    other_cache.set("user", "a", 3)
+    other_cache.set("user", "c", 4)
+    await other_cache.flush()
+    await cache.preload("user")
+    assert spy.call_count == 2
+    assert cache.get("user") == {"b": 2, "c": 4}
+
+    await cache.flush()
+    await other_cache.preload("user")
+    assert other_cache.get("user") == {"b": 2, "c": 4}
+    backend.close()
+    other.close()
+
+
+@pytest.mark.anyio
+@pytest.mark.usefixtures("app")
+async def test_const_cache_retry() -> None:
+    from nonebot_plugin_exe_code.interface.const_backend import ConstChanges, ConstData
+    from nonebot_plugin_exe_code.interface.user_const_var import ConstCache
+
+    class _Backend:
+        def __init__(self) -> None:
+            self.failures = 2
+            self.written: list[ConstChanges] = []
+
+        def open(self) -> None: ...
+
+        def version(self) -> int | None:
+            return None
+
+        def load(self, uin: str) -> ConstData:  # noqa: ARG002
+            return {}
+
+        def write(self, changes: ConstChanges) -> None:
+            if self.failures:
+                self.failures -= 1
+                raise OSError("disk full")
+            self.written.append(changes)
+
+        def close(self) -> None: ...
+
+    backend = _Backend()
+    cache = ConstCache(backend, 0)
+    cache.retry_delay = 0.05
+
+    cache.set("user", "a", 1)
+    # 第 1, 2 次写入失败, 分别在 0.05, 0.1 秒后重试
+    await anyio.sleep(0.5)
+    assert backend.written == [{"user": {"a": "1"}}]
+    assert backend.failures == 0
+    assert cache._failures == 0  # noqa: SLF001
@@ -1,12 +1,18 @@
+from base64 import b64encode
 from typing import override
 
 import anyio
 import pytest
-from nonebot.adapters.onebot.v11 import Message
+from nonebot.adapters.console import Message as ConsoleMessage
+from nonebot.adapters.onebot.v11 import Message, MessageSegment
 from nonebug import App
+from pytest_mock import MockerFixture
 
+from .conftest import superuser
 from .fake.common import ensure_context, fake_session
+from .fake.console import fake_console_bot, fake_console_event
 from .fake.onebot11 import fake_v11_bot, fake_v11_event
+from .fake.satori import fake_satori_bot, fake_satori_event
 
 
 @pytest.mark.anyio
@@ -120,21 +126,321 @@ async def test_session_fetch(app: App) -> None:
 
 @pytest.mark.anyio
 async def test_async_generator_executor(app: App) -> None:
+    from nonebot_plugin_exe_code.config import config
     from nonebot_plugin_exe_code.context import Context
+    from nonebot_plugin_exe_code.interface.scheduler import send_scheduler
     from nonebot_plugin_exe_code.interface.utils import ReachLimit
 
+    original = config.send_rate_user, config.send_timeout
+    config.send_rate_user, config.send_timeout = (6, 60), 0.1
+    send_scheduler.reset()
+    try:
+        async with app.test_api() as ctx:
+            bot = fake_v11_bot(ctx)
+            event = fake_v11_event()
+            session = await fake_session(bot, event)
+
+            for i in range(6):
+                ctx.should_call_send(event, Message(str(i)))
+            async with ensure_context(bot, event):
+                with pytest.raises(ReachLimit):
+                    await Context.get_context(session).execute(
+                        bot, event, "yield from range(6); yield -1"
+                    )
+    finally:
+        config.send_rate_user, config.send_timeout = original
+        send_scheduler.reset()
+
+
+@pytest.mark.anyio
+async def test_buffer_stream(app: App) -> None:
+    from nonebot_plugin_exe_code.config import config
+    from nonebot_plugin_exe_code.context import Context
+
     async with app.test_api() as ctx:
         bot = fake_v11_bot(ctx)
         event = fake_v11_event()
         session = await fake_session(bot, event)
+        context = Context.get_context(session)
 
-        for i in range(ReachLimit.limit):
-            ctx.should_call_send(event, Message(str(i)))
-        async with ensure_context(bot, event):
-            with pytest.raises(ReachLimit):
-                await Context.get_context(session).execute(
-                    bot, event, f"yield from range({ReachLimit.limit}); yield -1"
+        config.buffer_stream = True
+        config.buffer_stream_interval = 0.05
+        original, config.buffer_size = config.buffer_size, 10
+        try:
+            async with ensure_context(bot, event):
+                # 同步代码在工作线程中执行, 写满缓冲区时等待发送完成
+                for i in range(3):
+                    ctx.should_call_send(event, Message(str(i) * 9))
+                await context.execute(
+                    bot, event, "for i in range(3): print(str(i) * 9)"
+                )
+
+                ctx.should_call_send(event, Message("1"))
+                ctx.should_call_send(event, Message("2"))
+                await context.execute(
+                    bot, event, "print(1); await sleep(0.2); print(2)"
+                )
+
+                # 在事件循环中执行且不让出控制权时, 内容积累到执行结束后发送
+                code = "print('a' * 9); print('b' * 9); print('c')"
+                ctx.should_call_send(
+                    event, Message("a" * 9 + "\n" + "b" * 9 + "\n" + "c")
+                )
+                await context.execute(bot, event, code)
+
+                # 等待时在执行期间发送
+                ctx.should_call_send(event, Message("a" * 9))
+                ctx.should_call_send(event, Message("b" * 9))
+                await context.execute(
+                    bot, event, "print('a' * 9); await sleep(0.01); print('b' * 9)"
+                )
+
+                # 超过 buffer_stream_limit 时抛出缓冲区溢出, 已写入的内容仍会发送
+                config.buffer_stream_limit = 20
+                ctx.should_call_send(event, Message("a" * 9 + "\n" + "b" * 9))
+                with pytest.raises(OverflowError):
+                    await context.execute(bot, event, code)
+        finally:
+            config.buffer_stream = False
+            config.buffer_stream_interval = 2
+            config.buffer_size = original
+            config.buffer_stream_limit = 1 << 20
+
+
+@pytest.mark.anyio
+async def test_long_output(app: App, mocker: MockerFixture) -> None:
+    from nonebot_plugin_alconna.uniseg import UniMessage
+
+    from nonebot_plugin_exe_code.config import config
+    from nonebot_plugin_exe_code.context import Context
+    from nonebot_plugin_exe_code.interface.adapters.onebot11 import API
+
+    result = repr("b" * 14).encode()
+    config.output_limit = 10
+    config.output_chunk_size = 5
+    config.output_max_chunks = 3
+    try:
+        async with app.test_api() as ctx:
+            bot = fake_v11_bot(ctx)
+            event = fake_v11_event()
+            async with ensure_context(bot, event):
+                ctx.should_call_api(
+                    "send_private_forward_msg",
+                    {
+                        "user_id": event.user_id,
+                        "messages": Message(
+                            MessageSegment.node_custom(0, "forward", Message(text))
+                            for text in ["aaaaa", "aaaaa", "aa"]
+                        ),
+                    },
+                    {},
+                )
+                ctx.should_call_api(
+                    "upload_private_file",
+                    {
+                        "user_id": event.user_id,
+                        "file": f"base64://{b64encode(result).decode()}",
+                        "name": "output.txt",
+                    },
+                )
+                await Context.execute(bot, event, "print('a' * 12); return 'b' * 14")
+
+                # 输出中类似 CQ 码的内容作为纯文本发送
+                text = "[CQ:at,qq=all]&#91;"
+                forward = mocker.patch.object(API, "_send_forward")
+                config.output_chunk_size = 20
+                await Context.execute(bot, event, f"print({text!r})")
+                config.output_chunk_size = 5
+                forward.assert_awaited_once_with(
+                    Message(
+                        MessageSegment.node_custom(
+                            0, "forward", Message(MessageSegment.text(text))
+                        )
+                    )
+                )
+                mocker.stop(forward)
+
+        async with app.test_api() as ctx:
+            bot = fake_console_bot(ctx)
+            event = fake_console_event()
+            async with ensure_context(bot, event):
+                ctx.should_call_send(
+                    event,
+                    ConsoleMessage(
+                        "0123456789\n...(输出过长, 已省略 5 个字符, 可通过 out 获取)"
+                    ),
+                )
+                ctx.should_call_send(event, ConsoleMessage("'abcde'"))
+                await Context.execute(bot, event, "print('0123456789abcde')")
+                await Context.execute(bot, event, "out")
+
+                # 之后的输出未被截断时删除变量 out
+                ctx.should_call_send(event, ConsoleMessage("False"))
+                await Context.execute(bot, event, "return 'out' in globals()")
+
+                # 不覆盖用户定义的同名变量
+                ctx.should_call_send(
+                    event, ConsoleMessage("0123456789\n...(输出过长, 已省略 5 个字符)")
                 )
+                ctx.should_call_send(event, ConsoleMessage("1"))
+                await Context.execute(bot, event, "out = 1; print('0123456789abcde')")
+                await Context.execute(bot, event, "return out")
+                await Context.execute(bot, event, "del out")
+
+        send = mocker.patch.object(UniMessage, "send")
+        async with app.test_api() as ctx:
+            bot = fake_satori_bot(ctx)
+            event = fake_satori_event()
+            async with ensure_context(bot, event):
+                await Context.execute(bot, event, "print('a' * 11)")
+        send.assert_awaited_once_with(bot=bot)
+    finally:
+        config.output_limit = 4096
+        config.output_chunk_size = 2048
+        config.output_max_chunks = 20
+
+
+@pytest.mark.anyio
+async def test_feedback_coalesce(app: App, mocker: MockerFixture) -> None:
+    from nonebot_plugin_exe_code.config import config
+    from nonebot_plugin_exe_code.context import Context
+    from nonebot_plugin_exe_code.interface.adapters.onebot11 import API
+
+    config.feedback_coalesce = True
+    config.feedback_coalesce_window = 0.05
+    config.feedback_coalesce_size = 10
+    config.feedback_forward_threshold = 3
+    try:
+        async with app.test_api() as ctx:
+            bot = fake_v11_bot(ctx)
+            event = fake_v11_event()
+            async with ensure_context(bot, event):
+                ctx.should_call_send(event, Message("0\n1"))
+                ctx.should_call_send(event, Message("message"))
+                ctx.should_call_send(event, Message("2"))
+                ctx.should_call_send(event, Message("3"))
+                await Context.execute(
+                    bot,
+                    event,
+                    "yield from range(2)\n"
+                    "assert (yield UniMessage('message')) is not None\n"
+                    "assert (yield 2) is None\n"
+                    "await sleep(0.1)\n"
+                    "yield 3",
+                )
+
+                ctx.should_call_api(
+                    "send_private_forward_msg",
+                    {
+                        "user_id": event.user_id,
+                        "messages": Message(
+                            MessageSegment.node_custom(0, "forward", Message(text))
+                            for text in ["aaaa", "bbbb", "cc"]
+                        ),
+                    },
+                    {},
+                )
+                ctx.should_call_send(event, Message("dddd"))
+                await Context.execute(
+                    bot, event, "yield from ['aaaa', 'bbbb', 'cc', 'dddd']"
+                )
+
+                # 合并的文本作为纯文本发送, 不解析其中的 CQ 码
+                forward = mocker.patch.object(API, "_send_forward")
+                await Context.execute(bot, event, "yield from ['[CQ:rps]', 'a', 'b']")
+                forward.assert_awaited_once_with(
+                    Message(
+                        MessageSegment.node_custom(
+                            0, "forward", Message(MessageSegment.text(text))
+                        )
+                        for text in ["[CQ:rps]", "a", "b"]
+                    )
+                )
+    finally:
+        config.feedback_coalesce = False
+        config.feedback_coalesce_window = 0.5
+        config.feedback_coalesce_size = 2048
+        config.feedback_forward_threshold = 5
+
+
+@pytest.mark.anyio
+async def test_feedback_scope_error(app: App) -> None:
+    from nonebot_plugin_exe_code.config import config
+    from nonebot_plugin_exe_code.context import Context
+
+    config.feedback_coalesce = True
+    try:
+        async with app.test_api() as ctx:
+            bot = fake_v11_bot(ctx)
+            event = fake_v11_event()
+            async with ensure_context(bot, event):
+                # 退出时发送 feedback 失败, 仍发送缓冲区内容并报告代码抛出的异常
+                ctx.should_call_send(event, Message("f"), exception=RuntimeError())
+                ctx.should_call_send(event, Message("p"))
+                with pytest.raises(ExceptionGroup) as exc_info:
+                    await Context.execute(
+                        bot, event, "print('p'); yield 'f'; raise ValueError"
+                    )
+                assert [type(e) for e in exc_info.value.exceptions] == [
+                    ValueError,
+                    RuntimeError,
+                ]
+
+                ctx.should_call_send(event, Message("f"), exception=RuntimeError())
+                ctx.should_call_send(event, Message("1"))
+                with pytest.raises(RuntimeError):
+                    await Context.execute(bot, event, "yield 'f'; return 1")
+
+                # 发送缓冲区内容失败时不会遗留到下次执行
+                config.feedback_coalesce = False
+                ctx.should_call_send(event, Message("p"), exception=RuntimeError())
+                with pytest.raises(RuntimeError):
+                    await Context.execute(bot, event, "print('p')")
+                ctx.should_call_send(event, Message("q"))
+                await Context.execute(bot, event, "print('q')")
+    finally:
+        config.feedback_coalesce = False
+
+
+@pytest.mark.anyio
+async def test_feedback_pipeline(app: App) -> None:
+    from nonebot_plugin_exe_code.config import config
+    from nonebot_plugin_exe_code.context import Context
+    from nonebot_plugin_exe_code.interface.scheduler import send_scheduler
+    from nonebot_plugin_exe_code.interface.utils import ReachLimit
+
+    config.feedback_pipeline = True
+    original = config.send_rate_user, config.send_timeout
+    try:
+        async with app.test_api() as ctx:
+            bot = fake_v11_bot(ctx)
+            event = fake_v11_event()
+            async with ensure_context(bot, event):
+                ctx.should_call_send(event, Message("1"))
+                ctx.should_call_send(event, Message("2"))
+                ctx.should_call_send(event, Message("Receipt"))
+                await Context.execute(
+                    bot,
+                    event,
+                    "f = yield 1\nyield 2\nprint(type(await f).__name__)",
+                )
+
+                config.feedback_coalesce = True
+                ctx.should_call_send(event, Message("0\n1"))
+                await Context.execute(bot, event, "yield from range(2)")
+                config.feedback_coalesce = False
+
+                config.send_rate_user, config.send_timeout = (1, 60), 0.05
+                send_scheduler.reset()
+                ctx.should_call_send(event, Message("1"))
+                # 发送 feedback 失败时仍发送返回值
+                ctx.should_call_send(event, Message("<SendFuture done>"))
+                with pytest.raises(ReachLimit):
+                    await Context.execute(bot, event, "yield 1; yield 2; yield 3")
+    finally:
+        config.feedback_pipeline = config.feedback_coalesce = False
+        config.send_rate_user, config.send_timeout = original
+        send_scheduler.reset()
 
 
 @pytest.mark.anyio
@@ -153,6 +459,81 @@ async def test_delete_builtins(app: App) -> None:
             assert "__builtins__" in context.ctx
 
 
+@pytest.mark.anyio
+async def test_shared_builtins(app: App) -> None:
+    from nonebot_plugin_exe_code.context import Context
+    from nonebot_plugin_exe_code.interface.user_const_var import SHARED_BUILTINS
+
+    assert Context(1).ctx["__builtins__"] is Context(2).ctx["__builtins__"]
+    with pytest.raises(TypeError):
+        SHARED_BUILTINS["print"] = None  # pyright: ignore[reportIndexIssue]
+
+    async with app.test_api() as ctx:
+        bot = fake_v11_bot(ctx)
+        event = fake_v11_event()
+        session = await fake_session(bot, event)
+
+        async with ensure_context(bot, event):
+            context = Context.get_context(session)
+            await context.execute(bot, event, "__builtins__['mark'] = 1")
+            builtins = context.ctx["__builtins__"]
+            assert type(builtins) is dict
+            assert builtins["mark"] == 1
+            assert builtins["print"] is print
+            assert "api" not in builtins
+
+            code = "reset()\nassert 'api' in __builtins__"
+            await context.execute(bot, event, code)
+            assert context.ctx["__builtins__"] is not builtins
+            assert "mark" not in context.ctx["__builtins__"]
+            assert "api" not in context.ctx["__builtins__"]
+
+
+@pytest.mark.anyio
+async def test_lazy_export(app: App, mocker: MockerFixture) -> None:
+    from nonebot_plugin_exe_code.context import Context
+    from nonebot_plugin_exe_code.interface import api as api_module
+    from nonebot_plugin_exe_code.interface.interface import Interface
+
+    export = mocker.spy(Interface, "_export")
+    load_const = mocker.spy(api_module, "load_const")
+
+    def exported() -> set[str]:
+        names = {call.args[1] for call in export.call_args_list}
+        export.reset_mock()
+        return names
+
+    async with app.test_api() as ctx:
+        bot = fake_v11_bot(ctx)
+        event = fake_v11_event(superuser)
+        context = Context.get_context(await fake_session(bot, event))
+        context.names = set()
+
+        ctx.should_call_send(event, Message("1"))
+        ctx.should_call_send(event, Message("None"))
+        ctx.should_call_send(event, Message("2"))
+        async with ensure_context(bot, event):
+            export.reset_mock()
+            await Context.execute(bot, event, "print(1)\ndef f(): return gid")
+            names = exported()
+            assert {"api", "print", "gid"} <= names
+            assert not {"http", "sudo", "user", "uid"} & names
+            load_const.assert_not_called()
+
+            # 之前定义的函数引用的名称仍会被导出
+            await Context.execute(bot, event, "print(f())")
+            assert "gid" in exported()
+
+            await Context.execute(bot, event, "api.set_const('lazy_const', 2)")
+            await Context.execute(bot, event, "print(lazy_const)")
+            load_const.assert_called_once()
+
+            # 动态访问全局名称时导出全部名称
+            await Context.execute(bot, event, "assert 'sudo' in __builtins__")
+            assert {"http", "sudo", "user", "uid"} <= exported()
+            await Context.execute(bot, event, "api.set_const('lazy_const')")
+
+
 @pytest.mark.anyio
 async def test_context_namespace(app: App) -> None:
     from nonebot_plugin_exe_code.context import Context
@@ -318,3 +699,91 @@ def test_ast_node_transformer() -> None:
     Visitor4().visit(transformed)
     assert Visitor4.yield_visited, "Yield should not be transformed"
     assert Visitor4.yield_from_visited, "YieldFrom should not be transformed"
+
+
+def test_linecache_registry(mocker: MockerFixture) -> None:
+    import ast
+    import inspect
+    import linecache
+
+    from nonebot_plugin_exe_code.code_cache import TransformedSource
+    from nonebot_plugin_exe_code.context import LineCacheRegistry
+
+    registry = LineCacheRegistry(maxsize=2, ttl=300)
+    source = TransformedSource(ast.parse("a = 1\nb = 2"))
+
+    unparse = mocker.spy(ast, "unparse")
+    with registry.track("<test_linecache_1>", source):
+        assert "<test_linecache_1>" in registry
+        # 源码在被读取前不会生成
+        unparse.assert_not_called()
+        assert linecache.getline("<test_linecache_1>", 2) == "b = 2\n"
+        assert linecache.getlines("<test_linecache_1>")[:1] == ["a = 1\n"]
+        assert list(linecache.getlines("<test_linecache_1>")) == ["a = 1\n", "b = 2\n"]
+        unparse.assert_called_once()
+
+    abs_filename = inspect.getabsfile(object, "<test_linecache_1>")  # pyright: ignore[reportArgumentType]
+    assert abs_filename in inspect.modulesbyfile
+
+    registry.register("<test_linecache_2>", TransformedSource("c = 3"))
+    registry.register("<test_linecache_3>", TransformedSource("d = 4"))
+    assert len(registry) == 2
+    assert "<test_linecache_1>" not in registry
+    assert "<test_linecache_1>" not in linecache.cache
+    assert abs_filename not in inspect.modulesbyfile
+
+    registry.ttl = 0
+    registry.refresh("<test_linecache_2>")
+    registry.refresh("<test_linecache_3>")
+    registry.evict()
+    assert len(registry) == 0
+    assert "<test_linecache_3>" not in linecache.cache
+
+
+code_test_traceback_source = """\
+def f():
+    return 1 / 0
+f()
+"""
+
+
+@pytest.mark.anyio
+async def test_traceback_source(app: App) -> None:
+    from nonebot_plugin_exe_code.context import Context
+
+    async with app.test_api() as ctx:
+        bot = fake_v11_bot(ctx)
+        event = fake_v11_event()
+        session = await fake_session(bot, event)
+
+        async with ensure_context(bot, event):
+            context = Context.get_context(session)
+            with pytest.raises(ZeroDivisionError):
+                await context.execute(bot, event, code_test_traceback_source)
+            assert "return 1 / 0" in context.ctx["tb"]
+
+
+@pytest.mark.anyio
+async def test_line_offset_note(app: App) -> None:
+    from nonebot_plugin_exe_code.context import Context
+
+    async with app.test_api() as ctx:
+        bot = fake_v11_bot(ctx)
+        event = fake_v11_event()
+        session = await fake_session(bot, event)
+
+        async with ensure_context(bot, event):
+            context = Context.get_context(session)
+            with pytest.raises(ZeroDivisionError) as exc_info:
+                await context.execute(bot, event, "a = 1\n1 / 0", session, 2)
+            note = "代码第 2 行对应消息第 4 行"
+            assert exc_info.value.__notes__ == [note]
+            assert note in context.ctx["tb"]
+
+            with pytest.raises(SyntaxError) as exc_info:
+                await context.execute(bot, event, "a = 1\n1 +", session, 1)
+            assert exc_info.value.__notes__ == ["代码第 2 行对应消息第 3 行"]
+
+            with pytest.raises(ZeroDivisionError) as exc_info:
+                await context.execute(bot, event, "1 / 0", session)
+            assert not hasattr(exc_info.value, "__notes__")
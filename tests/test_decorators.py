@@ -1,8 +1,13 @@
-from collections.abc import Iterable
+from collections.abc import Callable, Iterable
 from typing import Any, overload
 
 import pytest
 from nonebot.utils import is_coroutine_callable
+from nonebug import App
+from pytest_mock import MockerFixture
+
+from .fake.common import ensure_context
+from .fake.onebot11 import fake_v11_bot, fake_v11_event
 
 
 @pytest.mark.usefixtures("app")
@@ -40,6 +45,56 @@ def test_make_wrapper() -> None:
     assert result == expected
 
 
+@pytest.mark.anyio
+@pytest.mark.usefixtures("app")
+async def test_make_wrapper_stacked() -> None:
+    from nonebot_plugin_exe_code.interface.decorators import (
+        T_Args,
+        T_Kwargs,
+        make_wrapper,
+    )
+
+    called: list[str] = []
+
+    def make_before(name: str) -> Any:
+        def before(args: T_Args, kwargs: T_Kwargs) -> tuple[T_Args, T_Kwargs] | None:
+            called.append(name)
+            return ((*args, name), kwargs) if name != "skip" else None
+
+        return before
+
+    def make_after(name: str) -> Any:
+        def after(_args: T_Args, _kwargs: T_Kwargs, result: Any) -> tuple[bool, Any]:
+            called.append(name)
+            return name != "skip", [*result, name]
+
+        return after
+
+    def func(*args: Any, **kwargs: Any) -> list[Any]:
+        return [args, kwargs]
+
+    async def func_async(*args: Any, **kwargs: Any) -> list[Any]:
+        return func(*args, **kwargs)
+
+    sync_wrapper: Callable[..., Any] = func
+    async_wrapper: Callable[..., Any] = func_async
+    for name in ("b1", "skip", "b2"):
+        sync_wrapper = make_wrapper(sync_wrapper, make_before(name), make_after(name))
+        async_wrapper = make_wrapper(async_wrapper, make_before(name), make_after(name))
+
+    expected = [(0, "b2", "b1"), {"k": 1}, "b1", "b2"]
+    assert sync_wrapper(0, k=1) == expected
+    assert called == ["b2", "skip", "b1", "b1", "skip", "b2"]
+    assert is_coroutine_callable(async_wrapper)
+    assert await async_wrapper(0, k=1) == expected
+
+    wrapped_data = getattr(sync_wrapper, "__exe_code_wrapped__", None)
+    assert wrapped_data is not None
+    assert wrapped_data[0] is func
+    assert (len(wrapped_data[1]), len(wrapped_data[2])) == (3, 3)
+    assert make_wrapper(func)(1) == [(1,), {}]
+
+
 @pytest.mark.usefixtures("app")
 def test_strict() -> None:
     from nonebot_plugin_exe_code.interface.decorators import strict
@@ -148,3 +203,125 @@ async def test_overload() -> None:
 
     with pytest.raises(AttributeError):
         del test.test1
+
+
+@pytest.mark.anyio
+async def test_bound_method_cache(app: App) -> None:
+    from nonebot_plugin_exe_code.interface.decorators import make_wrapper
+
+    async with app.test_api() as ctx:
+        bot = fake_v11_bot(ctx)
+        event = fake_v11_event()
+        async with ensure_context(bot, event) as api:
+            assert api.is_group is api.is_group
+            usr = api.user("123")
+            assert usr.send is usr.send
+            assert usr.send is not api.user("123").send
+
+            called: list[Any] = []
+
+            def before(args: Any, kwargs: Any) -> None:
+                called.append((args, kwargs))
+
+            assert make_wrapper(api.is_group, before)() is False
+            assert called == [((), {})]
+
+
+@pytest.mark.usefixtures("app")
+def test_overload_dispatch_cache(mocker: MockerFixture) -> None:
+    from nonebot_plugin_exe_code.interface import validator
+    from nonebot_plugin_exe_code.interface.decorators import Overload
+
+    class _Test:
+        @overload
+        def test(self, foo: int) -> str:
+            return "int"
+
+        @overload
+        def test(self, foo: list[int]) -> str:
+            return "list[int]"
+
+        @overload
+        def test(self, foo: list[Any]) -> str:
+            return "list"
+
+        @Overload
+        def test(self, foo: list[Any] | int) -> str: ...
+
+    test = _Test()
+    spy = mocker.spy(validator.Validator, "check")
+
+    assert test.test(1) == "int"
+    assert test.test(2) == "int"
+    assert spy.call_count == 1
+
+    # 依赖元素值的重载不会按类型缓存
+    assert test.test(["a"]) == "list"
+    assert test.test([1]) == "list[int]"
+    assert spy.call_count == 6
+
+    with pytest.raises(TypeError, match="未找到匹配的重载"):
+        test.test("a")  # type: ignore[reportCallIssue,reportArgumentType]
+
+
+@pytest.mark.anyio
+async def test_overload_bound_cache(app: App) -> None:
+    async with app.test_api() as ctx:
+        bot = fake_v11_bot(ctx)
+        event = fake_v11_event()
+        async with ensure_context(bot, event) as api:
+            assert api.help is api.help
+
+
+@pytest.mark.usefixtures("app")
+def test_debug_log_switch(mocker: MockerFixture) -> None:
+    import nonebot
+
+    from nonebot_plugin_exe_code.debug import debug_switch
+    from nonebot_plugin_exe_code.interface.decorators import debug_log
+
+    class _Payload:
+        def __repr__(self) -> str:
+            nonlocal formatted
+            formatted += 1
+            return "payload"
+
+    formatted = 0
+    debug = mocker.spy(nonebot.logger, "debug")
+
+    @debug_log
+    def func(payload: _Payload) -> _Payload:
+        return payload
+
+    payload = _Payload()
+    driver_config = nonebot.get_driver().config
+    log_level = driver_config.log_level
+
+    assert debug_switch.refresh()
+    func(payload)
+    assert (formatted, debug.call_count) == (1, 1)
+
+    try:
+        debug_switch.set(False)
+        func(payload)
+        assert (formatted, debug.call_count) == (1, 1)
+
+        debug_switch.set(None)
+        assert debug_switch.enabled
+
+        # 跟随 NoneBot 的 log_level 配置, 手动设置优先
+        driver_config.log_level = "INFO"
+        assert debug_switch.enabled
+        assert not debug_switch.refresh()
+        debug_switch.set(True)
+        assert debug_switch.enabled
+        driver_config.log_level = 5
+        debug_switch.set(False)
+        assert not debug_switch.enabled
+        assert debug_switch.refresh()
+    finally:
+        driver_config.log_level = log_level
+        debug_switch.set(None)
+
+    func(payload)
+    assert (formatted, debug.call_count) == (2, 2)
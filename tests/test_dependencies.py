@@ -9,12 +9,15 @@ from nonebot.dependencies import Dependent
 from nonebot.internal.matcher import Matcher
 from nonebot.internal.params import DependsInner
 from nonebug import App
+from pytest_mock import MockerFixture
 
+from .conftest import exe_code_group, superuser
 from .fake.common import ensure_context, fake_img_bytes, fake_user_id
 from .fake.onebot11 import (
     ensure_v11_session_cache,
     fake_v11_bot,
     fake_v11_group_message_event,
+    make_v11_session_cache,
 )
 
 
@@ -386,3 +389,76 @@ async def test_event_reply_message_fail_2(app: App) -> None:
             async with ensure_context(bot, event):
                 with pytest.raises(BaseExceptionGroup):
                     await dependent(bot=bot, event=event, state=state, stack=stack)
+
+
+@pytest.mark.usefixtures("app")
+def test_prefix_trie() -> None:
+    from nonebot_plugin_exe_code.matchers.depends import PrefixTrie
+
+    trie = PrefixTrie()
+    for prefix in "get", "getimg", "code":
+        trie.insert(prefix)
+
+    assert trie.match("getimg img") == "getimg"
+    assert trie.match("getmid") == "get"
+    assert trie.match("co") is None
+    assert trie.match("") is None
+
+    msg = MessageSegment.image(file=fake_img_bytes) + MessageSegment.text(" getimg ")
+    assert trie.match_message(msg) == ("getimg", "getimg")
+    assert trie.match_message(Message("hello")) is None
+    assert trie.match_message(Message("cat")) is None
+    assert trie.match_message(Message(MessageSegment.face(1))) is None
+
+
+@pytest.mark.anyio
+async def test_dispatch(app: App, mocker: MockerFixture) -> None:
+    from nonebot_plugin_exe_code.matchers import depends
+    from nonebot_plugin_exe_code.matchers.code import handle_code
+    from nonebot_plugin_exe_code.matchers.dispatch import matcher
+
+    async with app.test_matcher(matcher) as ctx:
+        bot = fake_v11_bot(ctx)
+        event = fake_v11_group_message_event(
+            group_id=exe_code_group,
+            user_id=superuser,
+            message=Message("hello world"),
+        )
+        cleanup = make_v11_session_cache(bot, event)
+        ctx.receive_event(bot, event)
+        ctx.should_pass_permission(matcher)
+        ctx.should_not_pass_rule(matcher)
+    cleanup()
+
+    # 普通消息在匹配命令时即被拒绝, 不查询用户会话
+    resolve = mocker.spy(depends, "resolve_session")
+    async with app.test_matcher(matcher) as ctx:
+        bot = fake_v11_bot(ctx)
+        event = fake_v11_group_message_event(
+            group_id=exe_code_group,
+            user_id=fake_user_id(),
+            message=Message("hello world"),
+        )
+        ctx.receive_event(bot, event)
+        ctx.should_pass_permission(matcher)
+        ctx.should_not_pass_rule(matcher)
+    resolve.assert_not_called()
+
+    assert any(handler.call is handle_code for handler in matcher.handlers)
+
+
+@pytest.mark.usefixtures("app")
+def test_parse_code_message() -> None:
+    from nonebot_plugin_alconna.uniseg import At, Image, Reply, Text, UniMessage
+
+    from nonebot_plugin_exe_code.matchers.depends import parse_code_message
+
+    msg = UniMessage([Reply("1"), Text(" \n"), Text("\n code\n\n"), Text("  print(")])
+    msg += [At("user", "123"), Reply("2"), Text(")")]
+    assert parse_code_message(msg) == ('print(UserStr("123"))', 4)
+    assert parse_code_message(UniMessage.text("code 1\n2")) == ("1\n2", 0)
+
+    assert parse_code_message(UniMessage.text("print(1)")) is None
+    assert parse_code_message(UniMessage.text(" \n ")) is None
+    assert parse_code_message(UniMessage.at("123").text("code 1")) is None
+    assert parse_code_message(UniMessage([Image(url="x"), Text("code")])) is None
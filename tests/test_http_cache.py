@@ -0,0 +1,267 @@
+from pathlib import Path
+
+import httpx
+import nonebot
+import pytest
+import respx
+from nonebot.drivers import HTTPClientMixin
+from nonebot.internal.driver.model import Request, Response
+
+URL = "https://example.com/api"
+
+
+def _count_files(path: Path) -> int:
+    return len(list(path.iterdir()))
+
+
+def _file_sizes(path: Path) -> dict[str, int]:
+    return {p.name: p.stat().st_size for p in path.iterdir()}
+
+
+@pytest.mark.usefixtures("app")
+@pytest.mark.parametrize(
+    ("headers", "expected"),
+    [
+        ({"Cache-Control": "no-store, max-age=10"}, None),
+        ({"Cache-Control": "no-cache"}, 0),
+        ({"Cache-Control": "public, max-age=10", "Age": "3"}, 7),
+        ({"Cache-Control": "max-age=1", "Age": "5"}, 0),
+        ({"Cache-Control": "max-age=x"}, 60),
+        (
+            {
+                "Date": "Mon, 01 Jan 2024 00:00:00 GMT",
+                "Expires": "Mon, 01 Jan 2024 00:00:30 GMT",
+            },
+            30,
+        ),
+        ({"Expires": "0"}, 0),
+        ({"Age": "x"}, 60),
+        ({}, 60),
+    ],
+)
+def test_freshness_lifetime(headers: dict[str, str], expected: float | None) -> None:
+    from nonebot_plugin_exe_code.interface.http_cache import freshness_lifetime
+
+    assert freshness_lifetime(headers) == expected
+
+
+@pytest.mark.usefixtures("app")
+def test_http_cache_key() -> None:
+    from nonebot_plugin_exe_code.interface.http_cache import HttpCache
+
+    key = HttpCache.make_key(Request("GET", URL, params={"a": 1}))
+    assert key is not None
+    assert key == HttpCache.make_key(Request("GET", f"{URL}?a=1"))
+    assert key != HttpCache.make_key(Request("GET", URL, params={"a": 2}))
+    assert key != HttpCache.make_key(
+        Request("GET", f"{URL}?a=1", headers={"Authorization": "token"})
+    )
+    assert key != HttpCache.make_key(Request("GET", f"{URL}?a=1", cookies={"a": "1"}))
+
+    assert HttpCache.make_key(Request("POST", URL)) is None
+    assert HttpCache.make_key(Request("GET", URL, content="a")) is None
+    assert (
+        HttpCache.make_key(Request("GET", URL, headers={"If-None-Match": "a"})) is None
+    )
+
+
+@respx.mock
+@pytest.mark.anyio
+@pytest.mark.usefixtures("app")
+async def test_http_cache_hit() -> None:
+    from nonebot_plugin_exe_code.config import config
+    from nonebot_plugin_exe_code.interface.http import Http
+    from nonebot_plugin_exe_code.interface.http_cache import http_cache
+
+    route = respx.get(URL).mock(
+        httpx.Response(200, content=b"data", headers={"Cache-Control": "max-age=60"})
+    )
+    http_cache.clear()
+
+    config.http_cache = True
+    try:
+        assert (await Http().get(URL)).read() == b"data"
+        resp = await Http().get(URL)
+        assert resp.read() == b"data"
+        assert resp.headers["Cache-Control"] == "max-age=60"
+        assert route.call_count == 1
+
+        await Http().get(URL, cache=False)
+        await Http().request("GET", URL, content="body", cache=True)
+        assert route.call_count == 3
+    finally:
+        config.http_cache = False
+
+    await Http().get(URL)
+    await Http().get(URL, cache=True)
+    assert route.call_count == 4
+
+    info = http_cache.cache_info()
+    assert (info.hits, info.misses, info.currsize) == (2, 1, 1)
+    assert info.hit_rate == 2 / 3
+    assert "hit_rate=66.7%" in http_cache.format_stats()
+
+    respx.clear()
+    route = respx.get(URL).mock(
+        httpx.Response(200, content=b"data", headers={"Cache-Control": "no-store"})
+    )
+    await Http().get(f"{URL}?a=1", cache=True)
+    await Http().get(f"{URL}?a=1", cache=True)
+    assert route.call_count == 2
+
+    respx.clear()
+    large = b"x" * (config.http_cache_max_bytes + 1)
+    route = respx.get(URL).mock(httpx.Response(200, content=large))
+    await Http().get(f"{URL}?b=1", cache=True)
+    await Http().get(f"{URL}?b=1", cache=True)
+    assert route.call_count == 2
+    http_cache.clear()
+
+
+@respx.mock
+@pytest.mark.anyio
+@pytest.mark.usefixtures("app")
+async def test_http_cache_revalidate() -> None:
+    from nonebot_plugin_exe_code.interface.http import Http
+    from nonebot_plugin_exe_code.interface.http_cache import http_cache
+
+    conditions: list[tuple[str | None, str | None]] = []
+    modified = "Mon, 01 Jan 2024 00:00:00 GMT"
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        etag = request.headers.get("If-None-Match")
+        since = request.headers.get("If-Modified-Since")
+        conditions.append((etag, since))
+        if etag == '"v1"':
+            return httpx.Response(304, headers={"Cache-Control": "no-cache"})
+        if since == modified:
+            return httpx.Response(304, headers={"Cache-Control": "no-store"})
+        return httpx.Response(
+            200,
+            content=b"v1",
+            headers={"Cache-Control": "no-cache", "ETag": '"v1"'}
+            if request.url.path == "/etag"
+            else {"Cache-Control": "no-cache", "Last-Modified": modified},
+        )
+
+    respx.get(host="example.com").mock(side_effect=handler)
+    http_cache.clear()
+
+    etag_url = "https://example.com/etag"
+    for _ in range(3):
+        assert (await Http().get(etag_url, cache=True)).read() == b"v1"
+    assert conditions == [(None, None), ('"v1"', None), ('"v1"', None)]
+    assert http_cache.revalidated == 2
+
+    # 304 响应声明 no-store 时仍返回缓存的响应体, 但删除缓存条目
+    conditions.clear()
+    lm_url = "https://example.com/lm"
+    for _ in range(3):
+        assert (await Http().get(lm_url, cache=True)).read() == b"v1"
+    assert conditions == [(None, None), (None, modified), (None, None)]
+    assert http_cache.cache_info().currsize == 2
+    http_cache.clear()
+
+
+@respx.mock
+@pytest.mark.anyio
+@pytest.mark.usefixtures("app")
+async def test_http_cache_disk(tmp_path: Path) -> None:
+    from nonebot_plugin_exe_code.config import config
+    from nonebot_plugin_exe_code.interface.http_cache import CachedResponse, HttpCache
+
+    http = nonebot.get_driver()
+    assert isinstance(http, HTTPClientMixin)
+    route = respx.get(host="example.com").mock(
+        httpx.Response(200, content=b"data\nline", headers={"ETag": '"a"'})
+    )
+    cache = HttpCache(1, tmp_path)
+
+    await cache.fetch(http, Request("GET", f"{URL}/1"))
+    await cache.fetch(http, Request("GET", f"{URL}/2"))
+    assert cache.evictions == 1
+    assert _count_files(tmp_path) == 2
+
+    cache.clear()
+    resp = await cache.fetch(http, Request("GET", f"{URL}/1"))
+    assert resp.content == b"data\nline"
+    assert resp.headers["ETag"] == '"a"'
+    assert route.call_count == 2
+    assert (cache.hits, cache.disk_hits) == (1, 1)
+
+    config.http_cache_disk_size = 1
+    try:
+        await cache.fetch(http, Request("GET", f"{URL}/3"))
+    finally:
+        config.http_cache_disk_size = 1024
+    assert _count_files(tmp_path) == 1
+
+    key = HttpCache.make_key(Request("GET", f"{URL}/3"))
+    assert key is not None
+    (tmp_path / key).write_bytes(b"invalid\n")
+    cache.clear()
+    assert await cache.get(key) is None
+    assert CachedResponse.load(b"[1, 2]\n") is None
+    entry = CachedResponse.from_response(Response(200, content="text"), 0)
+    assert entry is not None
+    assert entry.content == b"text"
+
+    # 重新验证时收到不可缓存的响应, 删除旧条目
+    respx.clear()
+    respx.get(host="example.com").mock(httpx.Response(404))
+    (tmp_path / key).write_bytes(
+        CachedResponse(200, (("ETag", '"a"'),), b"old", 0).dump()
+    )
+    resp = await cache.fetch(http, Request("GET", f"{URL}/3"))
+    assert resp.status_code == 404
+    assert not (tmp_path / key).exists()
+
+    respx.get(host="example.com").mock(httpx.Response(200))
+    cache = HttpCache(0)
+    await cache.fetch(http, Request("GET", f"{URL}/1"))
+    assert cache.cache_info().currsize == 0
+
+
+@respx.mock
+@pytest.mark.anyio
+@pytest.mark.usefixtures("app")
+async def test_http_cache_disk_tracking(tmp_path: Path) -> None:
+    from nonebot_plugin_exe_code.config import config
+    from nonebot_plugin_exe_code.interface.http_cache import HttpCache
+
+    http = nonebot.get_driver()
+    assert isinstance(http, HTTPClientMixin)
+    respx.get(host="example.com").mock(httpx.Response(200, content=b"data"))
+
+    # 扫描已有文件时忽略临时文件
+    (tmp_path / "old").write_bytes(b"old")
+    (tmp_path / "old.1.tmp").write_bytes(b"tmp")
+    cache = HttpCache(0, tmp_path)
+    config.http_cache_disk_size = 2
+    try:
+        await cache.fetch(http, Request("GET", f"{URL}/1"))
+        assert cache.cache_info().disksize == 2
+
+        # 被外部删除的文件不影响写入和淘汰
+        (tmp_path / "old").unlink()
+        await cache.fetch(http, Request("GET", f"{URL}/2"))
+        assert cache.cache_info().disksize == 2
+        files = _file_sizes(tmp_path)
+        disk_bytes = sum(files.values()) - files.pop("old.1.tmp")
+        assert cache.disk_bytes == disk_bytes
+        assert sorted(files) == sorted(
+            str(HttpCache.make_key(Request("GET", f"{URL}/{i}"))) for i in (1, 2)
+        )
+        assert f"disk=2 ({cache.disk_bytes} bytes)" in cache.format_stats()
+    finally:
+        config.http_cache_disk_size = 1024
+
+    # private 响应仅保存在内存中
+    respx.clear()
+    respx.get(host="example.com").mock(
+        httpx.Response(200, content=b"data", headers={"Cache-Control": "private"})
+    )
+    cache = HttpCache(1, tmp_path)
+    await cache.fetch(http, Request("GET", f"{URL}/3"))
+    assert cache.cache_info()[-3:] == (1, 2, disk_bytes)
+    assert not (tmp_path / str(HttpCache.make_key(Request("GET", f"{URL}/3")))).exists()
@@ -223,6 +223,8 @@ async def test_ob11_file2str(app: App) -> None:
 
     import anyio
 
+    from nonebot_plugin_exe_code.config import config
+
     async with app.test_api() as ctx, ensure_v11_api(ctx) as api:
         user_id = api.event.user_id
 
@@ -245,6 +247,16 @@ async def test_ob11_file2str(app: App) -> None:
         fp = await anyio.Path("__tmp_file__").resolve()
         await fp.write_bytes(b"file")
         await api.send_file(pathlib.Path(fp), "name")
+
+        config.local_file_uri = True
+        try:
+            ctx.should_call_api(
+                "upload_private_file",
+                {"user_id": user_id, "file": fp.as_uri(), "name": "name"},
+            )
+            await api.send_file(pathlib.Path(fp), "name")
+        finally:
+            config.local_file_uri = False
         await fp.unlink()
 
 
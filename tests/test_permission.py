@@ -96,7 +96,9 @@ async def test_not_allow_private(app: App) -> None:
         event = fake_v11_private_exe_code(user_id, fake_code)
         cleanup = make_v11_session_cache(bot, event)
         ctx.receive_event(bot, event)
-        ctx.should_not_pass_permission(matcher)
+        # 匹配命令后在规则中检查权限
+        ctx.should_pass_permission(matcher)
+        ctx.should_not_pass_rule(matcher)
     cleanup()
 
 
@@ -111,5 +113,7 @@ async def test_not_allow_group(app: App) -> None:
         event = fake_v11_group_exe_code(group_id, user_id, fake_code)
         cleanup = make_v11_session_cache(bot, event)
         ctx.receive_event(bot, event)
-        ctx.should_not_pass_permission(matcher)
+        # 匹配命令后在规则中检查权限
+        ctx.should_pass_permission(matcher)
+        ctx.should_not_pass_rule(matcher)
     cleanup()
@@ -0,0 +1,124 @@
+import time
+
+import anyio
+import pytest
+from pytest_mock import MockerFixture
+
+
+@pytest.mark.usefixtures("app")
+def test_token_bucket() -> None:
+    from nonebot_plugin_exe_code.interface.scheduler import TokenBucket
+
+    bucket = TokenBucket(2, 1)
+    now = bucket.updated
+    assert bucket.refill(now) == 2
+    bucket.tokens = 0
+    assert bucket.refill(now + 0.5) == pytest.approx(0.5)
+    assert bucket.delay(0.5) == pytest.approx(0.5)
+    assert bucket.refill(now + 10) == 2
+    assert bucket.delay(2) == 0
+
+    bucket = TokenBucket(3, 0)
+    bucket.tokens = 0
+    assert bucket.refill(now) == 3
+
+
+@pytest.mark.anyio
+@pytest.mark.usefixtures("app")
+async def test_scheduler_backpressure() -> None:
+    from nonebot_plugin_exe_code.config import config
+    from nonebot_plugin_exe_code.interface.scheduler import SendScheduler
+
+    scheduler = SendScheduler()
+    original, config.send_rate_target = config.send_rate_target, (2, 0.05)
+    try:
+        start = time.monotonic()
+        for _ in range(4):
+            await scheduler.acquire((("target", 1),), 0)
+        assert time.monotonic() - start >= 0.09
+
+        # 不同的令牌桶不受影响
+        start = time.monotonic()
+        await scheduler.acquire((("target", 2),), 0)
+        assert time.monotonic() - start < 0.05
+    finally:
+        config.send_rate_target = original
+
+    assert scheduler.wait_time.count == 5
+    assert scheduler.wait_time.max >= 40_000
+    assert scheduler.depth == 0
+    assert scheduler.max_depth == 1
+    assert scheduler.format_stats().startswith("send_queue: depth=0 max=1\n")
+
+
+@pytest.mark.anyio
+@pytest.mark.usefixtures("app")
+async def test_scheduler_priority() -> None:
+    from nonebot_plugin_exe_code.config import config
+    from nonebot_plugin_exe_code.interface.scheduler import (
+        PRIORITY_BULK,
+        PRIORITY_REPLY,
+        SendScheduler,
+    )
+
+    scheduler = SendScheduler()
+    order: list[str] = []
+
+    async def acquire(name: str, key: int, priority: int, delay: float) -> None:
+        await anyio.sleep(delay)
+        await scheduler.acquire((("bot", 0), ("target", key)), priority)
+        order.append(name)
+
+    original, config.send_rate_bot = config.send_rate_bot, (1, 0.1)
+    try:
+        await scheduler.acquire((("bot", 0),), PRIORITY_REPLY)
+        async with anyio.create_task_group() as tg:
+            tg.start_soon(acquire, "bulk-1", 1, PRIORITY_BULK, 0)
+            tg.start_soon(acquire, "bulk-2", 1, PRIORITY_BULK, 0.01)
+            tg.start_soon(acquire, "reply", 2, PRIORITY_REPLY, 0.02)
+    finally:
+        config.send_rate_bot = original
+
+    assert order == ["reply", "bulk-1", "bulk-2"]
+    assert scheduler.max_depth == 3
+
+
+@pytest.mark.anyio
+@pytest.mark.usefixtures("app")
+async def test_scheduler_limit(mocker: MockerFixture) -> None:
+    from nonebot_plugin_exe_code.config import config
+    from nonebot_plugin_exe_code.interface.scheduler import ReachLimit, SendScheduler
+
+    scheduler = SendScheduler()
+    original = (
+        config.send_rate_user,
+        config.send_queue_size,
+        config.send_timeout,
+    )
+    config.send_rate_user = (1, 60)
+    config.send_queue_size = 1
+    config.send_timeout = 1
+    try:
+        await scheduler.acquire((("user", 1),), 0)
+        async with anyio.create_task_group() as tg:
+            tg.start_soon(scheduler.acquire, (("user", 1),), 0)
+            await anyio.sleep(0.01)
+            assert scheduler.depth == 1
+            config.send_timeout = 0.05
+            with pytest.raises(ReachLimit, match="队列已满"):
+                await scheduler.acquire((("user", 2),), 0)
+            tg.cancel_scope.cancel()
+        assert scheduler.depth == 0
+
+        mocker.patch.object(scheduler, "MAX_BUCKETS", 1)
+        config.send_rate_user = (1, 0)
+        scheduler.reset()
+        await scheduler.acquire((("user", 3),), 0)
+        await scheduler.acquire((("user", 4),), 0)
+        assert len(scheduler._buckets) == 0  # noqa: SLF001
+    finally:
+        (
+            config.send_rate_user,
+            config.send_queue_size,
+            config.send_timeout,
+        ) = original
@@ -0,0 +1,110 @@
+import time
+from types import SimpleNamespace
+from typing import TYPE_CHECKING, cast
+
+import pytest
+from nonebot.adapters.onebot.v11 import Message
+from nonebug import App
+from pytest_mock import MockerFixture
+
+from .fake.common import ensure_context
+from .fake.onebot11 import fake_v11_bot, fake_v11_event
+
+if TYPE_CHECKING:
+    from nonebot.matcher import Matcher
+    from nonebot_plugin_user.models import UserSession
+
+
+def _key(user_id: str, adapter: str = "OneBot V11") -> tuple[str, str, str, str]:
+    return (adapter, "test", user_id, user_id)
+
+
+@pytest.mark.usefixtures("app")
+def test_session_cache(mocker: MockerFixture) -> None:
+    from nonebot_plugin_exe_code.session import SessionCache, SessionKey
+
+    cache = SessionCache(2, 60)
+    key1, key2, key3 = (SessionKey(*_key(str(i))) for i in range(3))
+    session = cast("UserSession", object())
+
+    assert cache.get(key1) is None
+    cache.put(key1, session)
+    cache.put(key2, session)
+    assert cache.get(key1) is session
+    cache.put(key3, session)
+    assert cache.get(key2) is None
+    assert len(cache) == 2
+    assert (cache.hits, cache.misses) == (1, 2)
+
+    now = time.monotonic()
+    mocker.patch.object(time, "monotonic", return_value=now + 120)
+    assert cache.get(key1) is None
+    assert len(cache) == 1
+
+    disabled = SessionCache(2, 0)
+    disabled.put(key1, session)
+    assert disabled.get(key1) is None
+
+
+@pytest.mark.usefixtures("app")
+def test_session_cache_invalidate() -> None:
+    from nonebot_plugin_exe_code.session import SessionCache, SessionKey
+
+    cache = SessionCache(8, 60)
+    session = cast("UserSession", object())
+    cache.put(SessionKey(*_key("1")), session)
+    cache.put(SessionKey(*_key("2")), session)
+    cache.put(SessionKey(*_key("1", "Telegram")), session)
+
+    assert cache.invalidate(user_id="1", adapter="Telegram") == 1
+    assert cache.invalidate(user_id="1") == 1
+    assert cache.invalidate() == 1
+    assert len(cache) == 0
+
+
+@pytest.mark.anyio
+@pytest.mark.usefixtures("app")
+async def test_session_cache_user_command() -> None:
+    from nonebot_plugin_exe_code.session import (
+        USER_PLUGIN_ID,
+        SessionKey,
+        _invalidate_session_cache,
+        session_cache,
+    )
+
+    session = cast("UserSession", object())
+    session_cache.put(SessionKey(*_key("1")), session)
+
+    def matcher(plugin_id: str) -> "Matcher":
+        return cast("Matcher", SimpleNamespace(plugin_id=plugin_id))
+
+    await _invalidate_session_cache(matcher("other"))
+    assert session_cache.get(SessionKey(*_key("1"))) is session
+    await _invalidate_session_cache(matcher(USER_PLUGIN_ID))
+    assert session_cache.get(SessionKey(*_key("1"))) is None
+
+
+@pytest.mark.anyio
+async def test_resolve_session_cached(app: App, mocker: MockerFixture) -> None:
+    from nonebot_plugin_exe_code import session as module
+    from nonebot_plugin_exe_code.context import Context
+
+    spy = mocker.spy(module, "get_session")
+
+    async with app.test_api() as ctx:
+        bot = fake_v11_bot(ctx)
+        event = fake_v11_event()
+
+        first = await module.resolve_session(bot, event)
+        second = await module.resolve_session(bot, event)
+        assert first is second
+        assert spy.call_count == 1
+
+        ctx.should_call_send(event, Message("1"))
+        async with ensure_context(bot, event):
+            await Context.execute(bot, event, "print(1)")
+        assert spy.call_count == 1
+
+        module.session_cache.invalidate(user_id=event.get_user_id())
+        assert await module.resolve_session(bot, event) is not first
+        assert spy.call_count == 2
@@ -0,0 +1,155 @@
+import pytest
+from nonebot.adapters.onebot.v11 import Message, MessageSegment
+from nonebug import App
+
+from .conftest import exe_code_group, superuser
+from .fake.common import ensure_context, fake_session, fake_user_id
+from .fake.onebot11 import (
+    fake_v11_bot,
+    fake_v11_event,
+    fake_v11_group_message_event,
+    make_v11_session_cache,
+)
+
+
+@pytest.mark.usefixtures("app")
+def test_histogram() -> None:
+    from nonebot_plugin_exe_code.stats import Histogram
+
+    hist = Histogram()
+    assert hist.percentile(50) == 0
+    assert hist.mean == 0
+
+    for value in range(1, 10001):
+        hist.record(value)
+
+    assert hist.count == 10000
+    assert (hist.min, hist.max) == (1, 10000)
+    assert hist.mean == pytest.approx(5000.5)
+    for percent in 50, 90, 99:
+        expected = 10000 * percent / 100
+        assert hist.percentile(percent) == pytest.approx(expected, rel=0.01)
+    assert hist.percentile(100) == 10000
+
+    other = Histogram()
+    other.record(20000)
+    hist.merge(other)
+    hist.merge(Histogram())
+    assert hist.count == 10001
+    assert hist.max == 20000
+    assert "count=10001" in repr(hist)
+
+    empty = Histogram()
+    empty.merge(other)
+    assert (empty.min, empty.max) == (20000, 20000)
+
+
+@pytest.mark.anyio
+async def test_execution_stats(app: App) -> None:
+    from nonebot_plugin_exe_code.context import Context
+    from nonebot_plugin_exe_code.stats import (
+        STAGES,
+        ExecutionStats,
+        execution_stats,
+        format_histograms,
+    )
+
+    async with app.test_api() as ctx:
+        bot = fake_v11_bot(ctx)
+        event = fake_v11_event()
+        session = await fake_session(bot, event)
+
+        ctx.should_call_send(event, Message("1"))
+        ctx.should_call_send(event, Message("2"))
+        async with ensure_context(bot, event):
+            await Context.execute(bot, event, "print(1); return 2")
+
+    adapter = bot.adapter.get_name()
+    assert adapter in execution_stats.adapters()
+    assert session.user_id in execution_stats.users()
+    histograms = execution_stats.by_user(session.user_id)
+    assert set(histograms) == set(STAGES)
+    assert all(hist.count == 1 for hist in histograms.values())
+    assert set(execution_stats.by_adapter(adapter)) == set(STAGES)
+    assert execution_stats.overall()["total"].count >= 1
+
+    text = format_histograms(histograms)
+    assert text.splitlines()[0].startswith("session: n=1 p50=")
+    assert text.splitlines()[-1].startswith("total: n=1 p50=")
+    assert format_histograms({}) == "暂无数据"
+
+    stats = ExecutionStats()
+    stats.record(adapter, None, [("total", 100)])
+    assert stats.users() == []
+    stats.reset()
+    assert stats.adapters() == []
+
+
+@pytest.mark.anyio
+async def test_stats_matcher(app: App) -> None:
+    from nonebot_plugin_exe_code.config import config
+    from nonebot_plugin_exe_code.context import Context
+    from nonebot_plugin_exe_code.interface.http_cache import http_cache
+    from nonebot_plugin_exe_code.interface.scheduler import send_scheduler
+    from nonebot_plugin_exe_code.matchers.stats import matcher
+    from nonebot_plugin_exe_code.stats import execution_stats, format_histograms
+
+    config.http_cache = True
+    async with app.test_matcher(matcher) as ctx:
+        bot = fake_v11_bot(ctx)
+        event = fake_v11_group_message_event(
+            group_id=exe_code_group,
+            user_id=superuser,
+            message=Message("exestats"),
+        )
+        cleanup = make_v11_session_cache(bot, event)
+        async with ensure_context(bot, event):
+            await Context.execute(bot, event, "")
+        uin = (await fake_session(bot, event)).user_id
+        adapter = bot.adapter.get_name()
+        expected = (
+            f"[{adapter}] 执行耗时统计\n"
+            f"{format_histograms(execution_stats.by_adapter(adapter))}\n\n"
+            f"消息发送统计\n{send_scheduler.format_stats()}\n\n"
+            f"HTTP 缓存统计\n{http_cache.format_stats()}"
+        )
+        ctx.receive_event(bot, event)
+        ctx.should_pass_permission(matcher)
+        ctx.should_call_send(event, Message(expected))
+        ctx.should_finished(matcher)
+    config.http_cache = False
+    cleanup()
+
+    async with app.test_matcher(matcher) as ctx:
+        bot = fake_v11_bot(ctx)
+        event = fake_v11_group_message_event(
+            group_id=exe_code_group,
+            user_id=superuser,
+            message=MessageSegment.text("exestats ") + MessageSegment.at(superuser),
+        )
+        expected = format_histograms(execution_stats.by_user(uin))
+        ctx.receive_event(bot, event)
+        ctx.should_pass_permission(matcher)
+        ctx.should_call_send(event, Message(f"用户 {uin} 执行耗时统计\n{expected}"))
+        ctx.should_finished(matcher)
+
+
+@pytest.mark.anyio
+async def test_stats_matcher_fail(app: App) -> None:
+    from nonebot_plugin_exe_code.matchers.stats import matcher
+
+    async with app.test_matcher(matcher) as ctx:
+        bot = fake_v11_bot(ctx)
+        target_id = fake_user_id()
+        event = fake_v11_group_message_event(
+            group_id=exe_code_group,
+            user_id=superuser,
+            message=MessageSegment.text("exestats ") + MessageSegment.at(target_id),
+        )
+        ctx.receive_event(bot, event)
+        ctx.should_pass_permission(matcher)
+        ctx.should_call_send(
+            event,
+            "获取 Context 失败: "
+            f"SessionNotInitialized: None, key=('{target_id}', '{bot.type}')",
+        )
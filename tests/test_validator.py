@@ -0,0 +1,163 @@
+from collections.abc import Callable, Iterator, Mapping, Sequence
+from typing import Annotated, Any, Literal, TypedDict, TypeVar
+
+import pytest
+
+
+class _Movie(TypedDict):
+    name: str
+    year: int
+
+
+type _Alias = int | list[str]
+_Bound = TypeVar("_Bound", bound=str)
+_Constrained = TypeVar("_Constrained", int, bytes)
+_Free = TypeVar("_Free")
+
+
+@pytest.mark.usefixtures("app")
+@pytest.mark.parametrize(
+    ("annotation", "accepted", "rejected"),
+    [
+        (Any, [1, None], []),
+        (None, [None], [0]),
+        (_Alias, [1, ["a"]], ["a", [1]]),
+        (_Bound, ["a"], [1]),
+        (_Constrained, [1, b""], ["a"]),
+        (_Free, [1, "a"], []),
+        (Annotated[int, "meta"], [1], ["1"]),
+        (Literal["a", 1], ["a", 1], ["b"]),
+        (int | list[int], [1, [1, 2]], [["1"], "1"]),
+        (_Movie, [{"name": "a", "year": 1}], [{"name": "a"}]),
+        (tuple[int, str], [(1, "a")], [(1, 2), (1,), [1, "a"]]),
+        (tuple[int, ...], [(), (1, 2)], [(1, "a")]),
+        (dict[str, int], [{"a": 1}], [{"a": "1"}, {1: 1}, [("a", 1)]]),
+        (Mapping[str, int], [{"a": 1}], [{"a": None}]),
+        (Sequence[int], [[1], (1,)], [["a"], {1}]),
+        (Callable[[int], int], [len], [1]),
+        (list, [[1, "a"]], [(1,)]),
+    ],
+)
+def test_compile_checker(
+    annotation: object,
+    accepted: list[object],
+    rejected: list[object],
+) -> None:
+    from nonebot_plugin_exe_code.interface.validator import compile_checker
+
+    checker = compile_checker(annotation)
+    assert all(map(checker, accepted))
+    assert not any(map(checker, rejected))
+
+
+@pytest.mark.usefixtures("app")
+def test_iterator_not_consumed() -> None:
+    from nonebot_plugin_exe_code.interface.validator import compile_checker
+
+    iterator = iter([1, 2, 3])
+    assert compile_checker(Iterator[str])(iterator)
+    assert list(iterator) == [1, 2, 3]
+    assert compile_checker(Sequence[int])("abc") is False
+
+
+@pytest.mark.usefixtures("app")
+def test_container_check_mode() -> None:
+    from nonebot_plugin_exe_code.config import config
+    from nonebot_plugin_exe_code.interface.validator import compile_checker
+
+    checker = compile_checker(list[int])
+    head_bad = ["x", *range(99)]
+    middle_bad = [*range(55), "x", *range(44)]
+    tail_bad = [*range(99), "x"]
+    mapping_bad = {str(i): i for i in range(99)} | {"x": "x"}
+    check_mapping = compile_checker(dict[str, int])
+
+    assert not any(map(checker, (head_bad, middle_bad, tail_bad)))
+    assert not check_mapping(mapping_bad)
+
+    config.strict_container_size = 10
+    try:
+        config.strict_container_check = "first"
+        assert not checker(head_bad)
+        assert checker(middle_bad)
+        assert checker(tail_bad)
+        assert check_mapping(mapping_bad)
+        assert not checker(["x"])
+
+        config.strict_container_check = "sampled"
+        assert not checker(head_bad)
+        assert checker(middle_bad)
+        assert not checker(tail_bad)
+        assert check_mapping(mapping_bad)
+    finally:
+        config.strict_container_check = "full"
+        config.strict_container_size = 16
+
+
+@pytest.mark.usefixtures("app")
+def test_validator_bind() -> None:
+    from nonebot_plugin_exe_code.interface.validator import get_validator
+
+    def func(a: int, /, b: str, *, c: int = 0) -> None: ...
+
+    validator = get_validator(func)
+    assert get_validator(func) is validator
+    assert validator.bind((1, "b"), {"c": 2}) == {"a": 1, "b": "b", "c": 2}
+
+    validator((1,), {"b": "b"})
+    for args, kwargs in [
+        ((1, "b", 2), {}),
+        ((1,), {"a": 1, "b": "b"}),
+        ((1, "b"), {"b": "b"}),
+        ((1,), {}),
+    ]:
+        with pytest.raises(TypeError):
+            validator(args, kwargs)
+
+    with pytest.raises(TypeError, match="expected int, got str"):
+        validator((1, "b"), {"c": "c"})
+
+    def variadic(*args: int, **kwargs: str) -> None: ...
+
+    validator = get_validator(variadic)
+    assert validator.bind((1, 2), {"a": "a"}) == {
+        "args": (1, 2),
+        "kwargs": {"a": "a"},
+    }
+
+
+@pytest.mark.usefixtures("app")
+@pytest.mark.parametrize(
+    ("annotation", "expected"),
+    [
+        (Any, True),
+        (int | None, True),
+        (_Alias, False),
+        (_Bound, True),
+        (_Constrained, True),
+        (_Free, True),
+        (Annotated[str, "meta"], True),
+        (Literal["a"], False),
+        (_Movie, False),
+        (list, True),
+        (list[int], False),
+        (Callable[[int], int], True),
+    ],
+)
+def test_is_type_determined(annotation: object, *, expected: bool) -> None:
+    from nonebot_plugin_exe_code.interface.validator import is_type_determined
+
+    assert is_type_determined(annotation) is expected
+
+
+@pytest.mark.usefixtures("app")
+def test_validator_check() -> None:
+    from nonebot_plugin_exe_code.interface.validator import get_validator
+
+    def func(a: int, b: list[int]) -> None: ...
+
+    validator = get_validator(func)
+    assert not validator.type_determined
+    assert validator.check((1, [1]), {})
+    assert not validator.check((1, ["a"]), {})
+    assert not validator.check((1,), {})